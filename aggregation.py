@@ -0,0 +1,238 @@
+
+# External libraries
+import os
+import numpy as np
+
+# Possible answers to a question, in the order of the last axis of the answer array
+ANSWERS = ('True', 'False', 'N/A', 'invalid')
+TRUE, FALSE, NA, INVALID = range(len(ANSWERS))
+
+# Name of the file where the answer array of a folder is saved
+ANSWERS_FILENAME = "answers.npz"
+
+
+class AnswerMatrix:
+    """
+    Compact array of the answers of many documents to the checklist questions.
+
+    `answers[d, q, a]` is True when document `d` answered question `q` with `ANSWERS[a]`; a
+    question missing from a response has no answer at all. Documents can carry labels (e.g.
+    their year) used to break the counts down with vectorized reductions.
+
+    Args:
+        answers (np.ndarray): Boolean array of shape (documents, questions, len(ANSWERS)).
+        documents (list): The name of each document.
+        questions (list): The key of each question (e.g. ['A1', 'A2', 'B1']).
+        labels (dict, optional): Label name -> array with one value per document. Defaults to None.
+    """
+
+    def __init__(self, answers: np.ndarray, documents, questions, labels: dict = None):
+        self.answers = answers
+        self.documents = np.asarray(documents, dtype=str)
+        self.questions = list(questions)
+        self.labels = {name: np.asarray(values) for name, values in (labels or {}).items()}
+        self._question_index = {key: i for i, key in enumerate(self.questions)}
+
+    @classmethod
+    def from_results(cls, results: dict, questions, labels: dict = None):
+        """
+        Builds the matrix from parsed ChatGPT responses.
+
+        Args:
+            results (dict): Document name -> parsed response ({category: {question: answer}}); entries of any
+                other shape are skipped, and answers that are not strings count as invalid.
+            questions (list): The key of each question.
+            labels (dict, optional): Label name -> {document name: value}. Defaults to None.
+
+        Returns:
+            AnswerMatrix: The answers of the documents.
+        """
+        documents = list(results)
+        question_index = {key: i for i, key in enumerate(questions)}
+        answer_index = {answer: i for i, answer in enumerate(ANSWERS[:INVALID])}
+
+        answers = np.zeros((len(documents), len(questions), len(ANSWERS)), dtype=bool)
+        for d, document in enumerate(documents):
+            # Malformed responses (e.g. from older logs) leave their questions unanswered
+            result = results[document]
+            if not isinstance(result, dict):
+                continue
+            for evaluations in result.values():
+                if not isinstance(evaluations, dict):
+                    continue
+                for key, value in evaluations.items():
+                    q = question_index.get(key)
+                    if q is not None:
+                        answers[d, q, answer_index.get(value, INVALID) if isinstance(value, str) else INVALID] = True
+
+        document_labels = {name: [values.get(document) for document in documents]
+                           for name, values in (labels or {}).items()}
+        return cls(answers, documents, questions, document_labels)
+
+    @classmethod
+    def concatenate(cls, matrices: dict, label: str):
+        """
+        Stacks the matrices of several groups of documents, labelling each document with its group.
+
+        Args:
+            matrices (dict): Group value (e.g. a year) -> AnswerMatrix with the same questions.
+            label (str): The name of the label holding the group (e.g. 'year').
+
+        Returns:
+            AnswerMatrix: The documents of all the groups.
+        """
+        groups = list(matrices)
+        questions = matrices[groups[0]].questions if groups else []
+        answers = np.concatenate([matrices[group].answers for group in groups]) if groups \
+            else np.zeros((0, 0, len(ANSWERS)), dtype=bool)
+        documents = np.concatenate([matrices[group].documents for group in groups]) if groups else []
+        group_labels = np.concatenate([np.full(len(matrices[group].documents), group) for group in groups]) if groups else []
+        return cls(answers, documents, questions, {label: group_labels})
+
+    def save(self, path: str):
+        """
+        Saves the matrix, its document index and its labels to a compressed .npz file.
+
+        Args:
+            path (str): Path to the file.
+
+        Returns:
+            None
+        """
+        np.savez_compressed(path,
+                            answers=self.answers,
+                            documents=self.documents,
+                            questions=np.asarray(self.questions, dtype=str),
+                            **{f"label_{name}": values for name, values in self.labels.items()})
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Loads a matrix saved with `save`.
+
+        Args:
+            path (str): Path to the file.
+
+        Returns:
+            AnswerMatrix: The loaded matrix.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            labels = {name[len("label_"):]: data[name] for name in data.files if name.startswith("label_")}
+            return cls(data['answers'], data['documents'], data['questions'].tolist(), labels)
+
+    def counts(self, mask: np.ndarray = None) -> np.ndarray:
+        """
+        Counts the answers to each question.
+
+        Args:
+            mask (np.ndarray, optional): Boolean array selecting the documents. Defaults to None (all documents).
+
+        Returns:
+            np.ndarray: Integer array of shape (questions, len(ANSWERS)).
+        """
+        answers = self.answers if mask is None else self.answers[mask]
+        return answers.sum(axis=0, dtype=np.int64)
+
+    def breakdown(self, label: str) -> dict:
+        """
+        Counts the answers to each question for each value of a document label.
+
+        Args:
+            label (str): The name of the label (e.g. 'year').
+
+        Returns:
+            dict: Label value -> integer array of shape (questions, len(ANSWERS)).
+        """
+        values, inverse = np.unique(self.labels[label], return_inverse=True)
+        totals = np.zeros((len(values),) + self.answers.shape[1:], dtype=np.int64)
+        np.add.at(totals, inverse.ravel(), self.answers)
+        return {value.item(): totals[i] for i, value in enumerate(values)}
+
+    def category_counts(self, mask: np.ndarray = None) -> dict:
+        """
+        Counts the answers of each question category, the category being the letter of the key (e.g. 'A').
+
+        Args:
+            mask (np.ndarray, optional): Boolean array selecting the documents. Defaults to None (all documents).
+
+        Returns:
+            dict: Category -> integer array of shape (len(ANSWERS),).
+        """
+        counts = self.counts(mask)
+        categories = [key.rstrip("0123456789") for key in self.questions]
+        return {category: counts[np.array(categories) == category].sum(axis=0) for category in dict.fromkeys(categories)}
+
+    def where(self, question: str, answer: int = TRUE) -> np.ndarray:
+        """
+        Selects the documents that gave a specific answer to a question.
+
+        Args:
+            question (str): The question key (e.g. 'B2').
+            answer (int, optional): The index of the answer in ANSWERS. Defaults to TRUE.
+
+        Returns:
+            np.ndarray: Boolean mask over the documents.
+        """
+        return self.answers[:, self._question_index[question], answer]
+
+    def conditional(self, question: str, answer: int = TRUE, targets=None) -> np.ndarray:
+        """
+        Counts the answers to some questions among the documents that gave an answer to another.
+
+        For example, `conditional('B2', TRUE, ['B3', ..., 'B10'])` gives the answers to B3-B10
+        of the documents in which NHST is performed.
+
+        Args:
+            question (str): The conditioning question key.
+            answer (int, optional): The index of the conditioning answer in ANSWERS. Defaults to TRUE.
+            targets (list, optional): The question keys to count. Defaults to None (all questions).
+
+        Returns:
+            np.ndarray: Integer array of shape (len(targets), len(ANSWERS)).
+        """
+        counts = self.counts(self.where(question, answer))
+        if targets is None:
+            return counts
+        return counts[[self._question_index[key] for key in targets]]
+
+    def aggregate_results(self, mask: np.ndarray = None) -> dict:
+        """
+        Converts the counts to the flat format of aggregate_results.json.
+
+        Args:
+            mask (np.ndarray, optional): Boolean array selecting the documents. Defaults to None (all documents).
+
+        Returns:
+            dict: The '{key}_true', '_false', '_na', '_total', '_true_pct' and '_false_pct' entries of each question.
+        """
+        counts = self.counts(mask)
+        totals = counts.sum(axis=1)
+        true_pct = np.divide(counts[:, TRUE] * 100, totals, out=np.zeros(len(totals)), where=totals > 0)
+
+        aggregate_results = {}
+        for q, key in enumerate(self.questions):
+            aggregate_results[f'{key}_true'] = int(counts[q, TRUE])
+            aggregate_results[f'{key}_false'] = int(counts[q, FALSE])
+            aggregate_results[f'{key}_na'] = int(counts[q, NA])
+            aggregate_results[f'{key}_total'] = int(totals[q])
+        for q, key in enumerate(self.questions):
+            aggregate_results[f'{key}_true_pct'] = float(true_pct[q])
+            aggregate_results[f'{key}_false_pct'] = 100 - float(true_pct[q])
+        return aggregate_results
+
+
+def load_folders(folders: dict, label: str = 'year') -> AnswerMatrix:
+    """
+    Loads and stacks the answer arrays saved in several output folders.
+
+    Args:
+        folders (dict): Group value (e.g. a year) -> output folder of `analyzer.analyze_pdfs`.
+        label (str, optional): The name of the label holding the group. Defaults to 'year'.
+
+    Returns:
+        AnswerMatrix: The documents of all the folders, labelled with their group.
+    """
+    return AnswerMatrix.concatenate(
+        {group: AnswerMatrix.load(os.path.join(folder, ANSWERS_FILENAME)) for group, folder in folders.items()},
+        label
+    )
@@ -1,13 +1,39 @@
 # External libraries
 import os
-import re
 import json
+import time
+import hashlib
+import threading
 import openai
-from PyPDF2 import PdfReader
 
 # Import prompts
 from prompts import PROMPT_SYSTEM, PROMPT_USER
 
+# Internal libraries
+import metrics
+from article_index import ARTICLE_INDEX_PATH, ArticleIndex
+from extraction import (EXTRACTION_MAX_CHARS, EXTRACTION_MAX_MEMORY, EXTRACTION_MAX_TOKENS, EXTRACTION_TIMEOUT,
+                        EXTRACTOR_VERSION, extract_text, iter_extractions)
+from llm_cache import LLM_CACHE_PATH, LLMCache, request_key
+from llm_scheduler import LLM_RPM, LLM_TPM, LLMScheduler, build_messages
+from sections import SECTION_TOKEN_BUDGET, select_sections
+from prescreen import PRESCREEN_VERSION, merge_answers, prescreen as prescreen_text, subset_prompt
+from batch import iter_batch_results, write_batch_requests
+from aggregation import ANSWERS_FILENAME, FALSE, INVALID, NA, TRUE, AnswerMatrix
+from manifest import DownloadManifest
+from storage import JsonlWriter, iter_jsonl, read_json, write_json_atomic
+from text_cache import TEXT_CACHE_DIR, TextCache
+
+# Name of the append-only log of the per-file results
+RESULTS_LOG = "results_log.jsonl"
+
+# Name of the file keeping the pre-screen answers of the batch requests until their responses are ingested
+PRESCREEN_ANSWERS = "prescreen_answers.json"
+
+# ChatGPT model and sampling temperature used for the evaluations
+LLM_MODEL = "gpt-3.5-turbo"
+LLM_TEMPERATURE = 0.0
+
 def calculate_nb_questions(questions_text):
     """
     Calculate the number of questions in the questions text.
@@ -23,6 +49,27 @@ def calculate_nb_questions(questions_text):
     # Extract question labels by identifying lines that end with a period (e.g., 'A1.', 'B1.')
     return [line.split()[0][:-1] for line in questions_text.strip().split("\n") if line.strip() and line.split()[0][-1] == "."]
 
+def analysis_key(token_budget: int = SECTION_TOKEN_BUDGET,
+                 max_chars: int = EXTRACTION_MAX_CHARS,
+                 max_tokens: int = EXTRACTION_MAX_TOKENS,
+                 prescreen: bool = True) -> str:
+    """
+    Identifies the settings of an analysis, so that a result is only reused with the same settings.
+
+    Args:
+        token_budget (int, optional): Maximum number of tokens of each document. Defaults to SECTION_TOKEN_BUDGET.
+        max_chars (int, optional): Maximum number of characters extracted from each PDF file. Defaults to EXTRACTION_MAX_CHARS.
+        max_tokens (int, optional): Maximum number of tokens extracted from each PDF file. Defaults to EXTRACTION_MAX_TOKENS.
+        prescreen (bool, optional): Whether the rule-based pre-screen answers some questions. Defaults to True.
+
+    Returns:
+        str: The hexadecimal SHA-256 of the model, prompts, budgets, extractor and pre-screen versions.
+    """
+    payload = json.dumps([LLM_MODEL, LLM_TEMPERATURE, PROMPT_SYSTEM, PROMPT_USER, token_budget,
+                          EXTRACTOR_VERSION, max_chars, max_tokens, PRESCREEN_VERSION if prescreen else None],
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
 def extract_text_from_pdf(pdf_path):
     """
     Extracts the text content of a specified PDF file.
@@ -34,23 +81,19 @@ def extract_text_from_pdf(pdf_path):
         str: Text extracted from the PDF file.
     """
     try:
-    
-        # Initialize the PDF reader and concatenate text from all pages
-        reader = PdfReader(pdf_path)
-        text = "".join([page.extract_text() for page in reader.pages])
-
-        # Make sure it is not ASCII-encoded
-        if len(re.findall(r'\/C\d+', text)) > 100:
-            text = re.sub(r'\/C\d+', lambda x: chr(int(x.group()[2:])), text)
-
-        return text
+        return extract_text(pdf_path)
     
     except Exception as err:
         # Handle errors during PDF reading
         print(f"\033[91mError reading {pdf_path}: {err}\033[0m")
         return ""
 
-def send_to_chatgpt(pdf_text, prompt_system=PROMPT_SYSTEM, prompt_user=PROMPT_USER):
+def send_to_chatgpt(pdf_text,
+                    prompt_system=PROMPT_SYSTEM,
+                    prompt_user=PROMPT_USER,
+                    model=LLM_MODEL,
+                    cache: LLMCache = None,
+                    bypass_cache: bool = False):
     """
     Sends the extracted text from a PDF to ChatGPT for evaluation.
 
@@ -58,33 +101,110 @@ def send_to_chatgpt(pdf_text, prompt_system=PROMPT_SYSTEM, prompt_user=PROMPT_US
         pdf_text (str): Text extracted from the PDF.
         prompt_system (str): System-level prompt for ChatGPT.
         prompt_user (str): User-level prompt for ChatGPT.
+        model (str): Name of the ChatGPT model. Defaults to LLM_MODEL.
+        cache (LLMCache, optional): Cache of previous responses. Defaults to None (no cache).
+        bypass_cache (bool, optional): Whether to ignore cached responses (fresh ones are still stored). Defaults to False.
 
     Returns:
         str: Response from ChatGPT.
     """
+
+    # Reuse the response to an identical request
+    key = request_key(model, prompt_system, prompt_user, pdf_text, LLM_TEMPERATURE)
+    if cache and not bypass_cache:
+        response = cache.get(key)
+        if response is not None:
+            return response
+
     try:
         # Use OpenAI API to get a response from ChatGPT
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": prompt_system},
-                {"role": "user", "content": f"{prompt_user}\n\n{pdf_text}"}
-            ],
-            temperature=0.0,
-        )
-        return response.choices[0].message['content']
+        with metrics.span('llm_request', model=model):
+            response = openai.ChatCompletion.create(
+                model=model,
+                messages=build_messages(prompt_system, prompt_user, pdf_text),
+                temperature=LLM_TEMPERATURE,
+            )
+        content = response.choices[0].message['content']
     except Exception as e:
         # Handle errors during API communication
         print(f"Error sending to ChatGPT: {e}")
         return ""
 
-def analyze_pdfs(input_folder: str, output_folder: str = None):
+    if cache and content:
+        cache.put(key, model, content)
+    return content
+
+def analyze_pdfs(input_folder: str,
+                 output_folder: str = None,
+                 workers: int = None,
+                 timeout: float = EXTRACTION_TIMEOUT,
+                 max_memory: int = EXTRACTION_MAX_MEMORY,
+                 text_cache: str = TEXT_CACHE_DIR,
+                 llm_cache: str = LLM_CACHE_PATH,
+                 bypass_llm_cache: bool = False,
+                 concurrency: int = 16,
+                 rpm: float = LLM_RPM,
+                 tpm: float = LLM_TPM,
+                 api_base: str = None,
+                 token_budget: int = SECTION_TOKEN_BUDGET,
+                 batch_requests: str = None,
+                 index_path: str = ARTICLE_INDEX_PATH,
+                 max_chars: int = EXTRACTION_MAX_CHARS,
+                 max_tokens: int = EXTRACTION_MAX_TOKENS,
+                 prescreen: bool = True):
     """
     Process the PDF files in the input folder by extracting the text, sending it to ChatGPT, and saving the results.
 
+    Text extraction runs in a pool of child processes (see `extraction.iter_extractions`), so that
+    later files are extracted while the earlier ones are evaluated by ChatGPT. Files that could not
+    be extracted are recorded in the results with their extraction status. Extracted text is
+    cached by content hash, and ChatGPT responses by request hash, so re-analyzing unchanged
+    files skips both PDF parsing and API calls. ChatGPT requests are sent concurrently within
+    the account rate limits and retried on transient errors (see `llm_scheduler.LLMScheduler`).
+    Only the sections most relevant to the checklist are sent, within a token budget (see
+    `sections.select_sections`); the tokens saved per document are saved to payload_stats.json.
+    The extraction of each file stops at a character or token budget, and its peak memory and
+    whether the budget cut it short are saved to extraction_stats.json.
+
+    Before any request, a rule-based pre-screen (see `prescreen.prescreen`) answers the questions
+    that explicit statements of the full text settle (e.g. a GitHub link for A12, an exact p-value
+    for B8). ChatGPT is only asked the remaining questions, and not at all when none remain; the
+    number of questions and calls saved is saved to prescreen_stats.json.
+
+    Each result is appended to a log in the output folder as soon as it is known. A rerun only
+    processes the PDF files that are new or that previously failed, and the results, aggregate
+    results and summary are always rebuilt from the whole log.
+
+    The DOI of each file is read from the download manifest of the input folder. An article
+    already analyzed in another folder (e.g. found by another query) with the same settings
+    and the same PDF content reuses its result from the article index without any extraction
+    or API call, and every new result is recorded in the index.
+
     Args:
         input_folder (str): Path to the input folder containing the PDF files.
         output_folder (str, optional): Path to the output folder to save the results. Defaults to None (same as input folder).
+        workers (int, optional): Number of concurrent text extractions. Defaults to None (number of CPUs).
+        timeout (float, optional): Maximum text extraction time per PDF file in seconds. Defaults to EXTRACTION_TIMEOUT.
+        max_memory (int, optional): Memory cap per text extraction in MB (POSIX only). Defaults to EXTRACTION_MAX_MEMORY.
+        text_cache (str, optional): Folder of the extracted text cache, or None to disable it. Defaults to TEXT_CACHE_DIR.
+        llm_cache (str, optional): Path to the ChatGPT response cache, or None to disable it. Defaults to LLM_CACHE_PATH.
+        bypass_llm_cache (bool, optional): Whether to ignore cached ChatGPT responses and refresh them. Defaults to False.
+        concurrency (int, optional): Maximum number of ChatGPT requests in flight. Defaults to 16.
+        rpm (float, optional): ChatGPT requests-per-minute budget. Defaults to LLM_RPM.
+        tpm (float, optional): ChatGPT tokens-per-minute budget. Defaults to LLM_TPM.
+        api_base (str, optional): Base URL of the chat completions API. Defaults to None (OpenAI).
+        token_budget (int, optional): Maximum number of tokens of each document sent to ChatGPT, or None to send
+            the full text. Defaults to SECTION_TOKEN_BUDGET.
+        batch_requests (str, optional): Path to a JSON Lines file where the requests are written for the batch API
+            instead of being sent; see `ingest_batch_results` for the other half. Defaults to None.
+        index_path (str, optional): The path to the article index shared by all the folders, or None to disable it.
+            Defaults to ARTICLE_INDEX_PATH.
+        max_chars (int, optional): Maximum number of characters extracted from each PDF file, or None.
+            Defaults to EXTRACTION_MAX_CHARS.
+        max_tokens (int, optional): Maximum number of tokens extracted from each PDF file, or None.
+            Defaults to EXTRACTION_MAX_TOKENS.
+        prescreen (bool, optional): Whether the rule-based pre-screen answers the questions it can settle before
+            asking ChatGPT. Disable it to build a validation set for `prescreen.py`. Defaults to True.
 
     Returns:
         None
@@ -99,111 +219,410 @@ def analyze_pdfs(input_folder: str, output_folder: str = None):
         print("\033[91mNo PDF files found in the input folder.\033[0m")
         return
 
-    # Ensure the output folder is empty before proceeding
-    if os.listdir(output_folder):
-        print("\033[91mThe output folder is not empty. Please clear it before running the script.\033[0m")
-        return
+    # Create the output folder and read the results of the previous runs
+    os.makedirs(output_folder, exist_ok=True)
+    previous_results = load_results_log(output_folder)
 
     # Get the list of question keys (e.g., ['A1', 'A2', 'B1'])
     questions_keys = calculate_nb_questions(PROMPT_USER)
-    total_files = len([f for f in os.listdir(input_folder) if f.endswith(".pdf")])
 
-    # Initialize result dictionaries
-    results = {}
-    aggregate_results = {}
-    for key in questions_keys:
-        aggregate_results[f'{key}_true'] = 0
-        aggregate_results[f'{key}_false'] = 0
-        aggregate_results[f'{key}_na'] = 0
-        aggregate_results[f'{key}_total'] = 0
-
-    # Process each PDF file
-    for i, filename in enumerate(os.listdir(input_folder)):
-        if not filename.endswith(".pdf"):
-            continue
+    # Only process the PDF files that are new or that previously failed
+    pdf_files = sorted(f for f in os.listdir(input_folder) if f.endswith(".pdf"))
+    pdf_paths = [os.path.join(input_folder, f) for f in pdf_files
+                 if previous_results.get(f, {}).get('status') != 'ok']
+    if len(pdf_paths) < len(pdf_files):
+        print(f"Skipping {len(pdf_files) - len(pdf_paths)} PDF files already analyzed")
+    results_log = JsonlWriter(os.path.join(output_folder, RESULTS_LOG))
+    index = None
+    try:
+
+        # Reuse the results of the articles already analyzed in other folders
+        index = ArticleIndex(index_path) if index_path else None
+        settings = analysis_key(token_budget, max_chars, max_tokens, prescreen)
+        downloads = {}
+        if index:
+            downloads = {entry['filename']: entry for entry in DownloadManifest(input_folder).entries.values()
+                         if entry['status'] == 'ok'}
+            remaining_paths = []
+            for pdf_path in pdf_paths:
+                entry = downloads.get(os.path.basename(pdf_path))
+                result = index.analysis(entry['doi'], settings, entry['sha256']) if entry else None
+                metrics.inc('article_index', stage='analyze', result='hit' if result is not None else 'miss')
+                if result is None:
+                    remaining_paths.append(pdf_path)
+                else:
+                    log_result(results_log, os.path.basename(pdf_path), 'ok', result)
+            if len(remaining_paths) < len(pdf_paths):
+                print(f"Reusing the results of {len(pdf_paths) - len(remaining_paths)} articles analyzed in other folders")
+            pdf_paths = remaining_paths
+        total_files = len(pdf_paths)
+
+        # Count every file whose outcome is known, whether or not it was sent to ChatGPT
+        nb_finished = 0
+        progress_lock = threading.Lock()
+
+        def report_progress(filename: str, outcome: str):
+            nonlocal nb_finished
+            with progress_lock:
+                nb_finished += 1
+                progress_pct = nb_finished / max(total_files, 1) * 100
+            print(f"\033[92m{progress_pct:>5.1f}% {outcome}: {filename}\033[0m")
+
+        # Extract the text of each PDF file and build the corresponding requests
+        cache = TextCache(text_cache) if text_cache else None
+        extractions = iter_extractions(pdf_paths, workers=workers, timeout=timeout, max_memory=max_memory, cache=cache,
+                                       max_chars=max_chars, max_tokens=max_tokens)
+        payload_stats, extraction_stats = {}, {}
+        prescreened = {} if prescreen else None
+        requests = iter_requests(extractions, token_budget, results_log, payload_stats, extraction_stats, prescreened,
+                                 on_logged=report_progress)
+
+        # Batch mode: write the requests for the batch API and stop there
+        if batch_requests:
+            nb_requests = write_batch_requests(requests, batch_requests, model=LLM_MODEL, temperature=LLM_TEMPERATURE)
+
+            # Keep the pre-screen answers until the responses are ingested
+            if prescreened:
+                prescreen_file = os.path.join(output_folder, PRESCREEN_ANSWERS)
+                write_json_atomic(prescreen_file, {**read_json(prescreen_file, default={}), **prescreened}, indent=4)
+            print(f"Wrote {nb_requests} requests to {batch_requests}")
+            return
+
+        # Send the extracted texts to ChatGPT for evaluation, many requests at a time, and
+        # log each result as soon as it arrives
+        response_cache = LLMCache(llm_cache) if llm_cache else None
+        scheduler = LLMScheduler(model=LLM_MODEL,
+                                 temperature=LLM_TEMPERATURE,
+                                 rpm=rpm,
+                                 tpm=tpm,
+                                 max_concurrency=concurrency,
+                                 api_base=api_base,
+                                 cache=response_cache,
+                                 bypass_cache=bypass_llm_cache)
+        for filename, response, error in scheduler.map(requests):
+            report_progress(filename, "Evaluated")
+
+            # Record the requests that failed after all retries
+            if error is not None:
+                log_result(results_log, filename, 'failed', {"error": "ChatGPT request failed", "detail": str(error)})
+                continue
+
+            status, result = parse_response(filename, response)
+            if status == 'ok' and prescreened and prescreened.get(filename):
+                result = merge_answers(result, prescreened[filename])
+                log_result(results_log, filename, status, result, prescreened=sorted(prescreened[filename]))
+            else:
+                log_result(results_log, filename, status, result)
+
+            # Share the result with the other folders holding the same article
+            if index and status == 'ok' and filename in downloads:
+                entry = downloads[filename]
+                index.record_analysis(entry['doi'], settings, result, entry['sha256'])
+
+        if index:
+            # Documents whose answers were all settled by the pre-screen
+            for filename, answers in (prescreened or {}).items():
+                if len(answers) == len(questions_keys) and filename in downloads:
+                    entry = downloads[filename]
+                    index.record_analysis(entry['doi'], settings, merge_answers({}, answers), entry['sha256'])
+
+    finally:
+        results_log.close()
+        if index:
+            index.close()
+
+    # Report how many tokens the section selection saved
+    if payload_stats:
+        original_tokens = sum(stats['original_tokens'] for stats in payload_stats.values())
+        saved_tokens = sum(stats['saved_tokens'] for stats in payload_stats.values())
+        print(f"Section selection: {saved_tokens} of {original_tokens} tokens saved "
+              f"({saved_tokens / max(original_tokens, 1) * 100:.1f}%)")
+
+        # Merge with the statistics of the previous runs
+        payload_stats_file = os.path.join(output_folder, "payload_stats.json")
+        write_json_atomic(payload_stats_file, {**read_json(payload_stats_file, default={}), **payload_stats}, indent=4)
+
+    # Report how many questions and API calls the pre-screen saved
+    if prescreened:
+        nb_answers = sum(len(answers) for answers in prescreened.values())
+        nb_settled = sum(len(answers) == len(questions_keys) for answers in prescreened.values())
+        print(f"Pre-screen: {nb_answers} of {len(prescreened) * len(questions_keys)} answers settled locally, "
+              f"{nb_settled} of {len(prescreened)} documents without any API call")
+        prescreen_stats_file = os.path.join(output_folder, "prescreen_stats.json")
+        write_json_atomic(prescreen_stats_file,
+                          {**read_json(prescreen_stats_file, default={}),
+                           **{filename: sorted(answers) for filename, answers in prescreened.items()}}, indent=4)
+
+    # Report the memory used by the extractions and the documents cut short by the budget
+    measured = {filename: stats['peak_memory'] for filename, stats in extraction_stats.items()
+                if stats['peak_memory'] is not None}
+    if measured:
+        largest = max(measured, key=measured.get)
+        nb_truncated = sum(not stats['complete'] for stats in extraction_stats.values())
+        print(f"Text extraction: peak memory {measured[largest]:.1f} MB ({largest}), "
+              f"{nb_truncated} of {len(extraction_stats)} documents cut at the budget")
+    if extraction_stats:
+        extraction_stats_file = os.path.join(output_folder, "extraction_stats.json")
+        write_json_atomic(extraction_stats_file,
+                          {**read_json(extraction_stats_file, default={}), **extraction_stats}, indent=4)
+
+    # Report how many API calls the response cache saved
+    if response_cache:
+        stats = response_cache.stats()
+        print(f"ChatGPT response cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['entries']} entries, {stats['size'] / 1_048_576:.2f} MB)")
+        response_cache.close()
+
+    # Rebuild the results, aggregate results and summary from the log
+    rebuild_results(output_folder, questions_keys)
+
+def ingest_batch_results(results_file: str, output_folder: str):
+    """
+    Reads the output of the batch API, logs the results and rebuilds the aggregate results and summary.
 
-        pdf_path = os.path.join(input_folder, filename)
-        progress_pct = ((i + 1) / total_files) * 100
-        print(f"\033[92m{progress_pct:>5.1f}% Processing: {filename}\033[0m")
+    The results file is streamed one line at a time, so it is never loaded whole. The answers
+    settled by the pre-screen when the requests were written are merged into the responses.
+
+    Args:
+        results_file (str): Path to the JSON Lines file returned by the batch API.
+        output_folder (str): Path to the output folder to save the results.
+
+    Returns:
+        None
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    prescreened = read_json(os.path.join(output_folder, PRESCREEN_ANSWERS), default={})
+
+    # Log each response, keyed by the filename used as custom ID
+    with JsonlWriter(os.path.join(output_folder, RESULTS_LOG)) as results_log:
+        for filename, response, error in iter_batch_results(results_file):
+            if error is not None:
+                log_result(results_log, filename, 'failed', {"error": "ChatGPT request failed", "detail": error})
+                continue
+
+            status, result = parse_response(filename, response)
+            if status == 'ok' and prescreened.get(filename):
+                result = merge_answers(result, prescreened[filename])
+                log_result(results_log, filename, status, result, prescreened=sorted(prescreened[filename]))
+            else:
+                log_result(results_log, filename, status, result)
+
+    # Rebuild the results, aggregate results and summary from the log
+    rebuild_results(output_folder, calculate_nb_questions(PROMPT_USER))
+
+def iter_requests(extractions, token_budget: int, results_log: JsonlWriter, payload_stats: dict,
+                  extraction_stats: dict = None, prescreened: dict = None, on_logged=None):
+    """
+    Builds the ChatGPT request of each successfully extracted PDF file.
 
-        # Extract text from the PDF
-        pdf_text = extract_text_from_pdf(pdf_path)
-        if not pdf_text:
-            print(f"\033[91mFailed to extract text from {pdf_path}\033[0m")
+    Args:
+        extractions (iterable): The extraction outcomes (see `extraction.iter_extractions`).
+        token_budget (int): Maximum number of tokens of each document, or None to send the full text.
+        results_log (JsonlWriter): The results log, where the files whose text could not be extracted are recorded.
+        payload_stats (dict): Filled with the token counts of the section selection of each file.
+        extraction_stats (dict, optional): Filled with the 'status', 'peak_memory' (MB), 'characters' and
+            'complete' flag of each file extracted (not served from the cache). Defaults to None.
+        prescreened (dict, optional): Filled with the answers settled by the pre-screen for each file, whose
+            requests only ask the remaining questions, or None to ask every question. The files whose answers are
+            all settled are recorded in the results log without a request. Defaults to None.
+        on_logged (callable, optional): Called with the filename and a short outcome (e.g. 'Extraction failed')
+            of each file recorded in the results log here rather than sent to ChatGPT. Defaults to None.
+
+    Yields:
+        tuple: (filename, request) where `request` holds the arguments of `LLMScheduler.complete`.
+    """
+    for extraction in extractions:
+        filename = os.path.basename(extraction['path'])
+        if extraction_stats is not None and not extraction['cached']:
+            extraction_stats[filename] = {'status': extraction['status'],
+                                          'peak_memory': extraction['peak_memory'],
+                                          'characters': len(extraction['text']),
+                                          'complete': extraction['complete']}
+
+        # Record the files whose text could not be extracted
+        if extraction['status'] != 'ok':
+            log_result(results_log, filename, 'failed', {"error": "Text extraction failed",
+                                                         "status": extraction['status'],
+                                                         "detail": extraction['error']})
+            if on_logged:
+                on_logged(filename, "Extraction failed")
             continue
 
-        # Send the extracted text to ChatGPT for evaluation
-        response = send_to_chatgpt(pdf_text)
-
-        try:
-            # Parse the response as JSON
-            response_json = json.loads(response)
-            results[filename] = response_json
-
-            # Update aggregate results based on the JSON response
-            for category, evaluations in response_json.items():
-                for key, value in evaluations.items():
-                    if value == "True":
-                        aggregate_results[f'{key}_true'] += 1
-                    elif value == "False":
-                        aggregate_results[f'{key}_false'] += 1
-                    elif value == "N/A":
-                        aggregate_results[f'{key}_na'] += 1
-                    aggregate_results[f'{key}_total'] += 1
-
-        except json.JSONDecodeError as e:
-            # Handle invalid JSON responses
-            print(f"\033[91mError parsing JSON for {filename}: {e}\033[0m")
-            results[filename] = {"error": "Invalid JSON response", "response": response}
-
-    # Calculate percentages for aggregate results
-    for key in questions_keys:
-        true_count = aggregate_results[f'{key}_true']
-        total = aggregate_results[f'{key}_total']
-        aggregate_results[f'{key}_true_pct'] = (true_count / total) * 100 if total > 0 else 0.0
-        aggregate_results[f'{key}_false_pct'] = 100 - aggregate_results[f'{key}_true_pct']
+        # Settle the questions that the text answers explicitly, references and acknowledgments aside
+        pdf_text = extraction['text']
+        prompt_user = PROMPT_USER
+        if prescreened is not None:
+            questions_keys = calculate_nb_questions(PROMPT_USER)
+            with metrics.span('prescreen'):
+                answers = prescreen_text(pdf_text, questions_keys)
+            prescreened[filename] = answers
+            metrics.inc('prescreen_answers', len(answers))
+            if len(answers) == len(questions_keys):
+                log_result(results_log, filename, 'ok', merge_answers({}, answers), prescreened=sorted(answers))
+                if on_logged:
+                    on_logged(filename, "Pre-screened")
+                continue
+            if answers:
+                prompt_user = subset_prompt(PROMPT_USER, [key for key in questions_keys if key not in answers])
+
+        # Keep the most useful sections within the token budget
+        if token_budget:
+            selection = select_sections(pdf_text, budget=token_budget, model=LLM_MODEL)
+            pdf_text = selection.pop('text')
+            payload_stats[filename] = selection
+
+        yield filename, {'prompt_system': PROMPT_SYSTEM, 'prompt_user': prompt_user, 'pdf_text': pdf_text}
+
+def parse_response(filename: str, response: str):
+    """
+    Parse a ChatGPT response.
+
+    Args:
+        filename (str): Name of the PDF file the response is about.
+        response (str): Response from ChatGPT.
+
+    Returns:
+        tuple: ('ok', parsed JSON response) or ('failed', error description) if the response is not valid JSON
+               or not shaped as {category: {question: answer}} with string answers.
+    """
+    try:
+        # Parse the response as JSON
+        result = json.loads(response)
+
+    except json.JSONDecodeError as e:
+        # Handle invalid JSON responses
+        print(f"\033[91mError parsing JSON for {filename}: {e}\033[0m")
+        return 'failed', {"error": "Invalid JSON response", "response": response}
+
+    # Only well-formed responses enter the results log, which is replayed on every rebuild
+    if not (isinstance(result, dict) and result and
+            all(isinstance(evaluations, dict) and
+                all(isinstance(answer, str) for answer in evaluations.values())
+                for evaluations in result.values())):
+        print(f"\033[91mUnexpected response format for {filename}\033[0m")
+        return 'failed', {"error": "Unexpected response format", "response": response}
+
+    return 'ok', result
+
+def log_result(results_log: JsonlWriter, filename: str, status: str, result: dict, prescreened: list = None):
+    """
+    Append the result of a PDF file to the results log.
+
+    Args:
+        results_log (JsonlWriter): The results log.
+        filename (str): Name of the PDF file.
+        status (str): 'ok' if the file was evaluated, 'failed' otherwise.
+        result (dict): The parsed ChatGPT response, or a description of the error.
+        prescreened (list, optional): The questions of the result answered by the pre-screen rather than ChatGPT.
+            Defaults to None.
+
+    Returns:
+        None
+    """
+    record = {'filename': filename, 'status': status, 'result': result, 'time': time.time()}
+    if prescreened:
+        record['prescreened'] = prescreened
+    results_log.write(record)
+
+def load_results_log(folder: str) -> dict:
+    """
+    Read the latest result of each PDF file from the results log of a folder.
+
+    Args:
+        folder (str): Path to the output folder.
+
+    Returns:
+        dict: The latest log record of each filename (empty if there is no log yet).
+    """
+    path = os.path.join(folder, RESULTS_LOG)
+    if not os.path.exists(path):
+        return {}
+    return {record['filename']: record for record in iter_jsonl(path)}
+
+def rebuild_results(folder: str, questions_keys):
+    """
+    Rebuild the results, answer array, aggregate results and summary of a folder from its results log.
+
+    Args:
+        folder (str): Path to the output folder.
+        questions_keys (list): List of question keys (e.g., ['A1', 'A2', 'B1']).
+
+    Returns:
+        None
+    """
+    records = load_results_log(folder)
+    results = {filename: record['result'] for filename, record in records.items()}
+
+    # Store the successful evaluations as an array (documents x questions x answers)
+    matrix = AnswerMatrix.from_results({filename: record['result'] for filename, record in records.items()
+                                        if record['status'] == 'ok'},
+                                       questions_keys)
+    matrix.save(os.path.join(folder, ANSWERS_FILENAME))
 
     # Save results to JSON files
-    os.makedirs(output_folder, exist_ok=True)
-    with open(os.path.join(output_folder, "results.json"), "w") as fid:
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "results.json"), "w") as fid:
         json.dump(results, fid, indent=4)
 
-    with open(os.path.join(output_folder, "aggregate_results.json"), "w") as fid:
+    aggregate_results = matrix.aggregate_results()
+    with open(os.path.join(folder, "aggregate_results.json"), "w") as fid:
         json.dump(aggregate_results, fid, indent=4)
 
     # Post-process the aggregate results for a human-readable summary
-    postprocess_aggregate_results(output_folder, questions_keys)
+    postprocess_aggregate_results(folder, questions_keys, aggregate_results, matrix)
 
-def postprocess_aggregate_results(folder: str, questions_keys):
+def postprocess_aggregate_results(folder: str, questions_keys, raw_data: dict = None, matrix: AnswerMatrix = None):
     """
     Post-process the aggregated results and save them to a text file.
 
     Args:
         folder (str): Path to the folder containing the aggregated results.
         questions_keys (list): List of question keys (e.g., ['A1', 'A2', 'B1']).
+        raw_data (dict, optional): The aggregate results. Defaults to None (read from aggregate_results.json).
+        matrix (AnswerMatrix, optional): The answer array, used for the category and conditional breakdowns.
+            Defaults to None (no breakdowns).
 
     Returns:
         None
     """
-    with open(os.path.join(folder, "aggregate_results.json"), "r") as fid:
-        raw_data = json.load(fid)
-
-        # Prepare the table header for the summary file
-        header = f"{'Question':<10} {'True':<6} {'False':<6} {'N/A':<6} {'Total':<6} {'% True':<8} {'% False':<8}"
-        separator = "-" * len(header)
-        lines = [header, separator]
-
-        # Process each question key to create rows for the summary
-        for key in questions_keys:
-            true_count = raw_data[f'{key}_true']
-            false_count = raw_data[f'{key}_false']
-            na_count = raw_data[f'{key}_na']
-            total = raw_data[f'{key}_total']
-            true_pct = raw_data[f'{key}_true_pct']
-            false_pct = raw_data[f'{key}_false_pct']
-            row = f"{key:<10} {true_count:<6} {false_count:<6} {na_count:<6} {total:<6} {true_pct:<8.1f} {false_pct:<8.1f}"
-            lines.append(row)
-
-        # Write the summary to a text file
-        with open(os.path.join(folder, "summary.txt"), "w") as text_file:
-            text_file.write("\n".join(lines))
+    if raw_data is None:
+        with open(os.path.join(folder, "aggregate_results.json"), "r") as fid:
+            raw_data = json.load(fid)
+
+    # Prepare the table header for the summary file
+    header = f"{'Question':<10} {'True':<6} {'False':<6} {'N/A':<6} {'Total':<6} {'% True':<8} {'% False':<8}"
+    separator = "-" * len(header)
+    lines = [header, separator]
+
+    # Process each question key to create rows for the summary
+    for key in questions_keys:
+        true_count = raw_data[f'{key}_true']
+        false_count = raw_data[f'{key}_false']
+        na_count = raw_data[f'{key}_na']
+        total = raw_data[f'{key}_total']
+        true_pct = raw_data[f'{key}_true_pct']
+        false_pct = raw_data[f'{key}_false_pct']
+        row = f"{key:<10} {true_count:<6} {false_count:<6} {na_count:<6} {total:<6} {true_pct:<8.1f} {false_pct:<8.1f}"
+        lines.append(row)
+
+    if matrix is not None:
+
+        # Answers per question category
+        lines += ["", f"{'Category':<10} {'True':<6} {'False':<6} {'N/A':<6} {'Invalid':<8}", separator]
+        for category, counts in matrix.category_counts().items():
+            lines.append(f"{category:<10} {counts[TRUE]:<6} {counts[FALSE]:<6} {counts[NA]:<6} {counts[INVALID]:<8}")
+
+        # Answers to the NHST questions when NHST is performed
+        nhst_keys = [key for key in questions_keys if key.startswith('B') and key not in ('B1', 'B2')]
+        if 'B2' in questions_keys and nhst_keys:
+            nb_documents = int(matrix.where('B2', TRUE).sum())
+            lines += ["", f"Given B2 = True ({nb_documents} documents)", header, separator]
+            for key, counts in zip(nhst_keys, matrix.conditional('B2', TRUE, nhst_keys)):
+                total = int(counts.sum())
+                true_pct = counts[TRUE] / total * 100 if total else 0.0
+                lines.append(f"{key:<10} {counts[TRUE]:<6} {counts[FALSE]:<6} {counts[NA]:<6} {total:<6} "
+                             f"{true_pct:<8.1f} {100 - true_pct:<8.1f}")
+
+    # Write the summary to a text file
+    with open(os.path.join(folder, "summary.txt"), "w") as text_file:
+        text_file.write("\n".join(lines))
@@ -0,0 +1,376 @@
+
+# External libraries
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Internal libraries
+from doi_cache import normalize_title
+
+# Default location of the article index, shared by all the queries and years
+ARTICLE_INDEX_PATH = "article_index.sqlite"
+
+# Columns of the articles table, in the order of the rows returned by `ArticleIndex.get`
+_ARTICLE_COLUMNS = ('key', 'doi', 'title', 'title_key', 'link',
+                    'download_status', 'pdf_path', 'sha256', 'bytes', 'downloaded_at',
+                    'analysis_status', 'analysis_key', 'analysis_sha256', 'analysis_result', 'analyzed_at',
+                    'created_at', 'updated_at')
+
+
+def article_key(doi: str = None, title: str = None) -> str:
+    """
+    Builds the index key of an article: its DOI, or its normalized title when it has none.
+
+    Args:
+        doi (str, optional): The DOI of the article. Defaults to None.
+        title (str, optional): The title of the article. Defaults to None.
+
+    Returns:
+        str: The key (e.g. 'doi:10.1000/xyz' or 'title:a study of things').
+
+    Raises:
+        ValueError: If neither a DOI nor a title is given.
+    """
+    if doi:
+        return f"doi:{doi.strip().lower()}"
+    if title:
+        return f"title:{normalize_title(title)}"
+    raise ValueError("An article needs a DOI or a title")
+
+
+class ArticleIndex:
+    """
+    Persistent SQLite index of every article seen, across all the queries and years.
+
+    Articles are keyed by DOI, or by normalized title when Crossref found no DOI (see
+    `article_key`); an article first indexed by title moves to its DOI key once one is known.
+    Each article records:
+        - its scrape provenance: every (query, year) it was found under, with its rank;
+        - its download state: status, path, SHA-256 and size of the PDF file;
+        - its analysis state: status and parsed ChatGPT response, with the analysis settings
+          (`analysis_key`) and the SHA-256 of the analyzed file.
+
+    The stages consult the index to skip the work already done for another query or year:
+    a PDF downloaded elsewhere is linked instead of downloaded again, and an article already
+    analyzed with the same settings reuses its result instead of calling ChatGPT.
+
+    The database runs in WAL mode, so several processes of a host can share it; hosts sharing
+    files over a network file system need an index each (see `sharding.merge_results`).
+
+    Args:
+        path (str, optional): The path to the SQLite database. Defaults to ARTICLE_INDEX_PATH.
+    """
+
+    def __init__(self, path: str = ARTICLE_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            "key TEXT PRIMARY KEY, "
+            "doi TEXT, "
+            "title TEXT, "
+            "title_key TEXT, "
+            "link TEXT, "
+            "download_status TEXT, "
+            "pdf_path TEXT, "
+            "sha256 TEXT, "
+            "bytes INTEGER, "
+            "downloaded_at REAL, "
+            "analysis_status TEXT, "
+            "analysis_key TEXT, "
+            "analysis_sha256 TEXT, "
+            "analysis_result TEXT, "
+            "analyzed_at REAL, "
+            "created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS articles_title_key ON articles (title_key)")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "key TEXT NOT NULL, "
+            "query TEXT NOT NULL, "
+            "year INTEGER NOT NULL, "
+            "start_index INTEGER, "
+            "position INTEGER, "
+            "scraped_at REAL NOT NULL, "
+            "PRIMARY KEY (key, query, year))"
+        )
+        self._connection.commit()
+
+    def _row(self, key: str) -> dict:
+        """
+        Reads the row of an article (the lock must be held).
+
+        Args:
+            key (str): The index key of the article.
+
+        Returns:
+            dict: The article, or None if it is not indexed.
+        """
+        row = self._connection.execute(
+            f"SELECT {', '.join(_ARTICLE_COLUMNS)} FROM articles WHERE key = ?", (key,)
+        ).fetchone()
+        return dict(zip(_ARTICLE_COLUMNS, row)) if row else None
+
+    def get(self, doi: str = None, title: str = None) -> dict:
+        """
+        Looks up an article by DOI, or by normalized title.
+
+        Args:
+            doi (str, optional): The DOI of the article. Defaults to None.
+            title (str, optional): The title of the article, used when the DOI is unknown. Defaults to None.
+
+        Returns:
+            dict: The article with the columns of the index (the analysis result is decoded), or None.
+        """
+        with self._lock:
+            if doi:
+                article = self._row(article_key(doi=doi))
+            else:
+                # Prefer the entry which has a DOI when the same title was indexed both ways
+                row = self._connection.execute(
+                    f"SELECT {', '.join(_ARTICLE_COLUMNS)} FROM articles WHERE title_key = ? "
+                    f"ORDER BY doi IS NULL LIMIT 1",
+                    (normalize_title(title),)
+                ).fetchone() if title else None
+                article = dict(zip(_ARTICLE_COLUMNS, row)) if row else None
+
+        if article and article['analysis_result'] is not None:
+            article['analysis_result'] = json.loads(article['analysis_result'])
+        return article
+
+    def record_scrape(self, article: dict, query: str, year: int = None, rank: tuple = None) -> str:
+        """
+        Records an article found by a search, and where it was found.
+
+        Args:
+            article (dict): The scraped article with its 'title', 'link' and 'doi'.
+            query (str): The search query.
+            year (int, optional): The publication year filter of the search. Defaults to None.
+            rank (tuple, optional): (start_index, position) of the article in the results. Defaults to None.
+
+        Returns:
+            str: The index key of the article.
+        """
+        doi, title = article.get('doi'), article.get('title')
+        key = article_key(doi, title)
+        now = time.time()
+        start_index, position = rank if rank else (None, None)
+
+        with self._lock:
+
+            # An article indexed by title before its DOI was known moves to its DOI key
+            if doi and title:
+                title_entry = article_key(title=title)
+                if self._row(title_entry) is not None:
+                    if self._row(key) is None:
+                        self._connection.execute("UPDATE articles SET key = ?, doi = ? WHERE key = ?",
+                                                 (key, doi, title_entry))
+                    else:
+                        self._connection.execute("DELETE FROM articles WHERE key = ?", (title_entry,))
+                    self._connection.execute("UPDATE OR IGNORE sources SET key = ? WHERE key = ?", (key, title_entry))
+                    self._connection.execute("DELETE FROM sources WHERE key = ?", (title_entry,))
+
+            self._connection.execute(
+                "INSERT INTO articles (key, doi, title, title_key, link, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "title = COALESCE(articles.title, excluded.title), "
+                "title_key = COALESCE(articles.title_key, excluded.title_key), "
+                "link = COALESCE(articles.link, excluded.link), "
+                "updated_at = excluded.updated_at",
+                (key, doi, title, normalize_title(title) if title else None, article.get('link'), now, now)
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sources (key, query, year, start_index, position, scraped_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, query, year or 0, start_index, position, now)
+            )
+            self._connection.commit()
+        return key
+
+    def sources(self, doi: str = None, title: str = None) -> list:
+        """
+        Lists the searches under which an article was found.
+
+        Args:
+            doi (str, optional): The DOI of the article. Defaults to None.
+            title (str, optional): The title of the article, used when the DOI is unknown. Defaults to None.
+
+        Returns:
+            list: One dictionary per search with its 'query', 'year' (None without filter), 'start_index',
+                  'position' and 'scraped_at'.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT query, year, start_index, position, scraped_at FROM sources WHERE key = ? "
+                "ORDER BY scraped_at",
+                (article_key(doi, title),)
+            ).fetchall()
+        return [{'query': query, 'year': year or None, 'start_index': start_index,
+                 'position': position, 'scraped_at': scraped_at}
+                for query, year, start_index, position, scraped_at in rows]
+
+    def record_download(self, doi: str, status: str, pdf_path: str = None, sha256: str = None, size: int = None):
+        """
+        Records the outcome of the download of an article.
+
+        Args:
+            doi (str): The DOI of the article.
+            status (str): The download status (see `DownloadEngine.fetch`).
+            pdf_path (str, optional): The path to the downloaded PDF file. Defaults to None.
+            sha256 (str, optional): The SHA-256 of the PDF file. Defaults to None.
+            size (int, optional): The size of the PDF file in bytes. Defaults to None.
+
+        Returns:
+            None
+        """
+        now = time.time()
+        with self._lock:
+
+            # A successful download is never replaced by a failed attempt from another folder
+            self._connection.execute(
+                "INSERT INTO articles (key, doi, download_status, pdf_path, sha256, bytes, downloaded_at, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "download_status = excluded.download_status, pdf_path = excluded.pdf_path, "
+                "sha256 = excluded.sha256, bytes = excluded.bytes, downloaded_at = excluded.downloaded_at, "
+                "updated_at = excluded.updated_at "
+                "WHERE excluded.download_status = 'ok' OR articles.download_status IS NOT 'ok'",
+                (article_key(doi=doi), doi, status, pdf_path and os.path.abspath(pdf_path), sha256, size,
+                 now, now, now)
+            )
+            self._connection.commit()
+
+    def forget_download(self, doi: str, pdf_path: str):
+        """
+        Drops the download of an article whose PDF file can no longer be read (moved or deleted).
+
+        Only the entry pointing at that file is dropped, so a newer download from another folder is kept.
+
+        Args:
+            doi (str): The DOI of the article.
+            pdf_path (str): The path to the missing PDF file, as recorded in the index.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._connection.execute(
+                "UPDATE articles SET download_status = NULL, pdf_path = NULL, sha256 = NULL, bytes = NULL, "
+                "updated_at = ? WHERE key = ? AND pdf_path = ?",
+                (time.time(), article_key(doi=doi), pdf_path)
+            )
+            self._connection.commit()
+
+    def downloaded(self, doi: str) -> dict:
+        """
+        Finds the PDF file of an article downloaded by any previous run.
+
+        Args:
+            doi (str): The DOI of the article.
+
+        Returns:
+            dict: The article (see `get`) if its download succeeded and the file still exists, otherwise None.
+        """
+        article = self.get(doi=doi)
+        if not article or article['download_status'] != 'ok' or not article['pdf_path']:
+            return None
+        return article if os.path.exists(article['pdf_path']) else None
+
+    def record_analysis(self, doi: str, analysis_key: str, result: dict, sha256: str = None):
+        """
+        Records the successful analysis of an article.
+
+        Args:
+            doi (str): The DOI of the article.
+            analysis_key (str): Identifies the analysis settings (model, prompts, extraction), see `analyzer.analysis_key`.
+            result (dict): The parsed ChatGPT response.
+            sha256 (str, optional): The SHA-256 of the analyzed PDF file. Defaults to None.
+
+        Returns:
+            None
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO articles (key, doi, analysis_status, analysis_key, analysis_sha256, analysis_result, "
+                "analyzed_at, created_at, updated_at) VALUES (?, ?, 'ok', ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "analysis_status = 'ok', analysis_key = excluded.analysis_key, "
+                "analysis_sha256 = excluded.analysis_sha256, analysis_result = excluded.analysis_result, "
+                "analyzed_at = excluded.analyzed_at, updated_at = excluded.updated_at",
+                (article_key(doi=doi), doi, analysis_key, sha256, json.dumps(result, ensure_ascii=False),
+                 now, now, now)
+            )
+            self._connection.commit()
+
+    def analysis(self, doi: str, analysis_key: str, sha256: str = None) -> dict:
+        """
+        Finds the result of a previous analysis of an article with the same settings.
+
+        Args:
+            doi (str): The DOI of the article.
+            analysis_key (str): Identifies the analysis settings, see `record_analysis`.
+            sha256 (str, optional): The SHA-256 of the PDF file about to be analyzed; when given, the result
+                is only reused if the same file was analyzed. Defaults to None.
+
+        Returns:
+            dict: The parsed ChatGPT response, or None if the article must be analyzed.
+        """
+        article = self.get(doi=doi)
+        if not article or article['analysis_status'] != 'ok' or article['analysis_key'] != analysis_key:
+            return None
+        if sha256 and article['analysis_sha256'] and sha256 != article['analysis_sha256']:
+            return None
+        return article['analysis_result']
+
+    def stats(self) -> dict:
+        """
+        Counts the indexed articles and how far they went through the stages.
+
+        Returns:
+            dict: The number of 'articles', of articles 'with_doi', 'downloaded' and 'analyzed', and the number
+                  of 'searches' (query and year pairs) they come from.
+        """
+        with self._lock:
+            articles, with_doi, downloaded, analyzed = self._connection.execute(
+                "SELECT COUNT(*), COUNT(doi), "
+                "COALESCE(SUM(download_status = 'ok'), 0), COALESCE(SUM(analysis_status = 'ok'), 0) "
+                "FROM articles"
+            ).fetchone()
+            searches = self._connection.execute(
+                "SELECT COUNT(*) FROM (SELECT DISTINCT query, year FROM sources)"
+            ).fetchone()[0]
+        return {'articles': articles,
+                'with_doi': with_doi,
+                'downloaded': downloaded,
+                'analyzed': analyzed,
+                'searches': searches}
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._connection.close()
+
+
+if __name__ == '__main__':
+
+    # Print how far the indexed articles went through the stages
+    if not os.path.exists(ARTICLE_INDEX_PATH):
+        print(f"\033[91mNo article index found at '{ARTICLE_INDEX_PATH}'.\033[0m")
+    else:
+        index = ArticleIndex()
+        stats = index.stats()
+        index.close()
+        print(f"{stats['articles']} articles from {stats['searches']} searches: "
+              f"{stats['with_doi']} with a DOI, {stats['downloaded']} downloaded, {stats['analyzed']} analyzed")
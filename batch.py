@@ -0,0 +1,83 @@
+
+# External libraries
+import json
+
+# Internal libraries
+from llm_scheduler import build_messages
+from storage import iter_jsonl
+
+# Endpoint targeted by the batch requests
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+def write_batch_requests(requests, path: str, model: str, temperature: float = 0.0) -> int:
+    """
+    Writes chat completion requests in the input format of the OpenAI batch API.
+
+    The name of the PDF file is used as `custom_id`, so the results can be matched to their
+    files whatever the order in which the batch API returns them.
+
+    Args:
+        requests (iterable): (filename, request) tuples, where `request` holds the prompts and the text.
+        path (str): Path to the JSON Lines file to write.
+        model (str): The name of the model.
+        temperature (float, optional): The sampling temperature. Defaults to 0.0.
+
+    Returns:
+        int: The number of requests written.
+    """
+    nb_requests = 0
+    with open(path, 'w', encoding='utf-8') as file:
+        for filename, request in requests:
+            line = {
+                "custom_id": filename,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": {
+                    "model": model,
+                    "messages": build_messages(request['prompt_system'], request['prompt_user'], request['pdf_text']),
+                    "temperature": temperature,
+                },
+            }
+            file.write(json.dumps(line, ensure_ascii=False) + "\n")
+            nb_requests += 1
+    return nb_requests
+
+
+def iter_batch_results(path: str):
+    """
+    Streams the responses from a file in the output format of the OpenAI batch API.
+
+    Args:
+        path (str): Path to the JSON Lines file returned by the batch API.
+
+    Lines without a custom ID cannot be matched to a document and are skipped; a response
+    that does not hold a message is reported as an error of its document.
+
+    Yields:
+        tuple: (custom_id, content, error) where `error` describes a failed request, if any.
+    """
+    for line in iter_jsonl(path):
+        custom_id = line.get("custom_id") if isinstance(line, dict) else None
+        if not custom_id:
+            print(f"Skipping a line without custom_id in '{path}'")
+            continue
+
+        # Request rejected by the batch API
+        if line.get("error"):
+            yield custom_id, None, json.dumps(line["error"])
+            continue
+
+        # Request answered with an HTTP error
+        response = line.get("response")
+        response = response if isinstance(response, dict) else {}
+        if response.get("status_code") != 200:
+            yield custom_id, None, f"Status code {response.get('status_code')}: {json.dumps(response.get('body'))}"
+            continue
+
+        try:
+            content = response["body"]["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            yield custom_id, None, f"Malformed response: {json.dumps(response.get('body'))}"
+            continue
+        yield custom_id, content, None
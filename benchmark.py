@@ -0,0 +1,673 @@
+
+# External libraries
+import io
+import os
+import json
+import time
+import random
+import shutil
+import hashlib
+import inspect
+import argparse
+import tempfile
+import functools
+import threading
+import contextlib
+import numpy as np
+import openai
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from habanero import Crossref
+
+# Internal libraries
+import scraper
+import downloader
+from analyzer import analyze_pdfs, calculate_nb_questions
+from llm_scheduler import LLMScheduler
+from prompts import PROMPT_USER
+from storage import JsonlWriter
+
+# Default file where the benchmark results are written
+BENCHMARK_RESULTS = "benchmark_results.json"
+
+# Scenarios and the default corpus sizes (number of articles) they are run at
+SCENARIOS = ('scrape', 'download', 'analyze')
+DEFAULT_SIZES = (20, 100)
+
+# Sections of the synthetic articles, so that the section selection has something to work on
+SYNTHETIC_SECTIONS = ['Abstract', 'Introduction', 'Methodology', 'Experimental setup',
+                      'Results', 'Statistical analysis', 'Conclusion', 'References']
+
+
+class FakeEndpoint:
+    """
+    Behaviour of an endpoint of the fake servers.
+
+    Args:
+        latency (float, optional): The mean delay before answering in seconds (±50 % uniform jitter). Defaults to 0.
+        error_rate (float, optional): The probability of answering with an error. Defaults to 0.
+        error_status (int, optional): The HTTP status of the errors. Defaults to 503.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, error_status: int = 503):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def wait(self):
+        """
+        Sleeps for the latency of the endpoint.
+
+        Returns:
+            None
+        """
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+
+    def fails(self) -> bool:
+        """
+        Draws whether the current request fails.
+
+        Returns:
+            bool: True if the endpoint should answer with an error.
+        """
+        return random.random() < self.error_rate
+
+
+class FakeServers:
+    """
+    Local stand-ins for Google Scholar, Crossref, the PDF mirror and the chat completions API.
+
+    A single threaded HTTP server answers on 127.0.0.1:
+        - GET /scholar: result pages with the `gs_ri` / `gs_rt` markup of Google Scholar.
+        - GET /works: the Crossref `works` search, returning one synthetic DOI per title.
+        - GET /pdf/<doi>.pdf: synthetic PDF files of the configured size.
+        - POST /v1/chat/completions: random checklist answers in the chat completions format.
+
+    Args:
+        scholar (FakeEndpoint, optional): Behaviour of the Scholar pages. Defaults to FakeEndpoint().
+        crossref (FakeEndpoint, optional): Behaviour of the Crossref API. Defaults to FakeEndpoint().
+        mirror (FakeEndpoint, optional): Behaviour of the PDF mirror. Defaults to FakeEndpoint().
+        llm (FakeEndpoint, optional): Behaviour of the chat completions API. Defaults to FakeEndpoint().
+        pdf_size (int, optional): The size of the synthetic PDF files in bytes. Defaults to 200 kB.
+    """
+
+    def __init__(self,
+                 scholar: FakeEndpoint = None,
+                 crossref: FakeEndpoint = None,
+                 mirror: FakeEndpoint = None,
+                 llm: FakeEndpoint = None,
+                 pdf_size: int = 200_000):
+        self.scholar = scholar or FakeEndpoint()
+        self.crossref = crossref or FakeEndpoint()
+        self.mirror = mirror or FakeEndpoint()
+        self.llm = llm or FakeEndpoint(error_status=429)
+        self.pdf_size = pdf_size
+        self.questions_keys = calculate_nb_questions(PROMPT_USER)
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        """
+        Base URL of the servers.
+
+        Returns:
+            str: e.g. 'http://127.0.0.1:51234'.
+        """
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Starts the server in a background thread.
+
+        Returns:
+            FakeServers: The servers themselves.
+        """
+        servers = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                servers._handle_get(self)
+
+            def do_POST(self):
+                servers._handle_post(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server.
+
+        Returns:
+            None
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handle_get(self, handler):
+        """
+        Answers a GET request.
+
+        Args:
+            handler (BaseHTTPRequestHandler): The request handler.
+
+        Returns:
+            None
+        """
+        url = urlparse(handler.path)
+        params = parse_qs(url.query)
+
+        if url.path == "/scholar":
+            endpoint = self.scholar
+            endpoint.wait()
+            if endpoint.fails():
+                return _send(handler, endpoint.error_status, b"", "text/html")
+            query = params.get("q", [""])[0]
+            start = int(params.get("start", ["0"])[0])
+            return _send(handler, 200, scholar_page(query, start, self.url).encode(), "text/html")
+
+        if url.path == "/works":
+            endpoint = self.crossref
+            endpoint.wait()
+            if endpoint.fails():
+                return _send(handler, endpoint.error_status, b"", "application/json")
+            title = params.get("query", [""])[0]
+            body = {"status": "ok",
+                    "message-type": "work-list",
+                    "message": {"total-results": 1,
+                                "items": [{"DOI": synthetic_doi(title), "title": [title]}],
+                                "items-per-page": 1,
+                                "query": {"start-index": 0, "search-terms": title}}}
+            return _send(handler, 200, json.dumps(body).encode(), "application/json")
+
+        if url.path.startswith("/pdf/"):
+            endpoint = self.mirror
+            endpoint.wait()
+            if endpoint.fails():
+                return _send(handler, endpoint.error_status, b"", "text/html", {"Retry-After": "1"})
+            doi = url.path[len("/pdf/"):-len(".pdf")]
+            return _send(handler, 200, synthetic_pdf(doi, self.pdf_size), "application/pdf")
+
+        _send(handler, 404, b"", "text/plain")
+
+    def _handle_post(self, handler):
+        """
+        Answers a POST request (chat completions).
+
+        Args:
+            handler (BaseHTTPRequestHandler): The request handler.
+
+        Returns:
+            None
+        """
+        request = json.loads(handler.rfile.read(int(handler.headers.get("Content-Length", 0))) or b"{}")
+        if not urlparse(handler.path).path.endswith("/chat/completions"):
+            return _send(handler, 404, b"", "text/plain")
+
+        endpoint = self.llm
+        endpoint.wait()
+        if endpoint.fails():
+            error = {"error": {"message": "Simulated failure", "type": "server_error", "param": None, "code": None}}
+            return _send(handler, endpoint.error_status, json.dumps(error).encode(), "application/json")
+
+        # Random answers, grouped by category as in the expected output format
+        answers = {}
+        for key in self.questions_keys:
+            answers.setdefault(f"Category {key[0]}", {})[key] = random.choice(["True", "False", "N/A"])
+        content = json.dumps(answers, indent=4)
+
+        prompt_tokens = sum(len(message.get("content", "")) for message in request.get("messages", [])) // 4
+        completion_tokens = len(content) // 4
+        body = {
+            "id": f"chatcmpl-{random.getrandbits(64):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens,
+                      "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+        _send(handler, 200, json.dumps(body).encode(), "application/json")
+
+
+def _send(handler, status: int, body: bytes, content_type: str, headers: dict = None):
+    """
+    Sends a complete HTTP response.
+
+    Args:
+        handler (BaseHTTPRequestHandler): The request handler.
+        status (int): The HTTP status code.
+        body (bytes): The body of the response.
+        content_type (str): The Content-Type of the body.
+        headers (dict, optional): Additional headers. Defaults to None.
+
+    Returns:
+        None
+    """
+    handler.send_response(status)
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(len(body)))
+    for name, value in (headers or {}).items():
+        handler.send_header(name, value)
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def synthetic_title(query: str, rank: int) -> str:
+    """
+    Builds the title of the synthetic article shown at a rank of the results of a query.
+
+    Args:
+        query (str): The search query.
+        rank (int): The position of the article in the results.
+
+    Returns:
+        str: The title.
+    """
+    return f"A synthetic study of {query} number {rank}"
+
+
+def synthetic_doi(title: str) -> str:
+    """
+    Builds a stable synthetic DOI for a title.
+
+    Args:
+        title (str): The title of the article.
+
+    Returns:
+        str: The DOI (e.g. '10.5555/bench.1a2b3c4d5e6f').
+    """
+    return f"10.5555/bench.{hashlib.sha1(title.encode()).hexdigest()[:12]}"
+
+
+def scholar_page(query: str, start: int, base_url: str) -> str:
+    """
+    Builds a Google Scholar result page.
+
+    Args:
+        query (str): The search query.
+        start (int): The index of the first result of the page.
+        base_url (str): The base URL used in the links of the results.
+
+    Returns:
+        str: The HTML of the page.
+    """
+    results = []
+    for rank in range(start, start + scraper.NB_RESULTS_PER_PAGE):
+        results.append(
+            f'<div class="gs_r gs_or gs_scl"><div class="gs_ri">'
+            f'<h3 class="gs_rt"><a href="{base_url}/article/{rank}">{synthetic_title(query, rank)}</a></h3>'
+            f'<div class="gs_a">A. Author, B. Author - Journal of Benchmarks, 2020</div>'
+            f'<div class="gs_rs">Synthetic snippet of the article, long enough to look like the real thing.</div>'
+            f'</div></div>'
+        )
+    return f'<html><head><title>Scholar</title></head><body><div id="gs_res_ccl_mid">{"".join(results)}</div></body></html>'
+
+
+@functools.lru_cache(maxsize=64)
+def synthetic_pdf(seed: str, size: int = 200_000, nb_lines: int = 400) -> bytes:
+    """
+    Builds a valid single-page PDF file with some sections of text, padded to a given size.
+
+    Args:
+        seed (str): A string included in the text, making the files distinct (e.g. the DOI).
+        size (int, optional): The approximate size of the file in bytes. Defaults to 200 kB.
+        nb_lines (int, optional): The number of lines of text. Defaults to 400.
+
+    Returns:
+        bytes: The content of the PDF file.
+    """
+    rng = random.Random(seed)
+    words = ["algorithm", "population", "mutation", "benchmark", "runs", "parameter", "tuning",
+             "significance", "p-value", "Wilcoxon", "median", "variance", "convergence", "fitness"]
+    lines = [f"Synthetic article {seed}"]
+    per_section = max(nb_lines // len(SYNTHETIC_SECTIONS), 1)
+    for number, section in enumerate(SYNTHETIC_SECTIONS, start=1):
+        lines.append(f"{number}. {section}")
+        lines += [" ".join(rng.choice(words) for _ in range(12)) + "." for _ in range(per_section)]
+
+    text = " T* ".join("(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj"
+                       for line in lines)
+    content = f"BT /F1 10 Tf 12 TL 72 760 Td {text} ET".encode()
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    # Unreferenced stream bringing the file to the requested size
+    padding = max(size - len(content) - 600, 0)
+    objects.append(b"<< /Length %d >>\nstream\n" % padding + b"0" * padding + b"\nendstream")
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+class LatencyRecorder:
+    """
+    Records the duration of every call to some functions, by wrapping them while active.
+
+    Args:
+        targets (list): (owner, attribute, series) tuples, where `owner` is a module or a class,
+            `attribute` the name of the function and `series` the name of its latency series.
+    """
+
+    def __init__(self, targets: list):
+        self.targets = targets
+        self.samples = {series: [] for _, _, series in targets}
+        self._originals = []
+        self._lock = threading.Lock()
+
+    def _record(self, series: str, start: float):
+        with self._lock:
+            self.samples[series].append(time.perf_counter() - start)
+
+    def _wrap(self, function, series: str):
+        """
+        Wraps a function (or coroutine function) to time its calls.
+
+        Args:
+            function (callable): The function to wrap.
+            series (str): The name of the latency series.
+
+        Returns:
+            callable: The wrapper.
+        """
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self._record(series, start)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._record(series, start)
+        return wrapper
+
+    def __enter__(self):
+        for owner, attribute, series in self.targets:
+            original = getattr(owner, attribute)
+            self._originals.append((owner, attribute, original))
+            setattr(owner, attribute, self._wrap(original, series))
+        return self
+
+    def __exit__(self, *exc_info):
+        for owner, attribute, original in reversed(self._originals):
+            setattr(owner, attribute, original)
+        self._originals.clear()
+
+    def summary(self) -> dict:
+        """
+        Summarizes each latency series.
+
+        Returns:
+            dict: Series -> {'count', 'mean', 'p50', 'p95'} in seconds (None without samples).
+        """
+        summary = {}
+        for series, samples in self.samples.items():
+            if not samples:
+                summary[series] = {'count': 0, 'mean': None, 'p50': None, 'p95': None}
+                continue
+            values = np.asarray(samples)
+            summary[series] = {'count': len(values),
+                               'mean': float(values.mean()),
+                               'p50': float(np.percentile(values, 50)),
+                               'p95': float(np.percentile(values, 95))}
+        return summary
+
+
+@contextlib.contextmanager
+def patched(owner, attribute: str, value):
+    """
+    Temporarily replaces an attribute of a module or class.
+
+    Args:
+        owner (object): The module or class.
+        attribute (str): The name of the attribute.
+        value (object): The temporary value.
+
+    Yields:
+        None
+    """
+    original = getattr(owner, attribute)
+    setattr(owner, attribute, value)
+    try:
+        yield
+    finally:
+        setattr(owner, attribute, original)
+
+
+def bench_scrape(servers: FakeServers, size: int, workdir: str, page_rate: float = 1000.0) -> dict:
+    """
+    Scrapes `size` articles from the fake Scholar, resolving their DOIs with the fake Crossref.
+
+    Args:
+        servers (FakeServers): The running fake servers.
+        size (int): The number of articles.
+        workdir (str): A scratch folder (for the DOI cache).
+        page_rate (float, optional): The Scholar pages requested per second. Defaults to 1000 (no pacing).
+
+    Returns:
+        dict: The measurements (see `run_scenario`).
+    """
+    nb_pages = -(-size // scraper.NB_RESULTS_PER_PAGE)
+    recorder = LatencyRecorder([(scraper.httpx.Client, 'get', 'page'), (scraper, 'resolve_doi', 'doi')])
+    with patched(scraper, 'SCHOLAR_URL', f"{servers.url}/scholar"), \
+            patched(scraper, 'Crossref', functools.partial(Crossref, base_url=servers.url)), \
+            recorder:
+        start = time.perf_counter()
+        articles = scraper.scrape("benchmark", nb_pages, cache_path=os.path.join(workdir, "doi_cache.sqlite"),
+                                  page_rate=page_rate, index_path=None)
+        elapsed = time.perf_counter() - start
+
+    return {'items': len(articles),
+            'failed': sum(1 for article in articles if not article['doi']),
+            'elapsed': elapsed,
+            'latency': recorder.summary()}
+
+
+def bench_download(servers: FakeServers, size: int, workdir: str, workers: int = 4) -> dict:
+    """
+    Downloads `size` synthetic PDF files from the fake mirror with `download_from_json`.
+
+    Args:
+        servers (FakeServers): The running fake servers.
+        size (int): The number of files.
+        workdir (str): A scratch folder (for the article list and the downloads).
+        workers (int, optional): The number of concurrent downloads. Defaults to 4.
+
+    Returns:
+        dict: The measurements (see `run_scenario`).
+    """
+    articles_file = os.path.join(workdir, "articles.jsonl")
+    with JsonlWriter(articles_file) as writer:
+        for rank in range(size):
+            title = synthetic_title("benchmark", rank)
+            writer.write({'title': title, 'link': f"{servers.url}/article/{rank}", 'doi': synthetic_doi(title)})
+
+    recorder = LatencyRecorder([(downloader.DownloadEngine, 'fetch', 'file')])
+    with patched(downloader, 'MIRROR_URL', f"{servers.url}/pdf"), recorder:
+        start = time.perf_counter()
+        results = downloader.download_from_json(articles_file, os.path.join(workdir, "pdfs"),
+                                                workers=workers, rate=1000.0, index_path=None) or []
+        elapsed = time.perf_counter() - start
+
+    return {'items': sum(1 for result in results if result['status'] == 'ok'),
+            'failed': sum(1 for result in results if result['status'] != 'ok'),
+            'bytes': sum(result['bytes'] for result in results),
+            'elapsed': elapsed,
+            'latency': recorder.summary()}
+
+
+def bench_analyze(servers: FakeServers, size: int, workdir: str, concurrency: int = 16) -> dict:
+    """
+    Analyzes `size` synthetic PDF files with `analyze_pdfs` against the fake chat completions API.
+
+    The text and response caches and the article index are disabled so that every file is extracted and sent.
+
+    Args:
+        servers (FakeServers): The running fake servers.
+        size (int): The number of files.
+        workdir (str): A scratch folder (for the PDF files and the results).
+        concurrency (int, optional): The maximum number of requests in flight. Defaults to 16.
+
+    Returns:
+        dict: The measurements (see `run_scenario`).
+    """
+    input_folder = os.path.join(workdir, "analyze_pdfs")
+    os.makedirs(input_folder, exist_ok=True)
+    for rank in range(size):
+        with open(os.path.join(input_folder, f"article_{rank:05d}.pdf"), "wb") as file:
+            file.write(synthetic_pdf(f"article-{rank}", servers.pdf_size))
+
+    output_folder = os.path.join(workdir, "analyze_results")
+    recorder = LatencyRecorder([(LLMScheduler, 'complete', 'completion')])
+    with patched(openai, 'api_key', openai.api_key or "benchmark"), recorder:
+        start = time.perf_counter()
+        analyze_pdfs(input_folder, output_folder, text_cache=None, llm_cache=None, concurrency=concurrency,
+                     rpm=1_000_000, tpm=1_000_000_000, api_base=f"{servers.url}/v1", index_path=None)
+        elapsed = time.perf_counter() - start
+
+    with open(os.path.join(output_folder, "results.json")) as fid:
+        results = json.load(fid)
+    nb_failed = sum(1 for result in results.values() if "error" in result)
+    return {'items': len(results) - nb_failed,
+            'failed': nb_failed,
+            'elapsed': elapsed,
+            'latency': recorder.summary()}
+
+
+def run_scenario(name: str, servers: FakeServers, size: int, verbose: bool = False, **options) -> dict:
+    """
+    Runs one scenario in a scratch folder and computes its throughput.
+
+    Args:
+        name (str): The scenario ('scrape', 'download' or 'analyze').
+        servers (FakeServers): The running fake servers.
+        size (int): The corpus size (number of articles).
+        verbose (bool, optional): Whether to show the output of the project functions. Defaults to False.
+        **options: Additional arguments of the scenario function.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'scenario', 'size': The scenario and the corpus size.
+            - 'items': The number of articles successfully processed.
+            - 'failed': The number of articles that failed.
+            - 'elapsed': The wall-clock duration in seconds.
+            - 'throughput': The number of articles processed per second.
+            - 'latency': Series -> {'count', 'mean', 'p50', 'p95'} in seconds.
+            - 'bytes', 'mb_per_s': The volume downloaded and its rate (download only).
+    """
+    scenarios = {'scrape': bench_scrape, 'download': bench_download, 'analyze': bench_analyze}
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            measurements = scenarios[name](servers, size, workdir, **options)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    elapsed = max(measurements['elapsed'], 1e-9)
+    result = {'scenario': name, 'size': size, **measurements, 'throughput': measurements['items'] / elapsed}
+    if 'bytes' in measurements:
+        result['mb_per_s'] = measurements['bytes'] / 1_048_576 / elapsed
+    return result
+
+
+def format_results(results: list) -> str:
+    """
+    Formats the benchmark results as a table.
+
+    Args:
+        results (list): The results of `run_scenario`.
+
+    Returns:
+        str: One row per latency series of each run.
+    """
+    header = f"{'Scenario':<10} {'Size':<6} {'Items':<6} {'Failed':<7} {'Time (s)':<9} {'Items/s':<9} " \
+             f"{'Series':<11} {'p50 (ms)':<9} {'p95 (ms)':<9}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        for series, latency in result['latency'].items():
+            p50 = f"{latency['p50'] * 1000:.1f}" if latency['p50'] is not None else "-"
+            p95 = f"{latency['p95'] * 1000:.1f}" if latency['p95'] is not None else "-"
+            lines.append(f"{result['scenario']:<10} {result['size']:<6} {result['items']:<6} {result['failed']:<7} "
+                         f"{result['elapsed']:<9.2f} {result['throughput']:<9.1f} {series:<11} {p50:<9} {p95:<9}")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages against local fake services.")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                        help="scenarios to run (default: all)")
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES),
+                        help="corpus sizes in articles (default: %(default)s)")
+    parser.add_argument('--latency', type=float, default=20.0,
+                        help="latency of Scholar, Crossref and the mirror in ms (default: %(default)s)")
+    parser.add_argument('--mirror-error-rate', type=float, default=0.0,
+                        help="probability of a 503 from the mirror (default: %(default)s)")
+    parser.add_argument('--pdf-size', type=int, default=200,
+                        help="size of the synthetic PDF files in kB (default: %(default)s)")
+    parser.add_argument('--llm-latency', type=float, default=300.0,
+                        help="latency of the chat completions API in ms (default: %(default)s)")
+    parser.add_argument('--llm-error-rate', type=float, default=0.0,
+                        help="probability of a 429 from the chat completions API (default: %(default)s)")
+    parser.add_argument('--output', default=BENCHMARK_RESULTS, help="JSON results file (default: %(default)s)")
+    parser.add_argument('--verbose', action='store_true', help="show the output of the pipeline")
+    args = parser.parse_args()
+
+    fake_servers = FakeServers(scholar=FakeEndpoint(args.latency / 1000),
+                               crossref=FakeEndpoint(args.latency / 1000),
+                               mirror=FakeEndpoint(args.latency / 1000, args.mirror_error_rate),
+                               llm=FakeEndpoint(args.llm_latency / 1000, args.llm_error_rate, error_status=429),
+                               pdf_size=args.pdf_size * 1000)
+
+    benchmark_results = []
+    with fake_servers:
+        for scenario in args.scenarios:
+            for corpus_size in args.sizes:
+                benchmark_results.append(run_scenario(scenario, fake_servers, corpus_size, verbose=args.verbose))
+                print(f"\033[92m{scenario} x {corpus_size}: {benchmark_results[-1]['throughput']:.1f} articles/s\033[0m")
+
+    with open(args.output, "w") as fid:
+        json.dump({'created': time.time(), 'config': vars(args), 'results': benchmark_results}, fid, indent=4)
+
+    print(format_results(benchmark_results))
+    print(f"Results saved to {args.output}")
@@ -0,0 +1,180 @@
+
+# External libraries
+import re
+import time
+import sqlite3
+import threading
+import unicodedata
+from habanero import Crossref
+
+# Internal libraries
+import metrics
+
+# Default location of the DOI cache
+DOI_CACHE_PATH = "doi_cache.sqlite"
+
+# Time-to-live of cached answers, in seconds
+POSITIVE_TTL = 90 * 24 * 3600   # A title with a DOI rarely changes
+NEGATIVE_TTL = 7 * 24 * 3600    # Crossref may index the article later
+
+
+def normalize_title(title: str) -> str:
+    """
+    Normalizes an article title so that small variations map to the same cache key.
+
+    Google Scholar markers such as '[PDF]' or '[HTML]' are removed, accents are folded,
+    punctuation is dropped and whitespace is collapsed.
+
+    Args:
+        title (str): The title to normalize.
+
+    Returns:
+        str: The normalized title.
+    """
+    title = re.sub(r'^(\s*\[[A-Z]+\])+', '', title)
+    title = unicodedata.normalize('NFKD', title)
+    title = ''.join(c for c in title if not unicodedata.combining(c))
+    title = re.sub(r'[^\w\s]', ' ', title.lower())
+    return ' '.join(title.split())
+
+
+class DoiCache:
+    """
+    Persistent SQLite cache mapping normalized titles to DOIs.
+
+    Titles for which Crossref returned no result are cached too (negative caching), with a
+    shorter time-to-live than the titles that resolved to a DOI.
+
+    Args:
+        path (str, optional): The path to the SQLite database. Defaults to DOI_CACHE_PATH.
+        positive_ttl (float, optional): Lifetime of a cached DOI in seconds. Defaults to 90 days.
+        negative_ttl (float, optional): Lifetime of a cached miss in seconds. Defaults to 7 days.
+    """
+
+    def __init__(self,
+                 path: str = DOI_CACHE_PATH,
+                 positive_ttl: float = POSITIVE_TTL,
+                 negative_ttl: float = NEGATIVE_TTL):
+        self.path = path
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS dois ("
+            "title_key TEXT PRIMARY KEY, "
+            "doi TEXT, "
+            "fetched_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get(self, title: str):
+        """
+        Looks up a title in the cache.
+
+        Args:
+            title (str): The title of the article.
+
+        Returns:
+            tuple: (found, doi) where `found` is False if the title is missing or expired,
+                   and `doi` is None for a cached negative result.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT doi, fetched_at FROM dois WHERE title_key = ?",
+                (normalize_title(title),)
+            ).fetchone()
+
+        if row is None:
+            return False, None
+
+        doi, fetched_at = row
+        ttl = self.positive_ttl if doi else self.negative_ttl
+        if time.time() - fetched_at > ttl:
+            return False, None
+
+        return True, doi
+
+    def put(self, title: str, doi: str):
+        """
+        Stores the DOI (or the absence of DOI) found for a title.
+
+        Args:
+            title (str): The title of the article.
+            doi (str): The DOI found, or None if Crossref returned no result.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO dois (title_key, doi, fetched_at) VALUES (?, ?, ?)",
+                (normalize_title(title), doi, time.time())
+            )
+            self._connection.commit()
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._connection.close()
+
+
+def lookup_doi(title: str, cr: Crossref = None) -> str:
+    """
+    Queries Crossref for the DOI of the best match of a title.
+
+    Args:
+        title (str): The title of the article.
+        cr (Crossref, optional): The Crossref client to use. Defaults to None (new client).
+
+    Returns:
+        str: The DOI of the first result, or None if Crossref found nothing.
+
+    Raises:
+        Exception: Any network or API error raised by habanero.
+    """
+    cr = cr or Crossref()
+    with metrics.span('crossref_request'):
+        search_results = cr.works(query=title, limit=1)
+    if search_results['message']['items']:
+        return search_results['message']['items'][0].get('DOI')
+    return None
+
+
+def resolve_doi(title: str,
+                cr: Crossref = None,
+                cache: DoiCache = None) -> str:
+    """
+    Resolves the DOI of a single title, using the cache first and Crossref if needed.
+
+    Errors are printed and not cached, so that a title that failed because of a network
+    issue is retried on the next run.
+
+    Args:
+        title (str): The title to resolve.
+        cr (Crossref, optional): The Crossref client to use. Defaults to None (new client).
+        cache (DoiCache, optional): The cache to read from and write to. Defaults to None (no cache).
+
+    Returns:
+        str: The DOI of the article, or None if it could not be found.
+    """
+    if cache:
+        found, doi = cache.get(title)
+        metrics.inc('doi_cache', result='hit' if found else 'miss')
+        if found:
+            return doi
+
+    try:
+        doi = lookup_doi(title, cr)
+    except Exception as e:
+        print(f"Error fetching DOI for title '{title}': {e}")
+        return None
+
+    if cache:
+        cache.put(title, doi)
+    return doi
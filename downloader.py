@@ -4,69 +4,566 @@ import os
 import re
 import json
 import time
-import requests
+import shutil
+import hashlib
+import contextlib
+import threading
+import httpx
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Internal libraries
+import metrics
+from article_index import ARTICLE_INDEX_PATH, ArticleIndex
+from http_client import HttpClients, shared_clients
+from manifest import DownloadManifest
+from proxy import ProxyPool, limiter_key, proxy_url
+from ratelimit import THROTTLE_STATUS_CODES, HostRateLimiter, host_of, parse_retry_after
+from storage import iter_jsonl
+
+
+# Base URL of the PDF mirror
+MIRROR_URL = "https://sci.bban.top/pdf"
+
+# Headers to mimic a browser request
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
+    "Referer": "https://www.wellesu.com/",
+    "Upgrade-Insecure-Requests": "1",
+    "Sec-CH-UA": '"Google Chrome";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
+    "Sec-CH-UA-Mobile": "?0",
+    "Sec-CH-UA-Platform": "Windows",
+}
+
+# Number of times a download starts over when the server rejects the range of its partial file (416)
+MAX_RESTARTS = 2
+
+# A PDF file starts with this signature, within its first bytes
+PDF_MAGIC = b"%PDF"
+PDF_HEADER_WINDOW = 1024
+
+# Subfolder of the output folder where invalid responses are kept for inspection
+QUARANTINE_FOLDER = "quarantine"
+
+# Rate limiter shared by the successive calls of `download`
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+# Engines reused by the successive calls of `download`, so that each manifest is only loaded once
+_download_engines = {}
+_download_engines_lock = threading.Lock()
+
+
+class DownloadEngine:
+    """
+    Downloads PDF articles concurrently while pacing the requests sent to each host.
+
+    The requests go through shared long-lived HTTP clients (see `HttpClients`), so the
+    connections to the mirror are kept alive and reused from one file to the next.
+
+    A pool of worker threads shares a per-host token bucket rate limiter. Whenever the
+    mirror answers with 429 or 503, the host is paused (honoring Retry-After when present),
+    its rate is reduced, and the download is retried.
+
+    With a proxy pool, each attempt goes through a proxy picked by the pool, the rate limits
+    apply per host and exit IP, and connection errors are retried through another proxy.
+
+    Progress is recorded in a per-folder manifest: DOIs already downloaded are skipped
+    without any network access, and interrupted downloads kept as `.part` files are
+    resumed with HTTP Range requests. With an article index, a DOI already downloaded into
+    another folder (e.g. found by another query) is hard-linked (or copied) into this one
+    instead of being downloaded again, and every outcome is recorded in the index.
+
+    Responses are validated while they stream in: a body that does not start with the PDF
+    signature (e.g. a CAPTCHA page) is aborted after its first chunk and its beginning is
+    quarantined, and the size cap is enforced on the bytes received even when the server
+    sends no Content-Length. Nothing reaches the final file name before it is complete.
+
+    Args:
+        output_folder (str): The folder where the downloaded PDFs will be saved.
+        max_size (int, optional): The maximum allowed size of each file in MB. Defaults to 5 MB.
+        workers (int, optional): The number of concurrent downloads. Defaults to 4.
+        rate (float, optional): The maximum number of requests per second per host. Defaults to 1.
+        burst (float, optional): The number of requests that can be sent back-to-back to a host. Defaults to 1.
+        max_attempts (int, optional): The number of attempts per DOI when throttled. Defaults to 5.
+        proxy_pool (ProxyPool, optional): The proxies to send the requests through. Defaults to None (direct).
+        clients (HttpClients, optional): The HTTP clients to use. Defaults to None (the process-wide shared clients).
+        index (ArticleIndex, optional): The article index shared by all the folders. Defaults to None (no index).
+        limiter (HostRateLimiter, optional): The rate limiter to share with other engines, in which case `rate` and
+            `burst` are ignored. Defaults to None (a limiter of this engine).
+    """
+
+    def __init__(self,
+                 output_folder: str,
+                 max_size: int = 5,
+                 workers: int = 4,
+                 rate: float = 1.0,
+                 burst: float = 1.0,
+                 max_attempts: int = 5,
+                 proxy_pool: ProxyPool = None,
+                 clients: HttpClients = None,
+                 index: ArticleIndex = None,
+                 limiter: HostRateLimiter = None):
+        self.output_folder = output_folder
+        self.max_size = max_size
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.limiter = limiter or HostRateLimiter(rate=rate, burst=burst)
+        self.manifest = DownloadManifest(output_folder)
+        self.proxy_pool = proxy_pool
+        self.clients = clients or shared_clients()
+        self.index = index
+
+    def run(self, dois, report: bool = True) -> list:
+        """
+        Downloads all the given DOIs.
+
+        Args:
+            dois (iterable): The DOIs of the articles to download.
+            report (bool, optional): Whether to print the throughput at the end. Defaults to True.
+
+        Returns:
+            list: One result dictionary per DOI (see `fetch`), with the status 'cached' for the DOIs already in
+                  the folder and 'indexed' for those linked from another folder.
+        """
+
+        # Create destination folder if it doesn't exist
+        os.makedirs(self.output_folder, exist_ok=True)
+
+        # Skip the DOIs already downloaded in a previous run and keep a bounded
+        # number of downloads in flight, so that `dois` can be a lazy stream
+        results, downloaded, in_flight = [], [], set()
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for doi in dois:
+                if self.manifest.is_complete(doi):
+                    entry = self.manifest.get(doi)
+                    results.append({'doi': doi, 'status': 'cached', 'bytes': entry['bytes'], 'error': None})
+
+                    # Index the folders downloaded before the index existed
+                    if self.index and self.index.downloaded(doi) is None:
+                        self.index.record_download(doi, 'ok', pdf_path=os.path.join(self.output_folder, entry['filename']),
+                                                   sha256=entry['sha256'], size=entry['bytes'])
+                    continue
+
+                # Reuse the file downloaded for another query or year
+                linked = self._link_indexed(doi) if self.index else None
+                if linked is not None:
+                    results.append(linked)
+                    continue
+
+                if len(in_flight) >= 2 * self.workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    downloaded.extend(future.result() for future in done)
+                in_flight.add(executor.submit(self._download, doi))
+
+            downloaded.extend(future.result() for future in wait(in_flight).done)
+        elapsed = time.perf_counter() - start_time
+
+        for result in results + downloaded:
+            metrics.inc('downloads', status=result['status'])
+        metrics.inc('bytes', sum(result['bytes'] for result in downloaded), stage='download')
+
+        if results:
+            nb_indexed = sum(result['status'] == 'indexed' for result in results)
+            print(f"Skipped {len(results)} articles already downloaded ({nb_indexed} linked from other folders)")
+
+        if report:
+            print_throughput(downloaded, elapsed)
+
+        return results + downloaded
+
+    def _link_indexed(self, doi: str) -> dict:
+        """
+        Links the file of a DOI downloaded into another folder, as found in the article index.
+
+        Args:
+            doi (str): The DOI of the article.
+
+        Returns:
+            dict: The result of the download (status 'indexed'), or None if the DOI must be downloaded (not indexed,
+                  or its indexed file can no longer be read).
+        """
+        article = self.index.downloaded(doi)
+        metrics.inc('article_index', stage='download', result='hit' if article else 'miss')
+        if article is None:
+            return None
+
+        filename = f"{doi_to_filename(doi)}.pdf"
+        output_file = os.path.join(self.output_folder, filename)
+        if os.path.abspath(output_file) != article['pdf_path']:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            try:
+                try:
+                    os.link(article['pdf_path'], output_file)
+                except OSError:
+                    # Other file system, or no hard links
+                    shutil.copyfile(article['pdf_path'], output_file)
+            except OSError as e:
+                # The indexed file was moved or deleted since the lookup, download it again
+                print(f"\033[93mIndexed file of {doi} unavailable ({e}), downloading it again\033[0m")
+                self.index.forget_download(doi, article['pdf_path'])
+                return None
+
+        self.manifest.update(doi, status='ok', filename=filename, bytes=article['bytes'],
+                             sha256=article['sha256'], error=None)
+        return {'doi': doi, 'status': 'indexed', 'bytes': article['bytes'], 'error': None}
+
+    def _download(self, doi: str) -> dict:
+        """
+        Downloads a single PDF (see `fetch`) and records the outcome in the article index.
+
+        Args:
+            doi (str): The DOI of the article to download.
+
+        Returns:
+            dict: The result of the download (see `fetch`).
+        """
+        result = self.fetch(doi)
+        if self.index:
+            entry = self.manifest.get(doi) or {}
+            ok = result['status'] == 'ok'
+            self.index.record_download(doi, result['status'],
+                                       pdf_path=os.path.join(self.output_folder, entry['filename']) if ok else None,
+                                       sha256=entry.get('sha256') if ok else None,
+                                       size=entry.get('bytes') if ok else None)
+        return result
+
+    def fetch(self, doi: str) -> dict:
+        """
+        Downloads a single PDF, retrying when the mirror throttles the request.
+
+        Args:
+            doi (str): The DOI of the article to download.
+
+        Returns:
+            dict: A dictionary containing:
+                - 'doi': The DOI of the article.
+                - 'status': 'ok', 'too_large', 'invalid' (not a PDF), 'partial' (interrupted, resumable) or 'failed'.
+                - 'bytes': The number of bytes transferred.
+                - 'error': A description of the failure, if any.
+        """
+
+        # Build the URL from the DOI
+        pdf_url = f"{MIRROR_URL}/{doi}.pdf"
+        host = host_of(pdf_url)
+        filename = f"{doi_to_filename(doi)}.pdf"
+        output_file = os.path.join(self.output_folder, filename)
+        part_file = output_file + ".part"
+        result = {'doi': doi, 'status': 'failed', 'bytes': 0, 'error': None}
+
+        attempt, restarts = 0, 0
+        while attempt < self.max_attempts:
+            attempt += 1
+
+            # Pick an exit, then wait for our turn on this host from that exit
+            try:
+                proxy = self.proxy_pool.choose() if self.proxy_pool else None
+            except RuntimeError as e:
+                result['error'] = str(e)
+                self.manifest.update(doi, status='failed', filename=filename, error=result['error'])
+                return result
+            key = limiter_key(host, proxy)
+            self.limiter.acquire(key)
+
+            # Resume from the partial file left by a previous attempt, if any
+            offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+            headers = dict(HEADERS)
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+
+            client = self.clients.get(proxy_url(proxy))
+            response = None
+            try:
+
+                # Send a GET request to download the PDF, the body is streamed below
+                request_start = time.perf_counter()
+                with metrics.span('mirror_request'):
+                    response = client.send(client.build_request("GET", pdf_url, headers=headers), stream=True)
+                latency = time.perf_counter() - request_start
+
+                # Back off and retry if the server is throttling us
+                if response.status_code in THROTTLE_STATUS_CODES:
+                    if self.proxy_pool:
+                        self.proxy_pool.report(proxy, ok=False)
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    delay = self.limiter.penalize(key, retry_after)
+                    metrics.inc('retries', stage='download', reason='throttled')
+                    result['error'] = f"Status code {response.status_code}"
+                    print(f"Throttled on {doi} (status {response.status_code}), retrying in {delay:.0f} s (attempt {attempt}/{self.max_attempts})")
+                    continue
+
+                if self.proxy_pool:
+                    self.proxy_pool.report(proxy, ok=True, latency=latency)
+
+                # The partial file is stale or already complete, start over (not a throttled attempt)
+                if response.status_code == 416:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(part_file)
+                    restarts += 1
+                    if restarts > MAX_RESTARTS:
+                        result['error'] = "Status code 416"
+                        print("Failed to download the PDF. Status code: 416")
+                        self.manifest.update(doi, status='failed', filename=filename, error=result['error'])
+                        return result
+                    attempt -= 1
+                    continue
+
+                # Check if the request was successful
+                if response.status_code not in (200, 206):
+                    result['error'] = f"Status code {response.status_code}"
+                    print(f"Failed to download the PDF. Status code: {response.status_code}")
+                    self.manifest.update(doi, status='failed', filename=filename, error=result['error'])
+                    return result
+
+                self.limiter.reward(key)
+
+                # The server ignored the Range header and sends the whole file
+                if response.status_code == 200:
+                    offset = 0
+
+                # Get the total size from the headers (if provided)
+                total_size = content_total_size(response, offset)
+                if total_size is not None:
+                    size_in_mb = total_size / (1_048_576)  # Bytes -> Megabytes
+                    if size_in_mb > self.max_size:
+                        print(f"File size {size_in_mb:.2f} MB exceeds the maximum allowed size of {self.max_size} MB. Download aborted.")
+                        result['status'] = 'too_large'
+                        result['error'] = f"File size {size_in_mb:.2f} MB exceeds {self.max_size} MB"
+                        self.manifest.update(doi, status='too_large', filename=filename, error=result['error'])
+                        return result
+
+                # Hash the bytes already on disk before appending to them
+                sha256 = hashlib.sha256()
+                if offset:
+                    with open(part_file, "rb") as file:
+                        for chunk in iter(lambda: file.read(1_048_576), b""):
+                            sha256.update(chunk)
+
+                # Write the content to the partial file, aborting as soon as it is not acceptable
+                failure = self._stream_body(response, part_file, offset, sha256, result)
+                if failure is not None:
+                    result['status'], result['error'] = failure
+                    print(f"Download of {doi} aborted: {result['error']}")
+                    self.manifest.update(doi, status=result['status'], filename=filename, error=result['error'])
+                    return result
+
+                # Publish the completed file
+                os.replace(part_file, output_file)
+                self.manifest.update(doi,
+                                     status='ok',
+                                     filename=filename,
+                                     bytes=os.path.getsize(output_file),
+                                     sha256=sha256.hexdigest(),
+                                     error=None)
+
+                result['status'] = 'ok'
+                result['error'] = None
+                return result
+
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                result['error'] = str(e)
+
+                # Try again through another proxy if this one could not be reached
+                if proxy is not None and isinstance(e, httpx.TransportError):
+                    self.proxy_pool.report(proxy, ok=False)
+                    metrics.inc('retries', stage='download', reason='connection')
+                    continue
+
+                # Keep the partial file so that the next run can resume it
+                if os.path.exists(part_file):
+                    result['status'] = 'partial'
+                    self.manifest.update(doi, status='partial', filename=filename,
+                                         bytes=os.path.getsize(part_file), error=result['error'])
+                else:
+                    self.manifest.update(doi, status='failed', filename=filename, error=result['error'])
+                return result
+
+            finally:
+                # Give the connection back to the pool
+                if response is not None:
+                    response.close()
+
+        print(f"Giving up on {doi} after {self.max_attempts} throttled attempts.")
+        self.manifest.update(doi, status='failed', filename=filename, error=result['error'])
+        return result
+
+
+    def _stream_body(self, response, part_file: str, offset: int, sha256, result: dict) -> tuple:
+        """
+        Streams the body of a response to the partial file, validating it on the fly.
+
+        A new download is buffered until its first `PDF_HEADER_WINDOW` bytes have been
+        checked for the PDF signature, so no file is created for an invalid response.
+
+        Args:
+            response (httpx.Response): The streamed response.
+            part_file (str): Path to the partial file.
+            offset (int): The number of bytes already in the partial file (already validated).
+            sha256 (hashlib._Hash): The hash of the file, updated with the bytes written.
+            result (dict): The result of the download, whose 'bytes' (transferred over all attempts) are updated.
+
+        Returns:
+            tuple: (status, error) if the download was aborted ('too_large' or 'invalid'), otherwise None.
+        """
+        max_bytes = self.max_size * 1_048_576
+        received = 0
+        head = b""
+        file = open(part_file, "ab") if offset else None
+        try:
+            for chunk in response.iter_bytes(chunk_size=8192):
+                received += len(chunk)
+                result['bytes'] += len(chunk)
+
+                # Enforce the size cap on the bytes on disk plus those of this response, whatever the headers said
+                if offset + received > max_bytes:
+                    if file is not None:
+                        file.close()
+                        file = None
+                        os.remove(part_file)
+                    return 'too_large', f"More than {self.max_size} MB received"
+
+                # Check the signature before writing anything
+                if file is None:
+                    head += chunk
+                    if len(head) < PDF_HEADER_WINDOW:
+                        continue
+                    if PDF_MAGIC not in head[:PDF_HEADER_WINDOW]:
+                        return 'invalid', self._quarantine(part_file, head, response)
+                    file = open(part_file, "wb")
+                    chunk, head = head, b""
+
+                file.write(chunk)
+                sha256.update(chunk)
+
+            # Short responses never fill the header window
+            if file is None:
+                if PDF_MAGIC not in head:
+                    return 'invalid', self._quarantine(part_file, head, response)
+                file = open(part_file, "wb")
+                file.write(head)
+                sha256.update(head)
+            return None
+
+        finally:
+            if file is not None:
+                file.close()
+
+    def _quarantine(self, part_file: str, head: bytes, response) -> str:
+        """
+        Keeps the beginning of an invalid response in the quarantine folder for inspection.
+
+        Args:
+            part_file (str): Path to the partial file the response was meant for.
+            head (bytes): The first bytes of the response.
+            response (httpx.Response): The response.
+
+        Returns:
+            str: A description of the invalid response.
+        """
+        folder = os.path.join(self.output_folder, QUARANTINE_FOLDER)
+        os.makedirs(folder, exist_ok=True)
+        name = os.path.basename(part_file)[:-len(".pdf.part")]
+        with open(os.path.join(folder, f"{name}.bin"), "wb") as file:
+            file.write(head[:65_536])
+
+        content_type = response.headers.get("Content-Type", "unknown")
+        return f"Not a PDF (Content-Type: {content_type}), quarantined as {QUARANTINE_FOLDER}/{name}.bin"
+
+
+def shared_limiter() -> HostRateLimiter:
+    """
+    Returns the process-wide rate limiter of `download`, created with the default settings on first use.
+
+    Returns:
+        HostRateLimiter: The shared limiter.
+    """
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = HostRateLimiter()
+        return _shared_limiter
 
 
 def download(doi: str, 
              output_folder: str,
-             max_size: int = 5):
+             max_size: int = 5,
+             proxy_pool: ProxyPool = None,
+             limiter: HostRateLimiter = None) -> dict:
     """
     Downloads a PDF article from a DOI-based URL, with an optional size limit.
 
+    Successive calls share a rate limiter, so they are paced per host like the downloads of
+    a single `DownloadEngine`, and the calls for the same folder (and settings) reuse one
+    engine, so its manifest is loaded only once. The folder must not be written by another
+    engine meanwhile; batches of DOIs are better served by `DownloadEngine.run`.
+
     Args:
         doi (str): The DOI of the article to download.
         output_folder (str): The folder where the downloaded PDF will be saved.
         max_size (int, optional): The maximum allowed size of the file in MB. Defaults to 5 MB.
+        proxy_pool (ProxyPool, optional): The proxies to send the requests through. Defaults to None (direct).
+        limiter (HostRateLimiter, optional): The rate limiter to use. Defaults to None (the process-wide one,
+            see `shared_limiter`).
 
     Returns:
-        str: A message indicating success or failure of the download.
+        dict: The result of the download (see `DownloadEngine.fetch`).
     """
+    limiter = limiter or shared_limiter()
+    key = (os.path.abspath(output_folder), max_size, proxy_pool, limiter)
+    with _download_engines_lock:
+        engine = _download_engines.get(key)
+        if engine is None:
+            engine = DownloadEngine(output_folder, max_size=max_size, workers=1, proxy_pool=proxy_pool,
+                                    limiter=limiter)
+            _download_engines[key] = engine
+    return engine.run([doi], report=False)[0]
 
-    # Build the URL from the DOI
-    pdf_url = f"https://sci.bban.top/pdf/{doi}.pdf"
 
-    # Create destination folder if it doesn't exist
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+def print_throughput(results: list, elapsed: float):
+    """
+    Prints a summary of a batch of downloads.
 
-    output_file = os.path.join(output_folder, f"{doi_to_filename(doi)}.pdf")
+    Args:
+        results (list): The result dictionaries returned by `DownloadEngine.fetch`.
+        elapsed (float): The wall-clock duration of the batch in seconds.
 
-    # Headers to mimic a browser request
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-        "Referer": "https://www.wellesu.com/",
-        "Upgrade-Insecure-Requests": "1",
-        "Sec-CH-UA": '"Google Chrome";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
-        "Sec-CH-UA-Mobile": "?0",
-        "Sec-CH-UA-Platform": "Windows",
-    }
+    Returns:
+        None
+    """
+    nb_ok = sum(1 for result in results if result['status'] == 'ok')
+    size_in_mb = sum(result['bytes'] for result in results) / 1_048_576
+    elapsed = max(elapsed, 1e-9)
+    print(f"Downloaded {nb_ok}/{len(results)} files ({size_in_mb:.2f} MB) in {elapsed:.1f} s: "
+          f"{nb_ok / elapsed:.2f} files/s, {size_in_mb / elapsed:.2f} MB/s")
 
-    try:
 
-        # Send a GET request to download the PDF
-        response = requests.get(pdf_url, headers=headers, stream=True)
-
-        # Check if the request was successful
-        if response.status_code == 200:
-            
-            # Get content length from headers (if provided)
-            content_length = response.headers.get("Content-Length")
-            if content_length:
-                size_in_mb = int(content_length) / (1_048_576)  # Bytes -> Megabytes
-                if size_in_mb > max_size:
-                    print(f"File size {size_in_mb:.2f} MB exceeds the maximum allowed size of {max_size} MB. Download aborted.")
-                    return
-
-            # Write the content to a file
-            with open(output_file, "wb") as file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    file.write(chunk)
-            return
-        else:
-            print(f"Failed to download the PDF. Status code: {response.status_code}")
+def content_total_size(response, offset: int = 0) -> int:
+    """
+    Computes the full size of a file from the headers of a (possibly partial) response.
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    Args:
+        response (httpx.Response): The response being downloaded.
+        offset (int, optional): The number of bytes already on disk. Defaults to 0.
+
+    Returns:
+        int: The total size of the file in bytes, or None if the server did not send it.
+    """
+
+    # Partial content: 'Content-Range: bytes 1000-4999/5000'
+    content_range = response.headers.get("Content-Range")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+
+    # Full content (or partial content without a total)
+    content_length = response.headers.get("Content-Length")
+    if content_length:
+        return offset + int(content_length)
+
+    return None
 
 
 def doi_to_filename(doi: str) -> str:
@@ -86,36 +583,56 @@ def doi_to_filename(doi: str) -> str:
 
 def download_from_json(file_path: str,
                        output_folder: str, 
-                       max_size: int = 5):
+                       max_size: int = 5,
+                       workers: int = 4,
+                       rate: float = 1.0,
+                       proxy_pool: ProxyPool = None,
+                       index_path: str = ARTICLE_INDEX_PATH,
+                       limiter: HostRateLimiter = None):
     """
-    Reads a JSON file containing article data and downloads all articles.
+    Reads a JSON or JSON Lines file containing article data and downloads all articles concurrently.
+
+    JSON Lines files (as written by `scrape`) are streamed, so the whole file is never loaded in memory.
 
     Args:
-        file_path (str): The path to the JSON file containing article data.
+        file_path (str): The path to the JSON or JSON Lines file containing article data.
         output_folder (str): The folder where the downloaded PDFs will be saved.
         max_size (int, optional): The maximum allowed size of each file in MB. Defaults to 5 MB.
+        workers (int, optional): The number of concurrent downloads. Defaults to 4.
+        rate (float, optional): The maximum number of requests per second sent to the mirror
+            (per exit IP with a proxy pool). Defaults to 1.
+        proxy_pool (ProxyPool, optional): The proxies to send the requests through. Defaults to None (direct).
+        index_path (str, optional): The path to the article index, used to skip the DOIs downloaded into other
+            folders, or None to disable it. Defaults to ARTICLE_INDEX_PATH.
+        limiter (HostRateLimiter, optional): The rate limiter to share with concurrent calls (e.g. `shared_limiter()`),
+            so that they are paced together; `rate` is then ignored. Defaults to None (a limiter of this call).
 
     Returns:
-        None
+        list: One result dictionary per downloaded DOI (see `DownloadEngine.run`).
     """
+    index = ArticleIndex(index_path) if index_path else None
     try:
 
-        # Load articles from JSON file
-        with open(file_path, 'r', encoding='utf-8') as file:
-            articles = json.load(file)
-
-        # Iterate through each article and download its PDF
-        for article in articles:
-            doi = article.get('doi')
-            if doi:
-                print(f"Downloading article with DOI: {doi}")
-                download(doi, output_folder, max_size=max_size)
-            
-                # Wait to avoid 429 error (too many requests)
-                time.sleep(5)
-            
-            else:
-                print(f"Skipping article without DOI: {article.get('title', 'Unknown title')}")
+        # Load articles from JSON file, or stream them from a JSON Lines file
+        if file_path.endswith('.jsonl'):
+            articles = iter_jsonl(file_path)
+        else:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                articles = json.load(file)
+
+        def iter_dois():
+            for article in articles:
+                doi = article.get('doi')
+                if doi:
+                    yield doi
+                else:
+                    print(f"Skipping article without DOI: {article.get('title', 'Unknown title')}")
+
+        # Download all PDFs, the engine takes care of the pacing
+        print(f"Downloading articles from '{file_path}' with {workers} workers")
+        engine = DownloadEngine(output_folder, max_size=max_size, workers=workers, rate=rate,
+                                proxy_pool=proxy_pool, index=index, limiter=limiter)
+        return engine.run(iter_dois())
 
     except FileNotFoundError:
         print(f"Error: The file '{file_path}' does not exist.")
@@ -123,3 +640,6 @@ def download_from_json(file_path: str,
         print(f"Error: Failed to decode JSON from the file '{file_path}'.")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+    finally:
+        if index:
+            index.close()
@@ -0,0 +1,474 @@
+
+# External libraries
+import os
+import re
+import sys
+import time
+import hashlib
+import multiprocessing
+from multiprocessing.connection import wait
+from PyPDF2 import PdfReader
+
+# Internal libraries
+import metrics
+from tokens import estimate_tokens
+
+# The resource module is only available on POSIX systems
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Version of the extraction logic, bump it whenever the extracted text changes
+EXTRACTOR_VERSION = 2
+
+# Default limits applied to each document
+EXTRACTION_TIMEOUT = 120.0      # Seconds
+EXTRACTION_MAX_MEMORY = 1024    # Megabytes
+EXTRACTION_MAX_CHARS = 400_000  # Characters (about 100k tokens, far more than the section selection keeps)
+EXTRACTION_MAX_TOKENS = None    # Tokens
+
+# Start method of the extraction processes: never fork the caller, whose other threads (HTTP clients, LLM
+# scheduler, SQLite connections) may hold locks at that moment and leave them locked in the child
+EXTRACTION_START_METHOD = ('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+# Number of characters from the first pages used to detect character codes ('/C65' for 'A')
+ENCODING_SAMPLE_CHARS = 20_000
+
+# Number of character codes in the sample above which the document is decoded
+CID_THRESHOLD = 100
+
+# Character codes left by PyPDF2 for the fonts it cannot map
+_CID_PATTERN = re.compile(r'\/C\d+')
+
+
+def needs_cid_decoding(sample: str) -> bool:
+    """
+    Detects from a sample of its text whether a document is written with character codes.
+
+    Args:
+        sample (str): The text of the first pages of the document.
+
+    Returns:
+        bool: True if the '/C<code>' sequences must be decoded.
+    """
+    count = 0
+    for _ in _CID_PATTERN.finditer(sample):
+        count += 1
+        if count > CID_THRESHOLD:
+            return True
+    return False
+
+
+def decode_cids(text: str) -> str:
+    """
+    Replaces the '/C<code>' sequences of a text with the characters they stand for.
+
+    Args:
+        text (str): The text of a page.
+
+    Returns:
+        str: The decoded text.
+    """
+    return _CID_PATTERN.sub(lambda x: chr(int(x.group()[2:])), text)
+
+
+def limit_pages(pages, max_chars: int = None, max_tokens: int = None, stats: dict = None):
+    """
+    Yields pages until a character or token budget is reached, cutting the last page short.
+
+    Args:
+        pages (iterable): The text of each page.
+        max_chars (int, optional): The maximum number of characters, or None. Defaults to None.
+        max_tokens (int, optional): The maximum number of tokens (see `tokens.estimate_tokens`), or None. Defaults to None.
+        stats (dict, optional): Filled with 'complete', False if the budget cut the document short. Defaults to None.
+
+    Yields:
+        str: The text of each page within the budget.
+    """
+    stats = stats if stats is not None else {}
+    stats['complete'] = True
+    nb_chars = nb_tokens = 0
+    for page in pages:
+        keep = len(page)
+        if max_chars is not None:
+            keep = min(keep, max_chars - nb_chars)
+        if max_tokens is not None and keep:
+            page_tokens = estimate_tokens(page)
+            if nb_tokens + page_tokens > max_tokens:
+                # Cut in proportion, the tokens of a page are spread evenly enough
+                keep = min(keep, len(page) * (max_tokens - nb_tokens) // max(page_tokens, 1))
+            nb_tokens += page_tokens
+
+        if keep < len(page):
+            stats['complete'] = False
+            if keep > 0:
+                yield page[:keep]
+            return
+
+        nb_chars += len(page)
+        yield page
+
+
+def iter_pages(pdf_path: str, max_chars: int = None, max_tokens: int = None, stats: dict = None):
+    """
+    Extracts the text content of a PDF file one page at a time.
+
+    Only the pages needed are parsed: the extraction stops once the budget is reached. Whether
+    the document is written with character codes is decided from its first pages (about
+    ENCODING_SAMPLE_CHARS characters), so the text never needs to be held whole.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        max_chars (int, optional): The maximum number of characters, or None. Defaults to None.
+        max_tokens (int, optional): The maximum number of tokens, or None. Defaults to None.
+        stats (dict, optional): Filled with 'complete' (see `limit_pages`) and 'decoded', whether character
+            codes were decoded. Defaults to None.
+
+    Yields:
+        str: The text of each page.
+
+    Raises:
+        Exception: Any error raised by PyPDF2 while reading the file.
+    """
+    stats = stats if stats is not None else {}
+
+    # Initialize the PDF reader, the pages are only parsed when their text is requested
+    with metrics.span('pdf_read'):
+        reader = PdfReader(pdf_path)
+
+    def extract():
+        for page in reader.pages:
+            with metrics.span('pdf_extract_page'):
+                yield page.extract_text()
+
+    # Buffer the first pages to detect the encoding from them
+    pages = extract()
+    sample, sample_size = [], 0
+    for page in pages:
+        sample.append(page)
+        sample_size += len(page)
+        if sample_size >= ENCODING_SAMPLE_CHARS:
+            break
+    stats['decoded'] = needs_cid_decoding("".join(sample))
+
+    def decoded():
+        while sample:
+            page = sample.pop(0)
+            yield decode_cids(page) if stats['decoded'] else page
+        for page in pages:
+            yield decode_cids(page) if stats['decoded'] else page
+
+    yield from limit_pages(decoded(), max_chars, max_tokens, stats)
+
+
+def extract_pages(pdf_path: str, max_chars: int = None, max_tokens: int = None) -> list:
+    """
+    Extracts the text content of each page of a specified PDF file.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        max_chars (int, optional): The maximum number of characters, or None. Defaults to None.
+        max_tokens (int, optional): The maximum number of tokens, or None. Defaults to None.
+
+    Returns:
+        list: The text of each page.
+
+    Raises:
+        Exception: Any error raised by PyPDF2 while reading the file.
+    """
+    return list(iter_pages(pdf_path, max_chars, max_tokens))
+
+
+def extract_text(pdf_path: str, max_chars: int = None, max_tokens: int = None) -> str:
+    """
+    Extracts the text content of a specified PDF file.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        max_chars (int, optional): The maximum number of characters, or None. Defaults to None.
+        max_tokens (int, optional): The maximum number of tokens, or None. Defaults to None.
+
+    Returns:
+        str: Text extracted from the PDF file.
+
+    Raises:
+        Exception: Any error raised by PyPDF2 while reading the file.
+    """
+    return "".join(iter_pages(pdf_path, max_chars, max_tokens))
+
+
+def peak_memory() -> float:
+    """
+    Returns the peak resident memory of the current process.
+
+    Returns:
+        float: The peak resident memory in MB, or None where the resource module is not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Reported in bytes on macOS, in kilobytes elsewhere
+    return peak / 1_048_576 if sys.platform == 'darwin' else peak / 1024
+
+
+def page_offsets(pages: list) -> list:
+    """
+    Computes the offset of each page in the concatenated text.
+
+    Args:
+        pages (list): The text of each page.
+
+    Returns:
+        list: The index of the first character of each page in `"".join(pages)`.
+    """
+    offsets, position = [], 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page)
+    return offsets
+
+
+def file_sha256(path: str) -> str:
+    """
+    Computes the SHA-256 of a file's content.
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1_048_576), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _extraction_worker(pdf_path: str, connection, max_memory: int, max_chars: int, max_tokens: int):
+    """
+    Entry point of the child process extracting a single document.
+
+    The growth of the address space of the process is capped, and the growth of its resident
+    memory is checked after each page, as the address space cap is not enforced on every
+    platform (e.g. macOS). Both caps apply on top of what the process inherited from its parent.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        connection (multiprocessing.connection.Connection): The pipe used to send the outcome back.
+        max_memory (int): The memory cap in MB, or None for no cap.
+        max_chars (int): The maximum number of characters, or None.
+        max_tokens (int): The maximum number of tokens, or None.
+
+    Returns:
+        None
+    """
+
+    # Cap the growth of the address space of this process (POSIX only)
+    address_space = _address_space()
+    if max_memory and resource is not None and address_space is not None:
+        limit = address_space + max_memory * 1_048_576
+        hard = resource.getrlimit(resource.RLIMIT_AS)[1]
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+    # Only the memory used by the extraction counts, not the one inherited from the parent
+    baseline = peak_memory()
+    stats = {}
+    try:
+        pages = []
+        for page in iter_pages(pdf_path, max_chars, max_tokens, stats):
+            pages.append(page)
+            if max_memory and baseline is not None and peak_memory() - baseline > max_memory:
+                raise MemoryError
+        connection.send(('ok' if any(pages) else 'empty', pages, None, stats['complete'], _memory_used(baseline)))
+    except MemoryError:
+        pages = None  # Free the text before reporting
+        connection.send(('memory', [], f"Exceeded the memory cap of {max_memory} MB", True, _memory_used(baseline)))
+    except Exception as err:
+        connection.send(('error', [], str(err), True, _memory_used(baseline)))
+    finally:
+        connection.close()
+
+
+def _address_space() -> int:
+    """
+    Measures the virtual address space of the current process.
+
+    Returns:
+        int: The size of the address space in bytes, or None if it cannot be measured (only on Linux).
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _memory_used(baseline: float) -> float:
+    """
+    Computes the peak memory used since a baseline.
+
+    Args:
+        baseline (float): The peak resident memory in MB when the extraction started, or None.
+
+    Returns:
+        float: The memory used in MB, or None if it cannot be measured.
+    """
+    return None if baseline is None else round(peak_memory() - baseline, 1)
+
+
+def _process_context():
+    """
+    Returns the multiprocessing context of the extraction processes (see EXTRACTION_START_METHOD).
+
+    With a fork server, this module is imported once by the server, so each extraction process
+    starts from a small, single-threaded process without re-importing PyPDF2.
+
+    Returns:
+        multiprocessing.context.BaseContext: The context.
+    """
+    context = multiprocessing.get_context(EXTRACTION_START_METHOD)
+    if EXTRACTION_START_METHOD == 'forkserver':
+        context.set_forkserver_preload(['extraction'])
+    return context
+
+
+def iter_extractions(pdf_paths,
+                     workers: int = None,
+                     timeout: float = EXTRACTION_TIMEOUT,
+                     max_memory: int = EXTRACTION_MAX_MEMORY,
+                     cache=None,
+                     max_chars: int = EXTRACTION_MAX_CHARS,
+                     max_tokens: int = EXTRACTION_MAX_TOKENS):
+    """
+    Extracts the text of many PDF files in parallel and yields the outcomes as they finish.
+
+    Each document is extracted in its own child process so that a pathological file can be
+    killed once it exceeds its time budget, and its memory can be capped without affecting
+    the caller. The processes are not forked from the caller (see EXTRACTION_START_METHOD),
+    which is safe from any thread of a multi-threaded program. At most `workers` processes run at once; they keep working while the caller
+    handles the outcomes already yielded.
+
+    Pages are extracted lazily and the extraction stops at the character or token budget, so
+    the memory of a long document (theses, proceedings) stays bounded; the peak memory used
+    by each extraction is reported.
+
+    When a cache is given, documents already extracted by the same extractor version are
+    served from it without parsing the PDF, and new extractions are stored in it. A document
+    cut short by a budget is only served from the cache for the same budget.
+
+    Args:
+        pdf_paths (iterable): Paths to the PDF files.
+        workers (int, optional): The number of concurrent extractions. Defaults to None (number of CPUs).
+        timeout (float, optional): The maximum extraction time per document in seconds. Defaults to EXTRACTION_TIMEOUT.
+        max_memory (int, optional): The memory cap per document in MB (POSIX only), or None. Defaults to EXTRACTION_MAX_MEMORY.
+        cache (TextCache, optional): The cache of extracted text. Defaults to None (no cache).
+        max_chars (int, optional): The maximum number of characters per document, or None. Defaults to EXTRACTION_MAX_CHARS.
+        max_tokens (int, optional): The maximum number of tokens per document, or None. Defaults to EXTRACTION_MAX_TOKENS.
+
+    Yields:
+        dict: The outcome of each extraction, containing:
+            - 'path': The path to the PDF file.
+            - 'status': 'ok', 'empty' (no text), 'error', 'timeout' or 'memory'.
+            - 'text': The extracted text ('' unless the status is 'ok').
+            - 'offsets': The offset of each page in the text.
+            - 'error': A description of the failure, if any.
+            - 'elapsed': The extraction time in seconds.
+            - 'cached': Whether the outcome was served from the cache.
+            - 'complete': False if the text was cut short by the budget.
+            - 'peak_memory': The peak memory used by the extraction in MB (None if cached or not measurable).
+    """
+    workers = workers or os.cpu_count() or 1
+    context = _process_context()
+    pending = iter(pdf_paths)
+    running = {}
+    exhausted = False
+    budget = [max_chars, max_tokens]
+
+    def outcome(path, status, pages, error, start_time, cached=False, complete=True, memory=None):
+        elapsed = time.monotonic() - start_time
+
+        # The child processes cannot report their spans, so time them from here
+        metrics.inc('extractions', status=status, cached=cached)
+        if not cached:
+            metrics.observe('pdf_extraction', elapsed, status=status)
+        if not complete:
+            metrics.inc('extractions_truncated')
+
+        return {'path': path, 'status': status, 'text': "".join(pages), 'offsets': page_offsets(pages),
+                'error': error, 'elapsed': elapsed, 'cached': cached, 'complete': complete, 'peak_memory': memory}
+
+    try:
+        while running or not exhausted:
+
+            # Keep the pool full
+            while not exhausted and len(running) < workers:
+                path = next(pending, None)
+                if path is None:
+                    exhausted = True
+                    break
+
+                # Serve the documents that were already extracted, in full or within the same budget
+                digest = file_sha256(path) if cache else None
+                entry = cache.get(digest) if cache else None
+                if entry is not None and (entry['complete'] or entry['budget'] == budget):
+                    stats = {}
+                    pages = list(limit_pages(entry['pages'], max_chars, max_tokens, stats))
+                    yield outcome(path, entry['status'], pages, None, time.monotonic(), cached=True,
+                                  complete=entry['complete'] and stats['complete'])
+                    continue
+
+                # Extract the others in a child process
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=_extraction_worker,
+                                          args=(path, sender, max_memory, max_chars, max_tokens),
+                                          daemon=True)
+                process.start()
+                sender.close()
+                running[receiver] = (process, path, time.monotonic(), digest)
+
+            if not running:
+                break
+
+            # Wait until a document is done or the oldest one runs out of time
+            now = time.monotonic()
+            next_deadline = min(start_time + timeout for _, _, start_time, _ in running.values())
+            ready = wait(list(running), timeout=max(0.0, next_deadline - now))
+
+            # Collect the finished documents
+            for receiver in ready:
+                process, path, start_time, digest = running.pop(receiver)
+                try:
+                    status, pages, error, complete, memory = receiver.recv()
+                except EOFError:
+                    process.join()
+                    status, pages, error = 'error', [], f"Worker exited with code {process.exitcode}"
+                    complete, memory = True, None
+                receiver.close()
+                process.join()
+
+                # Only deterministic outcomes are cached
+                if cache and status in ('ok', 'empty'):
+                    cache.put(digest, status, pages, budget=None if complete else budget)
+
+                yield outcome(path, status, pages, error, start_time, complete=complete, memory=memory)
+
+            # Kill the documents that exceeded their time budget
+            now = time.monotonic()
+            for receiver in [r for r, (_, _, start_time, _) in running.items() if now - start_time > timeout]:
+                process, path, start_time, _ = running.pop(receiver)
+                process.kill()
+                process.join()
+                receiver.close()
+                yield outcome(path, 'timeout', [], f"Extraction exceeded {timeout:.0f} s", start_time)
+
+    finally:
+        # Do not leave orphan processes behind if the caller stops early
+        for receiver, (process, _, _, _) in running.items():
+            process.kill()
+            process.join()
+            receiver.close()
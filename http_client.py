@@ -0,0 +1,124 @@
+
+# External libraries
+import threading
+import importlib.util
+import httpx
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Default timeouts in seconds: connecting, waiting for each chunk, sending, and waiting for a free connection
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 30.0
+WRITE_TIMEOUT = 30.0
+POOL_TIMEOUT = 60.0
+
+# Default connection pool limits of each client
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+KEEPALIVE_EXPIRY = 30.0
+
+
+class HttpClients:
+    """
+    Long-lived HTTP clients shared by the scraper and the downloader.
+
+    Connections are kept alive and reused across requests to the same host, so only the
+    first request to a host pays for the TCP and TLS handshakes; with HTTP/2, concurrent
+    requests are multiplexed over a single connection. As httpx binds a proxy to a client,
+    one client is created lazily per proxy (and one for direct connections).
+
+    The clients are thread-safe and meant to be shared by all the worker threads.
+
+    Args:
+        http2 (bool, optional): Whether to negotiate HTTP/2 when the server supports it (requires h2).
+            Defaults to True (if h2 is installed).
+        max_connections (int, optional): The maximum number of connections of each client. Defaults to MAX_CONNECTIONS.
+        max_keepalive_connections (int, optional): The maximum number of idle connections kept alive.
+            Defaults to MAX_KEEPALIVE_CONNECTIONS.
+        keepalive_expiry (float, optional): The number of seconds an idle connection is kept. Defaults to KEEPALIVE_EXPIRY.
+        connect_timeout (float, optional): The connection timeout in seconds. Defaults to CONNECT_TIMEOUT.
+        read_timeout (float, optional): The maximum wait for each chunk of the response in seconds. Defaults to READ_TIMEOUT.
+        write_timeout (float, optional): The maximum wait to send each chunk of the request in seconds. Defaults to WRITE_TIMEOUT.
+        pool_timeout (float, optional): The maximum wait for a free connection in seconds. Defaults to POOL_TIMEOUT.
+        headers (dict, optional): Headers sent with every request. Defaults to None.
+    """
+
+    def __init__(self,
+                 http2: bool = True,
+                 max_connections: int = MAX_CONNECTIONS,
+                 max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = KEEPALIVE_EXPIRY,
+                 connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT,
+                 write_timeout: float = WRITE_TIMEOUT,
+                 pool_timeout: float = POOL_TIMEOUT,
+                 headers: dict = None):
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(connect=connect_timeout,
+                                     read=read_timeout,
+                                     write=write_timeout,
+                                     pool=pool_timeout)
+        self.headers = headers
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, proxy: str = None) -> httpx.Client:
+        """
+        Returns the client sending requests through a proxy, creating it if needed.
+
+        Args:
+            proxy (str, optional): The URL of the proxy. Defaults to None (direct connection).
+
+        Returns:
+            httpx.Client: The shared client.
+        """
+        with self._lock:
+            if proxy not in self._clients:
+                self._clients[proxy] = httpx.Client(http2=self.http2,
+                                                    limits=self.limits,
+                                                    timeout=self.timeout,
+                                                    headers=self.headers,
+                                                    proxy=proxy,
+                                                    follow_redirects=True)
+            return self._clients[proxy]
+
+    def close(self):
+        """
+        Closes all the clients and their connections.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Clients shared by default by all the modules of the process
+_shared_clients = None
+_shared_lock = threading.Lock()
+
+
+def shared_clients() -> HttpClients:
+    """
+    Returns the process-wide HttpClients, created with the default settings on first use.
+
+    Returns:
+        HttpClients: The shared clients.
+    """
+    global _shared_clients
+    with _shared_lock:
+        if _shared_clients is None:
+            _shared_clients = HttpClients()
+        return _shared_clients
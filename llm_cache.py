@@ -0,0 +1,158 @@
+
+# External libraries
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Default location of the LLM response cache
+LLM_CACHE_PATH = "llm_cache.sqlite"
+
+# Default maximum size of the cached responses, in MB
+LLM_CACHE_MAX_SIZE = 256
+
+
+def request_key(model: str, prompt_system: str, prompt_user: str, pdf_text: str, temperature: float = 0.0) -> str:
+    """
+    Computes the cache key of a chat completion request.
+
+    Args:
+        model (str): The name of the model.
+        prompt_system (str): System-level prompt.
+        prompt_user (str): User-level prompt.
+        pdf_text (str): Text extracted from the PDF.
+        temperature (float, optional): The sampling temperature. Defaults to 0.0.
+
+    Returns:
+        str: The hexadecimal SHA-256 of the request inputs.
+    """
+    payload = json.dumps([model, prompt_system, prompt_user, pdf_text, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent SQLite cache of chat completion responses.
+
+    Responses are keyed by a hash of the model, the prompts and the document text (see
+    `request_key`). When the cached responses exceed `max_size`, the least recently used
+    ones are evicted.
+
+    Args:
+        path (str, optional): The path to the SQLite database. Defaults to LLM_CACHE_PATH.
+        max_size (float, optional): The maximum size of the cached responses in MB. Defaults to LLM_CACHE_MAX_SIZE.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_size: float = LLM_CACHE_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, "
+            "model TEXT NOT NULL, "
+            "response TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._connection.commit()
+
+    def get(self, key: str) -> str:
+        """
+        Looks up a response and counts the hit or miss.
+
+        Args:
+            key (str): The request key.
+
+        Returns:
+            str: The cached response, or None on a miss.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+            return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        """
+        Stores a response and evicts the least recently used ones if the cache is too large.
+
+        Args:
+            key (str): The request key.
+            model (str): The name of the model that produced the response.
+            response (str): The response content.
+
+        Returns:
+            None
+        """
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        """
+        Deletes the least recently used responses until the cache fits in `max_size`.
+
+        Returns:
+            None
+        """
+        limit = self.max_size * 1_048_576
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= limit:
+            return
+
+        rows = self._connection.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= limit:
+                break
+            evicted.append((key,))
+            total -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def stats(self) -> dict:
+        """
+        Returns the usage statistics of the cache.
+
+        Returns:
+            dict: The number of 'hits' and 'misses' since the cache was opened, the hit 'ratio',
+                  and the number of 'entries' and total 'size' in bytes of the cached responses.
+        """
+        with self._lock:
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'ratio': self.hits / lookups if lookups else 0.0,
+                'entries': entries,
+                'size': size}
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,325 @@
+
+# External libraries
+import time
+import queue
+import random
+import asyncio
+import threading
+import openai
+
+# Internal libraries
+import metrics
+from llm_cache import LLMCache, request_key
+from tokens import estimate_tokens
+
+# Default rate limits of the OpenAI account
+LLM_RPM = 3500
+LLM_TPM = 90_000
+
+# Expected size of a checklist answer, added to the prompt when budgeting tokens
+COMPLETION_TOKENS_ESTIMATE = 300
+
+# Errors worth retrying: rate limits, timeouts and transient server failures
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain,
+    openai.error.APIError,
+    asyncio.TimeoutError,
+)
+
+# Marker sent through the result queue when all the requests are done
+_DONE = object()
+
+
+def build_messages(prompt_system: str, prompt_user: str, pdf_text: str) -> list:
+    """
+    Builds the chat messages of an evaluation request.
+
+    Args:
+        prompt_system (str): System-level prompt.
+        prompt_user (str): User-level prompt.
+        pdf_text (str): Text extracted from the PDF.
+
+    Returns:
+        list: The system and user messages.
+    """
+    return [
+        {"role": "system", "content": prompt_system},
+        {"role": "user", "content": f"{prompt_user}\n\n{pdf_text}"}
+    ]
+
+
+class RateBudget:
+    """
+    Requests-per-minute and tokens-per-minute budget shared by the requests of an event loop.
+
+    Both budgets are continuous token buckets refilled at `rpm / 60` and `tpm / 60` units per
+    second. A request waits until both have enough capacity, using the estimated number of
+    tokens; the difference with the actual usage is settled once the response arrives.
+
+    Args:
+        rpm (float): The number of requests allowed per minute.
+        tpm (float): The number of tokens allowed per minute.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = rpm
+        self._tokens = tpm
+        self._last_refill = time.monotonic()
+
+    def _refill(self):
+        """
+        Adds the capacity accumulated since the last refill.
+
+        Returns:
+            None
+        """
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+        self._last_refill = now
+
+    async def acquire(self, tokens: int):
+        """
+        Waits until a request of the given size fits in both budgets, then consumes it.
+
+        Args:
+            tokens (int): The estimated number of tokens of the request.
+
+        Returns:
+            None
+        """
+        tokens = min(tokens, self.tpm)
+        while True:
+            self._refill()
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                return
+
+            wait = max((1 - self._requests) * 60 / self.rpm,
+                       (tokens - self._tokens) * 60 / self.tpm)
+            await asyncio.sleep(max(wait, 0.01))
+
+    def settle(self, estimated: int, actual: int):
+        """
+        Corrects the token budget once the actual usage of a request is known.
+
+        Args:
+            estimated (int): The number of tokens consumed by `acquire`.
+            actual (int): The number of tokens reported by the API.
+
+        Returns:
+            None
+        """
+        self._tokens -= actual - estimated
+
+
+class LLMScheduler:
+    """
+    Sends many chat completion requests concurrently within the account rate limits.
+
+    Requests are paced by a `RateBudget`, at most `max_concurrency` of them are in flight,
+    and rate limit, timeout and transient server errors are retried with jittered
+    exponential backoff. Responses are served from and stored in an optional `LLMCache`.
+
+    The API endpoint can be overridden with `api_base`, e.g. to run against a local fake
+    chat completions server.
+
+    Args:
+        model (str, optional): The name of the model. Defaults to "gpt-3.5-turbo".
+        temperature (float, optional): The sampling temperature. Defaults to 0.0.
+        rpm (float, optional): The requests-per-minute budget. Defaults to LLM_RPM.
+        tpm (float, optional): The tokens-per-minute budget. Defaults to LLM_TPM.
+        max_concurrency (int, optional): The maximum number of requests in flight. Defaults to 16.
+        max_retries (int, optional): The number of retries of a failing request. Defaults to 6.
+        backoff_base (float, optional): The base delay of the exponential backoff in seconds. Defaults to 1.
+        backoff_max (float, optional): The maximum delay of the exponential backoff in seconds. Defaults to 60.
+        request_timeout (float, optional): The timeout of each request in seconds. Defaults to 120.
+        api_base (str, optional): The base URL of the API. Defaults to None (OpenAI).
+        api_key (str, optional): The API key. Defaults to None (openai.api_key).
+        cache (LLMCache, optional): The response cache. Defaults to None (no cache).
+        bypass_cache (bool, optional): Whether to ignore cached responses (fresh ones are still stored). Defaults to False.
+    """
+
+    def __init__(self,
+                 model: str = "gpt-3.5-turbo",
+                 temperature: float = 0.0,
+                 rpm: float = LLM_RPM,
+                 tpm: float = LLM_TPM,
+                 max_concurrency: int = 16,
+                 max_retries: int = 6,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 60.0,
+                 request_timeout: float = 120.0,
+                 api_base: str = None,
+                 api_key: str = None,
+                 cache: LLMCache = None,
+                 bypass_cache: bool = False):
+        self.model = model
+        self.temperature = temperature
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_timeout = request_timeout
+        self.api_base = api_base
+        self.api_key = api_key
+        self.cache = cache
+        self.bypass_cache = bypass_cache
+        self.budget = RateBudget(rpm, tpm)
+        self.retries = 0
+
+    async def complete(self, prompt_system: str, prompt_user: str, pdf_text: str) -> str:
+        """
+        Sends one evaluation request, retrying transient failures.
+
+        Args:
+            prompt_system (str): System-level prompt.
+            prompt_user (str): User-level prompt.
+            pdf_text (str): Text extracted from the PDF.
+
+        Returns:
+            str: The content of the response.
+
+        Raises:
+            openai.error.OpenAIError: The last error if the request still fails after `max_retries` retries,
+                or any non-retryable error.
+        """
+
+        # Reuse the response to an identical request
+        key = request_key(self.model, prompt_system, prompt_user, pdf_text, self.temperature)
+        if self.cache and not self.bypass_cache:
+            response = self.cache.get(key)
+            metrics.inc('llm_cache', result='hit' if response is not None else 'miss')
+            if response is not None:
+                return response
+
+        messages = build_messages(prompt_system, prompt_user, pdf_text)
+        estimated = sum(estimate_tokens(message["content"], self.model) for message in messages)
+        estimated += COMPLETION_TOKENS_ESTIMATE
+
+        for attempt in range(self.max_retries + 1):
+
+            # Wait for room in the rate limits
+            await self.budget.acquire(estimated)
+
+            try:
+                with metrics.span('llm_request', model=self.model):
+                    response = await openai.ChatCompletion.acreate(
+                        model=self.model,
+                        messages=messages,
+                        temperature=self.temperature,
+                        request_timeout=self.request_timeout,
+                        api_base=self.api_base,
+                        api_key=self.api_key,
+                    )
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+
+                # Full jitter exponential backoff
+                self.retries += 1
+                metrics.inc('retries', stage='llm', reason='transient')
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, delay))
+                continue
+
+            # Settle the token budget with the actual usage
+            usage = response.get("usage")
+            if usage:
+                self.budget.settle(estimated, usage["total_tokens"])
+                metrics.inc('tokens', usage["prompt_tokens"], model=self.model, kind='prompt')
+                metrics.inc('tokens', usage["completion_tokens"], model=self.model, kind='completion')
+
+            content = response.choices[0].message['content']
+            if self.cache and content:
+                self.cache.put(key, self.model, content)
+            return content
+
+    def map(self, requests):
+        """
+        Evaluates a stream of requests concurrently and yields the responses as they arrive.
+
+        The requests are consumed lazily from a background thread running the event loop, so
+        `requests` can be a slow generator (e.g. fed by text extraction) and is only advanced
+        when there is room for another request in flight.
+
+        Args:
+            requests (iterable): (tag, request) tuples, where `request` is a dictionary of the
+                arguments of `complete` and `tag` identifies the request in the output.
+
+        Yields:
+            tuple: (tag, response, error) where `error` is the exception raised by the request, if any.
+
+        Raises:
+            Exception: Any error raised while iterating over `requests`.
+        """
+        results = queue.Queue()
+        errors = []
+
+        def run():
+            try:
+                asyncio.run(self._map_async(requests, results.put))
+            except Exception as err:
+                errors.append(err)
+            finally:
+                results.put(_DONE)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            yield item
+
+        thread.join()
+        if errors:
+            raise errors[0]
+
+    async def _map_async(self, requests, emit):
+        """
+        Event loop side of `map`.
+
+        Args:
+            requests (iterable): (tag, request) tuples.
+            emit (callable): Called with each (tag, response, error) tuple.
+
+        Returns:
+            None
+        """
+        slots = asyncio.Semaphore(self.max_concurrency)
+        iterator = iter(requests)
+        tasks = set()
+
+        async def evaluate(tag, request):
+            try:
+                emit((tag, await self.complete(**request), None))
+            except Exception as err:
+                emit((tag, None, err))
+            finally:
+                slots.release()
+
+        while True:
+
+            # Only pull the next request once it can be sent
+            await slots.acquire()
+            item = await asyncio.to_thread(next, iterator, _DONE)
+            if item is _DONE:
+                slots.release()
+                break
+
+            task = asyncio.create_task(evaluate(*item))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
@@ -1,11 +1,16 @@
 
 # External libraries
-import time
+import os
+import functools
 
 # Internal libraries
+import metrics
 from scraper import scrape
-from downloader import download_from_json
-from analyzer import analyze_pdfs 
+from downloader import download_from_json, shared_limiter
+from analyzer import analyze_pdfs, RESULTS_LOG
+from orchestrator import Orchestrator, RetryPolicy, Stage
+from proxy import PROXY_CONFIG, ProxyPool
+from storage import iter_jsonl
 
 '''
 **********
@@ -13,49 +18,177 @@ from analyzer import analyze_pdfs
 **********
 '''
 
-# Number of attempts to retry if an error occurs
-NB_ATTEMPTS = 1
+# Search query and number of Google Scholar pages per year
+QUERY = "metaheuristics"
+NB_PAGES = 30
 
 # Year range
 YEAR_MIN = 2009
 YEAR_MAX = 2025
 
-if __name__ == '__main__':
+# Number of years processed concurrently by each stage
+SCRAPE_WORKERS = 1
+DOWNLOAD_WORKERS = 2
+ANALYZE_WORKERS = 1
+
+# Retry policy of each stage (Google Scholar blocks take a while to clear)
+SCRAPE_RETRY = RetryPolicy(attempts=3, base_delay=120.0, max_delay=1800.0)
+DOWNLOAD_RETRY = RetryPolicy(attempts=3, base_delay=30.0, max_delay=600.0)
+ANALYZE_RETRY = RetryPolicy(attempts=2, base_delay=60.0, max_delay=600.0)
+
+# Number of seconds between two status tables
+STATUS_INTERVAL = 60.0
+
+# Whether to time the network, extraction and LLM calls and export the metrics at the end
+METRICS_ENABLED = True
+
+
+def results_file(year: int) -> str:
+    """
+    Builds the path to the scraping results of a year.
+
+    Args:
+        year (int): The publication year.
+
+    Returns:
+        str: The path to the JSON Lines file.
+    """
+    return f"{QUERY}_{year}_results.jsonl"
+
+
+def pdf_folder(year: int) -> str:
+    """
+    Builds the folder where the PDFs of a year are downloaded.
+
+    Args:
+        year (int): The publication year.
+
+    Returns:
+        str: The path to the folder.
+    """
+    return f"year_{year}"
+
+
+def analysis_folder(year: int) -> str:
+    """
+    Builds the folder where the analysis results of a year are saved.
+
+    Args:
+        year (int): The publication year.
+
+    Returns:
+        str: The path to the folder.
+    """
+    return f"year_{year}_results"
+
+
+def scrape_year(year: int, proxy_pool: ProxyPool = None):
+    """
+    Scrapes the Google Scholar results of a year, resuming from its checkpoint.
+
+    Args:
+        year (int): The publication year.
+        proxy_pool (ProxyPool, optional): The proxies to send the requests through. Defaults to None (direct).
+
+    Returns:
+        None
+    """
+    scrape(QUERY, nb_pages=NB_PAGES, year=year, save_to_file=True, proxy_pool=proxy_pool)
+
+
+def download_year(year: int, proxy_pool: ProxyPool = None):
+    """
+    Downloads the PDFs of a year, skipping those already downloaded.
+
+    The years downloaded concurrently share one rate limiter (see `downloader.shared_limiter`),
+    so the mirror is paced as a whole whatever DOWNLOAD_WORKERS is.
 
-    '''
-    # Iterate over years from 2001 to 2024
-    for year in range(YEAR_MIN, YEAR_MAX):
-
-        # Retry up to NB_ATTEMPTS times if an error occurs
-        for attempt in range(1, NB_ATTEMPTS + 1):
-            
-            try:
-
-                # Scrape results and save to JSON file
-                _ = scrape("metaheuristics", 
-                           nb_pages=30, 
-                           year=year,
-                           save_to_file=True)
-
-                # Download PDFs from JSON file
-                download_from_json(f"metaheuristics_{year}_results.json", f"year_{year}")
-                
-                # Break out of the multi-attempt loop if successful
-                break
-            
-            except Exception as e:
-            
-                # Print error message
-                print(f"Attempt no.{attempt} failed for year {year}: {e}")
-            
-                # If the last attempt failed, print a message
-                if attempt == 3:
-                    print(f"Failed to process year {year} after {NB_ATTEMPTS} attempts.")
-
-                # Wait one minute
-                time.sleep(60)
+    Args:
+        year (int): The publication year.
+        proxy_pool (ProxyPool, optional): The proxies to send the requests through. Defaults to None (direct).
+
+    Returns:
+        None
+
+    Raises:
+        RuntimeError: If the scraping results of the year cannot be read.
+    """
+    # download_from_json reports file errors instead of raising them
+    if download_from_json(results_file(year), pdf_folder(year), proxy_pool=proxy_pool,
+                          limiter=shared_limiter()) is None:
+        raise RuntimeError(f"Could not download the articles of '{results_file(year)}'")
+
+
+def analyze_year(year: int):
+    """
+    Analyzes the PDFs of a year, skipping those already evaluated.
+
+    Args:
+        year (int): The publication year.
+
+    Returns:
+        None
+    """
+    analyze_pdfs(pdf_folder(year), analysis_folder(year))
+
+
+def count_lines(path: str) -> str:
+    """
+    Counts the records of a JSON Lines file, for the status table.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        str: The number of records, or an empty string if the file does not exist yet.
+    """
+    return f"{sum(1 for _ in iter_jsonl(path))}" if os.path.exists(path) else ""
+
+
+def count_pdfs(folder: str) -> str:
+    """
+    Counts the PDFs in a folder, for the status table.
+
+    Args:
+        folder (str): The path to the folder.
+
+    Returns:
+        str: The number of PDF files, or an empty string if the folder does not exist yet.
+    """
+    return f"{sum(name.endswith('.pdf') for name in os.listdir(folder))}" if os.path.isdir(folder) else ""
+
+
+def main():
+    """
+    Scrapes, downloads and analyzes each year, overlapping the stages of consecutive years.
+
+    The proxies used by the scraper and the downloader are read from PROXY_CONFIG (direct
+    connections if the file does not exist).
+
+    Returns:
+        None
+    """
+    if METRICS_ENABLED:
+        metrics.enable()
+
+    with ProxyPool.from_config(PROXY_CONFIG) as proxy_pool:
+        stages = [
+            Stage('scrape', functools.partial(scrape_year, proxy_pool=proxy_pool), SCRAPE_WORKERS, SCRAPE_RETRY,
+                  progress=lambda year: count_lines(results_file(year))),
+            Stage('download', functools.partial(download_year, proxy_pool=proxy_pool), DOWNLOAD_WORKERS,
+                  DOWNLOAD_RETRY, progress=lambda year: count_pdfs(pdf_folder(year))),
+            Stage('analyze', analyze_year, ANALYZE_WORKERS, ANALYZE_RETRY,
+                  progress=lambda year: count_lines(os.path.join(analysis_folder(year), RESULTS_LOG))),
+        ]
+        Orchestrator(stages, range(YEAR_MIN, YEAR_MAX), STATUS_INTERVAL).run()
+
+    # Export the timings and counters as a Prometheus text file and a JSON run report
+    if METRICS_ENABLED:
+        metrics.export()
+        print(f"Metrics saved to {metrics.PROMETHEUS_FILE} and {metrics.RUN_REPORT_FILE}")
 
     print("All done!")
-    '''
-    
-    analyze_pdfs('test_1', 'test_1_results')
+
+
+if __name__ == '__main__':
+    main()
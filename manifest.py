@@ -0,0 +1,126 @@
+
+# External libraries
+import os
+import json
+import time
+import threading
+
+# Internal libraries
+from storage import truncate_torn_tail
+
+# Default name of the manifest file stored in each download folder
+MANIFEST_FILENAME = "download_manifest.jsonl"
+
+
+class DownloadManifest:
+    """
+    Per-folder record of the state of every DOI downloaded into that folder.
+
+    The manifest is an append-only JSON Lines file: each update appends one line and the
+    last line for a DOI wins. It is loaded once into a dictionary so that lookups are O(1)
+    and a crash can never corrupt the entries written before it.
+
+    Each entry contains:
+        - 'doi': The DOI of the article.
+        - 'status': 'ok', 'too_large', 'invalid' (not a PDF, quarantined), 'partial' or 'failed'.
+        - 'filename': The name of the PDF file in the folder.
+        - 'bytes': The number of bytes on disk.
+        - 'sha256': The SHA-256 of the file content (completed downloads only).
+        - 'error': The last error encountered, if any.
+        - 'updated': The UNIX timestamp of the update.
+
+    Args:
+        folder (str): The download folder the manifest belongs to.
+        filename (str, optional): The name of the manifest file. Defaults to MANIFEST_FILENAME.
+    """
+
+    def __init__(self, folder: str, filename: str = MANIFEST_FILENAME):
+        self.folder = folder
+        self.path = os.path.join(folder, filename)
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """
+        Replays the manifest file into memory, dropping a truncated last line so that the next
+        update starts on a line of its own.
+
+        Returns:
+            None
+        """
+        if not os.path.exists(self.path):
+            return
+
+        truncate_torn_tail(self.path)
+        with open(self.path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.entries[entry['doi']] = entry
+
+    def get(self, doi: str) -> dict:
+        """
+        Returns the latest entry recorded for a DOI.
+
+        Args:
+            doi (str): The DOI to look up.
+
+        Returns:
+            dict: The manifest entry, or None if the DOI was never seen.
+        """
+        return self.entries.get(doi)
+
+    def is_complete(self, doi: str) -> bool:
+        """
+        Checks whether a DOI was fully downloaded and its file is still on disk.
+
+        Args:
+            doi (str): The DOI to check.
+
+        Returns:
+            bool: True if the download can be skipped.
+        """
+        entry = self.entries.get(doi)
+        if not entry or entry['status'] != 'ok':
+            return False
+        return os.path.exists(os.path.join(self.folder, entry['filename']))
+
+    def update(self, doi: str, **fields):
+        """
+        Records a new state for a DOI and appends it to the manifest file.
+
+        Args:
+            doi (str): The DOI to update.
+            **fields: The entry fields to set (see class docstring).
+
+        Returns:
+            None
+        """
+        with self._lock:
+            entry = dict(self.entries.get(doi, {'doi': doi, 'status': None, 'filename': None,
+                                               'bytes': 0, 'sha256': None, 'error': None}))
+            entry.update(fields)
+            entry['updated'] = time.time()
+            self.entries[doi] = entry
+
+            # Append and flush so that a crash never loses a finished download
+            os.makedirs(self.folder, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def compact(self):
+        """
+        Rewrites the manifest with a single line per DOI.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                for entry in self.entries.values():
+                    file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(temp_path, self.path)
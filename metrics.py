@@ -0,0 +1,329 @@
+
+# External libraries
+import os
+import time
+import random
+import threading
+import contextlib
+
+# Internal libraries
+from storage import write_json_atomic
+
+# Prefix of the exported metric names
+METRICS_PREFIX = "article_selector"
+
+# Default export files
+PROMETHEUS_FILE = "metrics.prom"
+RUN_REPORT_FILE = "run_report.json"
+
+# Upper bounds of the histogram buckets of the spans, in seconds
+SPAN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Number of durations kept per span to estimate the percentiles of the run report
+SPAN_SAMPLES = 10_000
+
+# Instrumentation is off unless enabled explicitly or through this environment variable
+_enabled = os.environ.get("ARTICLE_SELECTOR_METRICS", "") not in ("", "0")
+_lock = threading.Lock()
+_spans = {}
+_counters = {}
+_started = time.time()
+
+# Returned by `span` when disabled, so that the instrumented code pays almost nothing
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class _SpanStats:
+    """
+    Statistics of the durations of a span: histogram buckets plus a reservoir sample.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(SPAN_BUCKETS)
+        self.samples = []
+
+    def add(self, duration: float):
+        """
+        Records a duration.
+
+        Args:
+            duration (float): The duration in seconds.
+
+        Returns:
+            None
+        """
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        for i, bound in enumerate(SPAN_BUCKETS):
+            if duration <= bound:
+                self.buckets[i] += 1
+                break
+
+        # Reservoir sampling keeps a uniform sample of bounded size
+        if len(self.samples) < SPAN_SAMPLES:
+            self.samples.append(duration)
+        else:
+            i = random.randrange(self.count)
+            if i < SPAN_SAMPLES:
+                self.samples[i] = duration
+
+    def percentile(self, q: float) -> float:
+        """
+        Estimates a percentile of the durations.
+
+        Args:
+            q (float): The percentile, between 0 and 100.
+
+        Returns:
+            float: The duration in seconds, or None without samples.
+        """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class _Span:
+    """
+    Context manager timing a block of code.
+    """
+
+    __slots__ = ('key', 'start')
+
+    def __init__(self, key: tuple):
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        observe_key(self.key, time.perf_counter() - self.start)
+        if exc_type is not None:
+            inc_key(_key("errors", {**dict(self.key[1]), 'span': self.key[0]}))
+
+
+def enable():
+    """
+    Turns the instrumentation on.
+
+    Returns:
+        None
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """
+    Turns the instrumentation off (the data already collected is kept).
+
+    Returns:
+        None
+    """
+    global _enabled
+    _enabled = False
+
+
+def enabled() -> bool:
+    """
+    Tells whether the instrumentation is on.
+
+    Returns:
+        bool: True if spans and counters are recorded.
+    """
+    return _enabled
+
+
+def reset():
+    """
+    Clears all the spans and counters.
+
+    Returns:
+        None
+    """
+    global _started
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _started = time.time()
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def span(name: str, **labels):
+    """
+    Times a block of code: `with metrics.span('mirror_request'): ...`.
+
+    A span that exits with an exception also increments the `errors` counter.
+
+    Args:
+        name (str): The name of the span.
+        **labels: Labels of the span (e.g. host='sci.bban.top').
+
+    Returns:
+        contextmanager: The span, or a no-op context when the instrumentation is off.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(_key(name, labels))
+
+
+def observe(name: str, duration: float, **labels):
+    """
+    Records a duration measured elsewhere (e.g. in a worker process) as a span.
+
+    Args:
+        name (str): The name of the span.
+        duration (float): The duration in seconds.
+        **labels: Labels of the span.
+
+    Returns:
+        None
+    """
+    if _enabled:
+        observe_key(_key(name, labels), duration)
+
+
+def observe_key(key: tuple, duration: float):
+    """
+    Records a duration for a span key.
+
+    Args:
+        key (tuple): (name, labels) as built by `span`.
+        duration (float): The duration in seconds.
+
+    Returns:
+        None
+    """
+    with _lock:
+        stats = _spans.get(key)
+        if stats is None:
+            stats = _spans[key] = _SpanStats()
+        stats.add(duration)
+
+
+def inc(name: str, value: float = 1, **labels):
+    """
+    Increments a counter (e.g. bytes, tokens, retries, errors).
+
+    Args:
+        name (str): The name of the counter.
+        value (float, optional): The increment. Defaults to 1.
+        **labels: Labels of the counter (e.g. stage='download').
+
+    Returns:
+        None
+    """
+    if _enabled:
+        inc_key(_key(name, labels), value)
+
+
+def inc_key(key: tuple, value: float = 1):
+    """
+    Increments a counter key.
+
+    Args:
+        key (tuple): (name, labels) as built by `inc`.
+        value (float, optional): The increment. Defaults to 1.
+
+    Returns:
+        None
+    """
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    labels = labels + extra
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def prometheus_text() -> str:
+    """
+    Formats the spans (as histograms) and counters in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics.
+    """
+    lines = []
+    with _lock:
+        spans = sorted(_spans.items())
+        counters = sorted(_counters.items())
+
+    for name in dict.fromkeys(key[0] for key, _ in spans):
+        metric = f"{METRICS_PREFIX}_{name}_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for (span_name, labels), stats in spans:
+            if span_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(SPAN_BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, (('le', '+Inf'),))} {stats.count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {stats.total}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {stats.count}")
+
+    for name in dict.fromkeys(key[0] for key, _ in counters):
+        metric = f"{METRICS_PREFIX}_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (counter_name, labels), value in counters:
+            if counter_name == name:
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def report() -> dict:
+    """
+    Summarizes the run: duration, statistics of each span and value of each counter.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'started', 'finished': UNIX timestamps of the start and the end of the run.
+            - 'spans': One entry per span with its 'name', 'labels', 'count', 'total', 'mean', 'p50', 'p95' and 'max'.
+            - 'counters': One entry per counter with its 'name', 'labels' and 'value'.
+    """
+    with _lock:
+        spans = [{'name': name,
+                  'labels': dict(labels),
+                  'count': stats.count,
+                  'total': stats.total,
+                  'mean': stats.total / stats.count,
+                  'p50': stats.percentile(50),
+                  'p95': stats.percentile(95),
+                  'max': stats.max}
+                 for (name, labels), stats in sorted(_spans.items())]
+        counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(_counters.items())]
+    return {'started': _started, 'finished': time.time(), 'spans': spans, 'counters': counters}
+
+
+def export(prometheus_file: str = PROMETHEUS_FILE, report_file: str = RUN_REPORT_FILE):
+    """
+    Writes the Prometheus text file and the JSON run report, atomically.
+
+    Args:
+        prometheus_file (str, optional): Path to the Prometheus text file, or None to skip it. Defaults to PROMETHEUS_FILE.
+        report_file (str, optional): Path to the JSON run report, or None to skip it. Defaults to RUN_REPORT_FILE.
+
+    Returns:
+        None
+    """
+    if prometheus_file:
+        with open(prometheus_file + ".tmp", "w") as file:
+            file.write(prometheus_text())
+        os.replace(prometheus_file + ".tmp", prometheus_file)
+
+    if report_file:
+        write_json_atomic(report_file, report(), indent=4)
@@ -0,0 +1,276 @@
+
+# External libraries
+import time
+import random
+import heapq
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# States of a (year, stage) job
+PENDING = 'pending'
+RUNNING = 'running'
+RETRYING = 'retrying'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+# ANSI colour of each state in the status table
+STATE_COLOURS = {
+    PENDING: "\033[90m",
+    RUNNING: "\033[94m",
+    RETRYING: "\033[93m",
+    DONE: "\033[92m",
+    FAILED: "\033[91m",
+    SKIPPED: "\033[90m",
+}
+
+
+class RetryPolicy:
+    """
+    How many times a failing stage is attempted and how long to wait between attempts.
+
+    The delay grows exponentially from `base_delay` up to `max_delay`, with full jitter so
+    that the years failing together (e.g. when Google Scholar blocks us) do not retry together.
+
+    Args:
+        attempts (int, optional): The maximum number of attempts. Defaults to 3.
+        base_delay (float, optional): The delay before the first retry in seconds. Defaults to 10.
+        max_delay (float, optional): The maximum delay between two attempts in seconds. Defaults to 600.
+        retry_on (tuple, optional): The exception types worth retrying. Defaults to (Exception,).
+    """
+
+    def __init__(self,
+                 attempts: int = 3,
+                 base_delay: float = 10.0,
+                 max_delay: float = 600.0,
+                 retry_on: tuple = (Exception,)):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+
+    def should_retry(self, attempt: int, error: Exception) -> bool:
+        """
+        Tells whether a failed attempt should be retried.
+
+        Args:
+            attempt (int): The number of the failed attempt, starting at 1.
+            error (Exception): The error raised by the attempt.
+
+        Returns:
+            bool: True if the stage should be attempted again.
+        """
+        return attempt < self.attempts and isinstance(error, self.retry_on)
+
+    def delay(self, attempt: int) -> float:
+        """
+        Computes the delay before the next attempt.
+
+        Args:
+            attempt (int): The number of the failed attempt, starting at 1.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class Stage:
+    """
+    A step of the per-year pipeline (e.g. scraping), run for each year after the previous stage.
+
+    Args:
+        name (str): The name of the stage, shown in the status table.
+        run (callable): Called with the year; raises an exception on failure.
+        workers (int, optional): The maximum number of years processed concurrently by this stage. Defaults to 1.
+        retry (RetryPolicy, optional): The retry policy of the stage. Defaults to RetryPolicy().
+        progress (callable, optional): Called with the year, returns a short progress description
+            (e.g. the number of articles scraped so far). Defaults to None.
+    """
+
+    def __init__(self,
+                 name: str,
+                 run,
+                 workers: int = 1,
+                 retry: RetryPolicy = None,
+                 progress=None):
+        self.name = name
+        self.run = run
+        self.workers = workers
+        self.retry = retry or RetryPolicy()
+        self.progress = progress
+
+
+class Orchestrator:
+    """
+    Runs a chain of stages for many years, overlapping the stages of different years.
+
+    Each year goes through the stages in order, but as soon as a stage is done for a year it
+    moves on to the next year, so e.g. year N+1 is scraped while year N is downloaded and
+    year N-1 is analyzed. Each stage processes at most `stage.workers` years at once. A
+    failing stage is retried according to its policy without holding a worker while it
+    waits; once the attempts are exhausted, the later stages of that year are skipped.
+
+    Args:
+        stages (list): The Stage objects, in pipeline order.
+        years (iterable): The years to process, in priority order.
+        status_interval (float, optional): The number of seconds between two status tables. Defaults to 30.
+    """
+
+    def __init__(self, stages: list, years, status_interval: float = 30.0):
+        self.stages = stages
+        self.years = list(years)
+        self.status_interval = status_interval
+        self.status = {(year, stage.name): {'state': PENDING, 'attempt': 0, 'elapsed': 0.0, 'error': None}
+                       for year in self.years for stage in stages}
+        self._lock = threading.Lock()
+
+    def run(self) -> dict:
+        """
+        Processes all the years and prints the status table regularly.
+
+        Returns:
+            dict: (year, stage name) -> status dictionary with 'state', 'attempt', 'elapsed' and 'error'.
+        """
+        ready = [(0.0, i, year, 0) for i, year in enumerate(self.years)]
+        heapq.heapify(ready)
+        order = {year: i for i, year in enumerate(self.years)}
+        running = {stage.name: 0 for stage in self.stages}
+        futures = {}
+        last_status = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=sum(stage.workers for stage in self.stages)) as executor:
+            while ready or futures:
+
+                # Start the jobs that are due and whose stage has a free worker, by year priority
+                now = time.monotonic()
+                deferred = []
+                while ready and ready[0][0] <= now:
+                    due, priority, year, index = heapq.heappop(ready)
+                    stage = self.stages[index]
+                    if running[stage.name] >= stage.workers:
+                        deferred.append((due, priority, year, index))
+                        continue
+                    running[stage.name] += 1
+                    futures[executor.submit(self._attempt, stage, year)] = (year, index)
+                for job in deferred:
+                    heapq.heappush(ready, job)
+
+                # Wait for a job to finish, a retry to be due or the next status table
+                timeout = self.status_interval - (now - last_status)
+                due_times = [job[0] for job in ready if self.stages[job[3]].workers > running[self.stages[job[3]].name]]
+                if due_times:
+                    timeout = min(timeout, min(due_times) - now)
+                done, _ = wait(futures, timeout=max(timeout, 0.0), return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    year, index = futures.pop(future)
+                    stage = self.stages[index]
+                    running[stage.name] -= 1
+                    error = future.result()
+                    status = self.status[(year, stage.name)]
+
+                    if error is None:
+                        # Move on to the next stage of the year
+                        if index + 1 < len(self.stages):
+                            heapq.heappush(ready, (0.0, order[year], year, index + 1))
+                    elif stage.retry.should_retry(status['attempt'], error):
+                        delay = stage.retry.delay(status['attempt'])
+                        print(f"\033[93m{stage.name} failed for year {year} (attempt {status['attempt']}/"
+                              f"{stage.retry.attempts}): {error}. Retrying in {delay:.0f} s\033[0m")
+                        self._set(year, stage.name, state=RETRYING)
+                        heapq.heappush(ready, (time.monotonic() + delay, order[year], year, index))
+                    else:
+                        print(f"\033[91m{stage.name} failed for year {year} after {status['attempt']} "
+                              f"attempts: {error}\033[0m")
+                        self._set(year, stage.name, state=FAILED)
+                        for later in self.stages[index + 1:]:
+                            self._set(year, later.name, state=SKIPPED)
+
+                if time.monotonic() - last_status >= self.status_interval:
+                    self.print_status()
+                    last_status = time.monotonic()
+
+        self.print_status()
+        return self.status
+
+    def _attempt(self, stage: Stage, year) -> Exception:
+        """
+        Runs one attempt of a stage for a year and records its status.
+
+        Args:
+            stage (Stage): The stage to run.
+            year (int): The year to process.
+
+        Returns:
+            Exception: The error raised by the stage, or None if it succeeded.
+        """
+        status = self.status[(year, stage.name)]
+        self._set(year, stage.name, state=RUNNING, attempt=status['attempt'] + 1, error=None)
+        start = time.perf_counter()
+        try:
+            stage.run(year)
+            error = None
+        except Exception as err:
+            error = err
+        self._set(year, stage.name,
+                  state=DONE if error is None else FAILED,
+                  elapsed=status['elapsed'] + time.perf_counter() - start,
+                  error=None if error is None else str(error))
+        return error
+
+    def _set(self, year, stage_name: str, **fields):
+        """
+        Updates the status of a job.
+
+        Args:
+            year (int): The year of the job.
+            stage_name (str): The stage of the job.
+            **fields: The status fields to update.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.status[(year, stage_name)].update(fields)
+
+    def format_status(self) -> str:
+        """
+        Formats the status table: one row per year, one column per stage.
+
+        Returns:
+            str: The table, with ANSI colours.
+        """
+        width = 24
+        header = f"{'Year':<6} " + " ".join(f"{stage.name:<{width}}" for stage in self.stages)
+        lines = [header, "-" * len(header)]
+
+        for year in self.years:
+            cells = []
+            for stage in self.stages:
+                with self._lock:
+                    status = dict(self.status[(year, stage.name)])
+
+                cell = status['state']
+                if status['attempt'] > 1:
+                    cell += f" #{status['attempt']}"
+                if status['state'] in (RUNNING, DONE, FAILED) and stage.progress:
+                    try:
+                        cell += f" {stage.progress(year)}"
+                    except Exception:
+                        pass
+                if status['elapsed']:
+                    cell += f" {status['elapsed']:.0f}s"
+                cells.append(f"{STATE_COLOURS[status['state']]}{cell[:width]:<{width}}\033[0m")
+            lines.append(f"{year:<6} " + " ".join(cells))
+
+        return "\n".join(lines)
+
+    def print_status(self):
+        """
+        Prints the status table.
+
+        Returns:
+            None
+        """
+        print(self.format_status())
@@ -0,0 +1,261 @@
+
+# External libraries
+import os
+import re
+import argparse
+import numpy as np
+
+# Internal libraries
+from aggregation import ANSWERS, TRUE, AnswerMatrix
+from sections import EXCLUDED_SECTIONS, split_sections
+
+# Version of the rules, bump it whenever they change the answers
+PRESCREEN_VERSION = 2
+
+# Code of an unresolved question in the decision arrays
+UNRESOLVED = -1
+
+# Repository hosts whose links, next to an availability statement, settle A12
+_REPOSITORY = r'(?:github\.com|gitlab\.com|bitbucket\.org|zenodo\.org|doi\.org/10\.5281/zenodo)/'
+
+# Statistical tests usual in the field, optionally qualified (e.g. 'Wilcoxon signed-rank test')
+_TEST_NAME = (r'(?:wilcoxon(?: signed[- ]ranks?| rank[- ]sum)?|mann[- ]whitney(?: u)?|friedman(?:\'s)?(?: aligned)?(?: ranks?)?'
+              r'|kruskal[- ]wallis|nemenyi|quade|student\'s t|welch\'s t|paired t|two-sample t)[- ]tests?'
+              r'|t-tests?|anova')
+
+# Verbs stating that a test or procedure was actually used
+_USED = r'(?:used|applied|performed|conducted|carried out|employed|adopted|run)'
+
+# Usual significance thresholds, which are not exact p-values
+_THRESHOLD = r'(?!0?\.05\b|0?\.01\b|0?\.1\b|0?\.001\b)'
+
+# Evidence settling a question as True; each rule requires a statement about the study itself (a test that
+# was performed, a level that was set), never the bare name of a method, which also appears in citations
+# and parameter settings
+PRESCREEN_RULES = [
+    # Source code freely available: an availability statement followed by a repository link
+    ('A12', r'\b(?:source code|code|implementation|scripts)\b[^\n]{0,80}?\bavailable\b[\s\S]{0,80}?' + _REPOSITORY),
+    # Confidence intervals provided
+    ('A7', r'\b\d{2}(?:\.\d+)?\s*%\s*(?:confidence intervals?|CIs?)\s*(?:[:=]\s*)?[\[(]\s*-?\d'
+           r'|confidence intervals? (?:are|were) (?:shown|reported|given|provided|plotted|displayed)'),
+    # A priori power analysis
+    ('B3', r'(?<!\bno )\b(?:a priori|prospective) (?:statistical )?power analys[ie]s (?:was|were) '
+           r'(?:used|performed|conducted|carried out|done)'),
+    # Significance level provided
+    ('B5', r'\b(?:significance level|level of significance)(?: \(?(?:α|alpha)\)?)? (?:of |was set to |is set to |'
+           r'was fixed at |is fixed at |set (?:to|at) |= ?)(?:0?\.\d+|\d+(?:\.\d+)? ?%)'
+           r'|\bat (?:the |a )?(?:0?\.\d+|\d+(?:\.\d+)? ?%) (?:significance level|level of significance)'),
+    # Familywise error rate controlled: a correction procedure, named as such (Benjamini-Hochberg controls the
+    # false discovery rate instead)
+    ('B6', r'(?<!benjamini-)(?<!benjamini )\b(?:bonferroni|holm(?:[- ]bonferroni)?|hochberg|hommel|šidák|sidak|finner|shaffer)(?:\'s)?'
+           r'(?: step[- ](?:down|up))? (?:correction|adjustment|procedure|method)s? (?:was|were|is|are) ' + _USED
+           + r'|\b(?:family[- ]?wise error rate|fwer) (?:was|is) controlled'),
+    # Exact test statistics, in the usual reporting format
+    ('B7', r'\bt ?\( ?\d+(?:\.\d+)? ?\) ?= ?-?\d+(?:\.\d+)?, ?p ?[=<>≤]'
+           r'|\bF ?\( ?\d+ ?, ?\d+ ?\) ?= ?\d+(?:\.\d+)?, ?p ?[=<>≤]'
+           r'|(?:χ2|χ²|chi-squared?) ?\( ?\d+(?: ?, ?n ?= ?\d+)? ?\) ?= ?\d+(?:\.\d+)?, ?p ?[=<>≤]'),
+    # Exact p-values: named as p-values, or following a test statistic (not the usual thresholds)
+    ('B8', r'\bp-values? (?:of |= ?|was |were |is |equal to )' + _THRESHOLD + r'(?:0?\.\d+|\d(?:\.\d+)? ?[e×] ?-?\d+)'
+           r'|\b(?:[tFzWU]|χ2|χ²)(?: ?\([^)\n]{1,12}\))? ?= ?-?\d+(?:\.\d+)?, ?p ?= ?' + _THRESHOLD + r'0?\.\d+'),
+    # NHST performed: a named test stated as used, or results stated against a significance threshold
+    ('B2', r'\b(?:' + _TEST_NAME + r')\b[^.\n]{0,40}?\b(?:was|were|is|are|has been|have been) ' + _USED
+           + r'|\b' + _USED + r' (?:an?|the) (?:two-sided |one-sided |paired |non-?parametric |pairwise )*'
+             r'(?:' + _TEST_NAME + r')\b'
+           + r'|\bp-values? (?:<|≤|below|lower than|less than) 0?\.\d+'
+           + r'|\bstatistically significant(?:ly)? (?:better|worse|different)'),
+]
+
+# Answers implied by other answers: NHST is performed (and could be) when its reporting is explicit; only
+# the rules that cannot fire without a test having been run cascade
+PRESCREEN_IMPLICATIONS = [
+    (('B5', 'B6', 'B7', 'B8'), 'B2'),
+    (('B2',), 'B1'),
+]
+
+_RULE_PATTERNS = [(key, re.compile(pattern, re.IGNORECASE)) for key, pattern in PRESCREEN_RULES]
+
+
+def screened_text(text: str) -> str:
+    """
+    Removes the sections that say nothing about the study itself (see `sections.EXCLUDED_SECTIONS`).
+
+    Args:
+        text (str): The text of the document.
+
+    Returns:
+        str: The text without its references and acknowledgments.
+    """
+    return "\n".join(section for kind, section in split_sections(text) if kind not in EXCLUDED_SECTIONS)
+
+
+def prescreen(text: str, questions_keys=None) -> dict:
+    """
+    Answers the checklist questions that explicit statements of the text settle.
+
+    Only positive evidence is used (e.g. an availability statement with a GitHub link settles A12 as
+    True); a question without evidence stays unresolved rather than False, and is left to ChatGPT.
+    The references and acknowledgments are not screened, so cited methods do not count as used.
+
+    Args:
+        text (str): The full text of the document.
+        questions_keys (list, optional): The questions to consider. Defaults to None (all the rules).
+
+    Returns:
+        dict: Question key -> answer ('True') of the settled questions.
+    """
+    text = screened_text(text)
+    keys = set(questions_keys) if questions_keys is not None else None
+    answers = {}
+    for key, pattern in _RULE_PATTERNS:
+        if (keys is None or key in keys) and pattern.search(text):
+            answers[key] = ANSWERS[TRUE]
+
+    # Propagate the answers implied by others
+    for sources, target in PRESCREEN_IMPLICATIONS:
+        if (keys is None or target in keys) and any(source in answers for source in sources):
+            answers[target] = ANSWERS[TRUE]
+    return answers
+
+
+def prescreen_batch(texts, questions_keys) -> np.ndarray:
+    """
+    Pre-screens many documents into a decision array aligned with `AnswerMatrix`.
+
+    Args:
+        texts (iterable): The text of each document.
+        questions_keys (list): The key of each question.
+
+    Returns:
+        np.ndarray: Integer array of shape (documents, questions) holding the index of the answer in ANSWERS,
+                    or UNRESOLVED.
+    """
+    question_index = {key: q for q, key in enumerate(questions_keys)}
+    answer_index = {answer: a for a, answer in enumerate(ANSWERS)}
+    rows = []
+    for text in texts:
+        row = np.full(len(questions_keys), UNRESOLVED, dtype=np.int8)
+        for key, answer in prescreen(text, questions_keys).items():
+            row[question_index[key]] = answer_index[answer]
+        rows.append(row)
+    return np.array(rows, dtype=np.int8).reshape(len(rows), len(questions_keys))
+
+
+def subset_prompt(prompt_user: str, questions_keys) -> str:
+    """
+    Restricts the checklist of the user prompt, and its expected output format, to some questions.
+
+    Args:
+        prompt_user (str): The user-level prompt (see `prompts.PROMPT_USER`).
+        questions_keys (list): The questions to keep.
+
+    Returns:
+        str: The prompt without the other questions.
+    """
+    keys = set(questions_keys)
+    lines = []
+    for line in prompt_user.split("\n"):
+        # Question ('A1. Is ...') or output format ('"A1": "True/False/N/A",') line
+        match = re.match(r'\s*(?:([A-Z]\d+)\.\s|"([A-Z]\d+)":)', line)
+        if match and (match.group(1) or match.group(2)) not in keys:
+            continue
+        lines.append(line)
+
+    # The last entry of each block of the output format has no trailing comma
+    return re.sub(r',(\s*\n\s*\})', r'\1', "\n".join(lines))
+
+
+def merge_answers(result: dict, answers: dict) -> dict:
+    """
+    Adds the answers of the pre-screen to a parsed ChatGPT response.
+
+    Args:
+        result (dict): The parsed response ({category: {question: answer}}).
+        answers (dict): Question key -> answer settled by the pre-screen.
+
+    Returns:
+        dict: The complete response, the pre-screen answers being filed under 'Category <letter>'.
+    """
+    merged = {category: dict(evaluations) if isinstance(evaluations, dict) else evaluations
+              for category, evaluations in result.items()}
+    for key, answer in answers.items():
+        merged.setdefault(f"Category {key.rstrip('0123456789')}", {})[key] = answer
+    return merged
+
+
+def agreement(decisions: np.ndarray, reference: AnswerMatrix) -> dict:
+    """
+    Measures how often the pre-screen agrees with the answers of ChatGPT.
+
+    Args:
+        decisions (np.ndarray): The decisions of the pre-screen (see `prescreen_batch`), one row per document
+            of the reference.
+        reference (AnswerMatrix): The answers of ChatGPT to all the questions (pre-screen disabled).
+
+    Returns:
+        dict: Question key -> {'resolved': number of documents settled by the pre-screen, 'coverage': share of the
+              documents settled, 'agreement': share of the settled documents where ChatGPT gave the same answer
+              (None if none was settled)}, plus the same entries over all questions under 'all'.
+    """
+    resolved = decisions != UNRESOLVED
+    chosen = np.take_along_axis(reference.answers, np.maximum(decisions, 0)[..., None].astype(np.intp), axis=2)[..., 0]
+    agreed = resolved & chosen
+
+    def summary(nb_resolved, nb_agreed, nb_documents):
+        return {'resolved': int(nb_resolved),
+                'coverage': nb_resolved / nb_documents if nb_documents else 0.0,
+                'agreement': nb_agreed / nb_resolved if nb_resolved else None}
+
+    nb_documents = len(decisions)
+    stats = {key: summary(resolved[:, q].sum(), agreed[:, q].sum(), nb_documents)
+             for q, key in enumerate(reference.questions)}
+    stats['all'] = summary(resolved.sum(), agreed.sum(), nb_documents * len(reference.questions))
+    return stats
+
+
+def format_agreement(stats: dict) -> str:
+    """
+    Formats the agreement statistics as a table.
+
+    Args:
+        stats (dict): The statistics returned by `agreement`.
+
+    Returns:
+        str: One row per question.
+    """
+    header = f"{'Question':<10} {'Settled':<8} {'Coverage':<9} {'Agreement':<9}"
+    lines = [header, "-" * len(header)]
+    for key, entry in stats.items():
+        rate = f"{entry['agreement'] * 100:.1f}" if entry['agreement'] is not None else "-"
+        lines.append(f"{key:<10} {entry['resolved']:<8} {entry['coverage'] * 100:<9.1f} {rate:<9}")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+
+    from analyzer import RESULTS_LOG, calculate_nb_questions, load_results_log
+    from extraction import iter_extractions
+    from prompts import PROMPT_USER
+    from text_cache import TEXT_CACHE_DIR, TextCache
+
+    parser = argparse.ArgumentParser(description="Measure the agreement of the pre-screen with ChatGPT.")
+    parser.add_argument('pdf_folder', help="folder of the PDF files of the validation set")
+    parser.add_argument('results_folder',
+                        help=f"folder of their {RESULTS_LOG}, analyzed with the pre-screen disabled")
+    parser.add_argument('--cache', default=TEXT_CACHE_DIR, help="extracted text cache (default: %(default)s)")
+    args = parser.parse_args()
+
+    # ChatGPT answers of the validation set, on the questions it was asked
+    questions = calculate_nb_questions(PROMPT_USER)
+    records = {filename: record for filename, record in load_results_log(args.results_folder).items()
+               if record['status'] == 'ok' and not record.get('prescreened')}
+    texts = {}
+    for extraction in iter_extractions([os.path.join(args.pdf_folder, filename) for filename in records],
+                                       cache=TextCache(args.cache)):
+        if extraction['status'] == 'ok':
+            texts[os.path.basename(extraction['path'])] = extraction['text']
+
+    documents = [filename for filename in records if filename in texts]
+    reference = AnswerMatrix.from_results({filename: records[filename]['result'] for filename in documents}, questions)
+    decisions = prescreen_batch((texts[filename] for filename in documents), questions)
+    print(f"Validation set: {len(documents)} documents")
+    print(format_agreement(agreement(decisions, reference)))
@@ -1,23 +1,343 @@
-import requests
-
-# Proxy details
-proxy_host = "4.142.254.253"  # Proxy IP
-proxy_port = "44119"          # Proxy Port
-
-# Configure the proxy
-proxies = {
-    "http": f"http://{proxy_host}:{proxy_port}",
-    "https": f"http://{proxy_host}:{proxy_port}",
-}
-
-# URL for the GET request
-url = "https://httpbin.org/ip"  # Test URL to verify the proxy
-
-try:
-    # Make the GET request
-    response = requests.get(url, proxies=proxies, timeout=10)
-    # Print the response
-    print("Response status code:", response.status_code)
-    print("Response content:", response.json())
-except requests.exceptions.RequestException as e:
-    print(f"An error occurred: {e}")
+
+# External libraries
+import time
+import random
+import threading
+
+# Internal libraries
+from http_client import HttpClients
+from storage import read_json
+
+# File listing the proxies, either a list of URLs or {"proxies": [...], "check_url": ..., ...}
+PROXY_CONFIG = "proxies.json"
+
+# URL fetched through each proxy by the health checks, it echoes the exit IP
+CHECK_URL = "https://httpbin.org/ip"
+
+# Smoothing factor of the latency and error rate moving averages
+EWMA_ALPHA = 0.2
+
+# Latency assumed for a proxy that has not been measured yet, in seconds
+DEFAULT_LATENCY = 1.0
+
+
+class Proxy:
+    """
+    A proxy of the pool and its running statistics.
+
+    Args:
+        url (str): The URL of the proxy (e.g. 'http://4.142.254.253:44119').
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.exit_ip = None
+        self.latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.consecutive_failures = 0
+        self.evicted = False
+
+    @property
+    def weight(self) -> float:
+        """
+        Selection weight of the proxy: fast and reliable proxies are picked more often.
+
+        Returns:
+            float: The weight, 0 for an evicted proxy.
+        """
+        if self.evicted:
+            return 0.0
+        latency = self.latency if self.latency is not None else DEFAULT_LATENCY
+        return max(1.0 - self.error_rate, 0.01) / max(latency, 0.05)
+
+    @property
+    def key(self) -> str:
+        """
+        Identifies the exit IP of the proxy, used to rate limit per exit IP.
+
+        Returns:
+            str: The exit IP reported by the health checks, or the proxy URL until then.
+        """
+        return self.exit_ip or self.url
+
+
+class ProxyPool:
+    """
+    Pool of proxies with background health checks, scoring and automatic eviction.
+
+    Each request picks a proxy at random, weighted by its inverse latency and its success
+    rate (see `Proxy.weight`). The outcome of every request is reported back to update the
+    moving averages of the proxy; proxies failing too often are evicted. A background
+    thread periodically fetches `check_url` through every proxy, measuring its latency,
+    learning its exit IP and readmitting evicted proxies that work again.
+
+    Callers rate limit on `limiter_key(host, proxy)`, so each exit IP has its own budget
+    per host and the total throughput grows with the size of the pool.
+
+    Args:
+        urls (list): The URLs of the proxies.
+        check_url (str, optional): The URL fetched by the health checks. Defaults to CHECK_URL.
+        check_interval (float, optional): The number of seconds between two health checks. Defaults to 60.
+        timeout (float, optional): The timeout of the health check requests in seconds. Defaults to 10.
+        max_error_rate (float, optional): The error rate above which a proxy is evicted. Defaults to 0.5.
+        max_consecutive_failures (int, optional): The number of failures in a row after which a proxy
+            is evicted. Defaults to 3.
+        min_requests (int, optional): The number of requests before the error rate is trusted. Defaults to 5.
+    """
+
+    def __init__(self,
+                 urls: list,
+                 check_url: str = CHECK_URL,
+                 check_interval: float = 60.0,
+                 timeout: float = 10.0,
+                 max_error_rate: float = 0.5,
+                 max_consecutive_failures: int = 3,
+                 min_requests: int = 5):
+        self.proxies = [Proxy(url) for url in dict.fromkeys(urls)]
+        self.check_url = check_url
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.max_error_rate = max_error_rate
+        self.max_consecutive_failures = max_consecutive_failures
+        self.min_requests = min_requests
+        self.clients = HttpClients(http2=False, connect_timeout=timeout, read_timeout=timeout)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, path: str = PROXY_CONFIG, **kwargs):
+        """
+        Creates a pool from a configuration file.
+
+        The file holds either a list of proxy URLs, or an object with a "proxies" list and
+        any of the other arguments of the constructor (e.g. "check_interval").
+
+        Args:
+            path (str, optional): Path to the JSON file. Defaults to PROXY_CONFIG.
+            **kwargs: Arguments of the constructor, overriding the file.
+
+        Returns:
+            ProxyPool: The pool, empty if the file does not exist.
+        """
+        config = read_json(path, default=[])
+        if isinstance(config, list):
+            config = {"proxies": config}
+        options = {key: value for key, value in config.items() if key != "proxies"}
+        options.update(kwargs)
+        return cls(config.get("proxies", []), **options)
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def healthy(self) -> list:
+        """
+        Lists the proxies that are not evicted.
+
+        Returns:
+            list: The Proxy objects in service.
+        """
+        with self._lock:
+            return [proxy for proxy in self.proxies if not proxy.evicted]
+
+    def choose(self) -> Proxy:
+        """
+        Picks a proxy at random, weighted by latency and error rate.
+
+        Returns:
+            Proxy: The chosen proxy, or None if the pool is empty (direct connection).
+
+        Raises:
+            RuntimeError: If all the proxies of the pool are evicted.
+        """
+        if not self.proxies:
+            return None
+
+        with self._lock:
+            candidates = [proxy for proxy in self.proxies if not proxy.evicted]
+            if not candidates:
+                raise RuntimeError("All the proxies of the pool are evicted")
+            return random.choices(candidates, weights=[proxy.weight for proxy in candidates])[0]
+
+    def report(self, proxy: Proxy, ok: bool, latency: float = None):
+        """
+        Records the outcome of a request sent through a proxy, evicting it if it fails too often.
+
+        Args:
+            proxy (Proxy): The proxy used, or None for a direct connection (ignored).
+            ok (bool): Whether the proxy delivered a response (throttling responses count as failures).
+            latency (float, optional): The time to the response headers in seconds. Defaults to None.
+
+        Returns:
+            None
+        """
+        if proxy is None:
+            return
+
+        with self._lock:
+            proxy.requests += 1
+            proxy.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - proxy.error_rate)
+            if ok:
+                proxy.consecutive_failures = 0
+                if latency is not None:
+                    proxy.latency = latency if proxy.latency is None \
+                        else proxy.latency + EWMA_ALPHA * (latency - proxy.latency)
+            else:
+                proxy.consecutive_failures += 1
+
+            if not proxy.evicted and (proxy.consecutive_failures >= self.max_consecutive_failures
+                                      or (proxy.requests >= self.min_requests
+                                          and proxy.error_rate > self.max_error_rate)):
+                proxy.evicted = True
+                print(f"\033[91mEvicted proxy {proxy.url} (error rate {proxy.error_rate:.0%})\033[0m")
+
+    def check(self, proxy: Proxy) -> bool:
+        """
+        Fetches the check URL through a proxy to measure its latency and learn its exit IP.
+
+        An evicted proxy that passes the check is readmitted with fresh statistics.
+
+        Args:
+            proxy (Proxy): The proxy to check.
+
+        Returns:
+            bool: Whether the proxy works.
+        """
+        start = time.perf_counter()
+        try:
+            response = self.clients.get(proxy.url).get(self.check_url)
+            response.raise_for_status()
+            latency = time.perf_counter() - start
+            try:
+                exit_ip = response.json().get("origin")
+            except ValueError:
+                exit_ip = None
+        except Exception:
+            self.report(proxy, ok=False)
+            return False
+
+        with self._lock:
+            if exit_ip:
+                proxy.exit_ip = exit_ip
+            if proxy.evicted:
+                proxy.evicted = False
+                proxy.error_rate = 0.0
+                proxy.requests = 0
+                proxy.consecutive_failures = 0
+                proxy.latency = None
+                print(f"\033[92mReadmitted proxy {proxy.url}\033[0m")
+        self.report(proxy, ok=True, latency=latency)
+        return True
+
+    def check_all(self):
+        """
+        Checks every proxy of the pool concurrently.
+
+        Returns:
+            None
+        """
+        threads = [threading.Thread(target=self.check, args=(proxy,), daemon=True) for proxy in self.proxies]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def start(self):
+        """
+        Checks the proxies once, then keeps checking them from a background thread.
+
+        Returns:
+            ProxyPool: The pool itself.
+        """
+        if self.proxies and self._thread is None:
+            self.check_all()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._check_loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the background health checks and closes their connections.
+
+        Returns:
+            None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.clients.close()
+
+    def _check_loop(self):
+        """
+        Body of the health check thread.
+
+        Returns:
+            None
+        """
+        while not self._stop.wait(self.check_interval):
+            self.check_all()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def format_status(self) -> str:
+        """
+        Formats the statistics of the proxies as a table.
+
+        Returns:
+            str: One row per proxy.
+        """
+        header = f"{'Proxy':<32} {'Exit IP':<16} {'Latency':<8} {'Errors':<7} {'Requests':<9} {'State':<8}"
+        lines = [header, "-" * len(header)]
+        with self._lock:
+            for proxy in self.proxies:
+                latency = f"{proxy.latency:.2f}" if proxy.latency is not None else "-"
+                state = "evicted" if proxy.evicted else "ok"
+                lines.append(f"{proxy.url:<32} {proxy.exit_ip or '-':<16} {latency:<8} "
+                             f"{proxy.error_rate:<7.0%} {proxy.requests:<9} {state:<8}")
+        return "\n".join(lines)
+
+
+def limiter_key(host: str, proxy: Proxy = None) -> str:
+    """
+    Builds the rate limiting key of a request, so that each exit IP has its own budget per host.
+
+    Args:
+        host (str): The host the request is sent to.
+        proxy (Proxy, optional): The proxy used. Defaults to None (direct connection).
+
+    Returns:
+        str: The host alone for a direct connection, otherwise the host and the exit IP.
+    """
+    return host if proxy is None else f"{host}|{proxy.key}"
+
+
+def proxy_url(proxy: Proxy = None) -> str:
+    """
+    Returns the URL of an optional proxy, used to pick the matching HTTP client.
+
+    Args:
+        proxy (Proxy, optional): The proxy to use. Defaults to None (direct connection).
+
+    Returns:
+        str: The URL of the proxy, or None for a direct connection.
+    """
+    return proxy.url if proxy is not None else None
+
+
+if __name__ == '__main__':
+
+    # Check the configured proxies and print their statistics
+    pool = ProxyPool.from_config()
+    if not pool.proxies:
+        print(f"\033[91mNo proxies configured in '{PROXY_CONFIG}'.\033[0m")
+    else:
+        pool.check_all()
+        print(pool.format_status())
+        pool.stop()
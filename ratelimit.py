@@ -0,0 +1,218 @@
+
+# External libraries
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# HTTP status codes indicating that the server is throttling us
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to pace requests sent to a single host.
+
+    Tokens are added continuously at `rate` tokens per second, up to `capacity`.
+    Each request consumes one token and blocks until one is available.
+
+    Args:
+        rate (float): Number of tokens added per second.
+        capacity (float, optional): Maximum number of tokens in the bucket (burst size). Defaults to 1.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """
+        Adds the tokens accumulated since the last refill.
+
+        Args:
+            now (float): Current monotonic time in seconds.
+
+        Returns:
+            None
+        """
+        elapsed = now - self._last_refill
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def acquire(self, tokens: float = 1.0):
+        """
+        Blocks until the requested number of tokens is available, then consumes them.
+
+        Args:
+            tokens (float, optional): Number of tokens to consume. Defaults to 1.
+
+        Returns:
+            None
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                # Honor a pause requested by the server (e.g. Retry-After)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= tokens:
+                        self._tokens -= tokens
+                        return
+                    wait = (tokens - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Empties the bucket and blocks all acquisitions for the given duration.
+
+        Args:
+            seconds (float): Duration of the pause in seconds.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class HostRateLimiter:
+    """
+    Keeps one token bucket per host and adapts its rate to the server responses.
+
+    The rate is halved and the host is paused whenever the server answers with a
+    throttling status (429/503), then slowly increased again after each success
+    (additive increase, multiplicative decrease).
+
+    Args:
+        rate (float, optional): Initial and maximum number of requests per second per host. Defaults to 1.
+        burst (float, optional): Maximum number of requests sent back-to-back to a host. Defaults to 1.
+        min_rate (float, optional): Lower bound on the rate after successive penalties. Defaults to 0.02.
+        max_backoff (float, optional): Maximum pause in seconds when no Retry-After is given. Defaults to 300.
+    """
+
+    def __init__(self,
+                 rate: float = 1.0,
+                 burst: float = 1.0,
+                 min_rate: float = 0.02,
+                 max_backoff: float = 300.0):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_backoff = max_backoff
+        self._buckets = {}
+        self._strikes = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: str) -> TokenBucket:
+        """
+        Returns the token bucket associated with a key, creating it if needed.
+
+        Args:
+            key (str): The host (or host/exit IP pair) the bucket applies to.
+
+        Returns:
+            TokenBucket: The bucket for this key.
+        """
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(self.rate, self.burst)
+                self._strikes[key] = 0
+            return self._buckets[key]
+
+    def acquire(self, key: str):
+        """
+        Blocks until a request can be sent to the given host.
+
+        Args:
+            key (str): The host the request is sent to.
+
+        Returns:
+            None
+        """
+        self._bucket(key).acquire()
+
+    def penalize(self, key: str, retry_after: float = None) -> float:
+        """
+        Slows down a host after a throttling response.
+
+        Args:
+            key (str): The host that throttled the request.
+            retry_after (float, optional): Delay requested by the server in seconds. Defaults to None (exponential backoff).
+
+        Returns:
+            float: The pause applied to the host, in seconds.
+        """
+        bucket = self._bucket(key)
+        with self._lock:
+            self._strikes[key] += 1
+            strikes = self._strikes[key]
+            bucket.rate = max(self.min_rate, bucket.rate / 2)
+
+        # Prefer the server's hint, otherwise back off exponentially
+        if retry_after is None:
+            retry_after = min(self.max_backoff, 2 ** strikes)
+
+        bucket.pause(retry_after)
+        return retry_after
+
+    def reward(self, key: str):
+        """
+        Gradually restores the rate of a host after a successful request.
+
+        Args:
+            key (str): The host that answered successfully.
+
+        Returns:
+            None
+        """
+        bucket = self._bucket(key)
+        with self._lock:
+            self._strikes[key] = 0
+            bucket.rate = min(self.rate, bucket.rate + self.rate / 10)
+
+
+def host_of(url: str) -> str:
+    """
+    Extracts the host part of a URL, used as the rate limiting key.
+
+    Args:
+        url (str): The URL to inspect.
+
+    Returns:
+        str: The network location of the URL (e.g. 'sci.bban.top').
+    """
+    return urlparse(url).netloc
+
+
+def parse_retry_after(value: str) -> float:
+    """
+    Parses the value of a Retry-After header.
+
+    Args:
+        value (str): Either a number of seconds or an HTTP date.
+
+    Returns:
+        float: The delay in seconds, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+
+    # Delay expressed in seconds
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    # Delay expressed as an HTTP date
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
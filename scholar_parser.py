@@ -0,0 +1,236 @@
+
+# External libraries
+import os
+import sys
+import time
+import argparse
+from bs4 import BeautifulSoup, SoupStrainer, UnicodeDammit
+
+# lxml is optional, the BeautifulSoup backends are used without it
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+
+def _is_result_class(value) -> bool:
+    # While parsing, the strainer sees the raw class attribute (e.g. "gs_ri gs_or")
+    if value is None:
+        return False
+    return 'gs_ri' in (value if isinstance(value, list) else value.split())
+
+
+# Only the result blocks are built by the restricted BeautifulSoup backend
+_RESULTS_STRAINER = SoupStrainer('div', class_=_is_result_class)
+
+# XPath matching an element having a class among others (e.g. class="gs_r gs_ri")
+_CLASS_XPATH = 'contains(concat(" ", normalize-space(@class), " "), " {} ")'
+
+
+def _soup_results(soup) -> list:
+    """
+    Extracts the raw (title, link) of each result block of a BeautifulSoup tree.
+
+    Args:
+        soup (BeautifulSoup): The parsed page.
+
+    Returns:
+        list: (title, link) tuples, either of which may be None.
+    """
+    records = []
+    for result in soup.find_all('div', class_='gs_ri'):
+
+        # Get title
+        title_tag = result.find('h3', class_='gs_rt')
+        title = title_tag.get_text() if title_tag else None
+
+        # Get the href attribute from the hyperlink
+        link_tag = result.find('a')
+        link = link_tag.get('href') if link_tag else None
+
+        records.append((title, link))
+    return records
+
+
+def parse_soup(content: bytes) -> list:
+    """
+    Reference backend: builds the full BeautifulSoup tree of the page.
+
+    Args:
+        content (bytes): The HTML content of the page.
+
+    Returns:
+        list: (title, link) tuples of the result blocks.
+    """
+    return _soup_results(BeautifulSoup(content, 'html.parser'))
+
+
+def parse_strainer(content: bytes) -> list:
+    """
+    BeautifulSoup backend that only builds the result blocks (SoupStrainer).
+
+    Args:
+        content (bytes): The HTML content of the page.
+
+    Returns:
+        list: (title, link) tuples of the result blocks.
+    """
+    return _soup_results(BeautifulSoup(content, 'html.parser', parse_only=_RESULTS_STRAINER))
+
+
+def parse_lxml(content: bytes) -> list:
+    """
+    lxml backend, selecting the result blocks with XPath.
+
+    Args:
+        content (bytes): The HTML content of the page.
+
+    Returns:
+        list: (title, link) tuples of the result blocks.
+    """
+    # Use the encoding BeautifulSoup would detect, lxml assumes Latin-1 without a charset declaration
+    encoding = UnicodeDammit(content, is_html=True).original_encoding
+    tree = lxml.html.fromstring(content, parser=lxml.html.HTMLParser(encoding=encoding))
+    records = []
+    for result in tree.xpath(f'//div[{_CLASS_XPATH.format("gs_ri")}]'):
+        title_tags = result.xpath(f'.//h3[{_CLASS_XPATH.format("gs_rt")}]')
+        title = title_tags[0].text_content() if title_tags else None
+
+        link_tag = next(result.iter('a'), None)
+        link = link_tag.get('href') if link_tag is not None else None
+
+        records.append((title, link))
+    return records
+
+
+# Available backends, from the reference to the fastest
+PARSER_BACKENDS = {'soup': parse_soup, 'strainer': parse_strainer}
+if lxml is not None:
+    PARSER_BACKENDS['lxml'] = parse_lxml
+
+# Backend used by default: the fastest available
+DEFAULT_BACKEND = 'lxml' if lxml is not None else 'strainer'
+
+# Backend used when another one fails on a page
+FALLBACK_BACKEND = 'soup'
+
+
+def parse_records(content: bytes, backend: str = None) -> list:
+    """
+    Extracts the raw (title, link) of each result block of a Google Scholar page.
+
+    If the selected backend fails on the page, the reference backend is used instead.
+
+    Args:
+        content (bytes): The HTML content of the page.
+        backend (str, optional): The name of the backend (see PARSER_BACKENDS). Defaults to None (DEFAULT_BACKEND).
+
+    Returns:
+        list: (title, link) tuples, either of which may be None.
+    """
+    backend = backend or DEFAULT_BACKEND
+    try:
+        return PARSER_BACKENDS[backend](content)
+    except Exception as e:
+        if backend == FALLBACK_BACKEND:
+            raise
+        print(f"Parser '{backend}' failed ({e}), falling back to '{FALLBACK_BACKEND}'")
+        return PARSER_BACKENDS[FALLBACK_BACKEND](content)
+
+
+def load_pages(paths: list) -> list:
+    """
+    Reads saved result pages.
+
+    Args:
+        paths (list): HTML files, or folders whose .html files are read.
+
+    Returns:
+        list: (path, content) tuples.
+    """
+    pages = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(('.html', '.htm')))
+        else:
+            files = [path]
+        for file_path in files:
+            with open(file_path, 'rb') as file:
+                pages.append((file_path, file.read()))
+    return pages
+
+
+def check_backends(pages: list) -> list:
+    """
+    Compares the records extracted by every available backend with the reference backend.
+
+    Args:
+        pages (list): (name, content) tuples.
+
+    Returns:
+        list: (name, backend) tuples of the pages on which a backend disagrees with the reference.
+    """
+    mismatches = []
+    for name, content in pages:
+        reference = parse_soup(content)
+        for backend, parse in PARSER_BACKENDS.items():
+            if backend != 'soup' and parse(content) != reference:
+                mismatches.append((name, backend))
+    return mismatches
+
+
+def benchmark_backends(pages: list, repeat: int = 5) -> dict:
+    """
+    Measures the parsing speed of every available backend.
+
+    Args:
+        pages (list): (name, content) tuples.
+        repeat (int, optional): The number of passes over the pages; the best one is kept. Defaults to 5.
+
+    Returns:
+        dict: Backend -> pages parsed per second.
+    """
+    speeds = {}
+    for backend, parse in PARSER_BACKENDS.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _, content in pages:
+                parse(content)
+            best = min(best, time.perf_counter() - start)
+        speeds[backend] = len(pages) / max(best, 1e-9)
+    return speeds
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Compare the Google Scholar result page parsers.")
+    parser.add_argument('pages', nargs='*', help="saved result pages (HTML files or folders)")
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help="number of synthetic result pages to add (see benchmark.scholar_page)")
+    parser.add_argument('--repeat', type=int, default=5, help="passes over the pages (default: %(default)s)")
+    parser.add_argument('--check', action='store_true',
+                        help="only check that every backend extracts the same records as the reference")
+    args = parser.parse_args()
+
+    html_pages = load_pages(args.pages)
+    if args.synthetic:
+        from benchmark import scholar_page
+        html_pages += [(f"synthetic_{i}", scholar_page("benchmark", i * 10, "http://127.0.0.1").encode())
+                       for i in range(args.synthetic)]
+    if not html_pages:
+        parser.error("no pages to parse, give saved pages or --synthetic N")
+
+    # Equivalence check, always run before the timings
+    differences = check_backends(html_pages)
+    for page_name, backend_name in differences:
+        print(f"\033[91m{backend_name} differs from the reference on {page_name}\033[0m")
+    if differences:
+        sys.exit(1)
+    print(f"\033[92mAll backends ({', '.join(PARSER_BACKENDS)}) agree on {len(html_pages)} pages\033[0m")
+
+    if not args.check:
+        reference_speed = None
+        for backend_name, speed in benchmark_backends(html_pages, args.repeat).items():
+            reference_speed = reference_speed or speed
+            print(f"{backend_name:<10} {speed:>10.1f} pages/s  (x{speed / reference_speed:.2f})")
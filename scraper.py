@@ -1,121 +1,454 @@
 
 # External libraries
 import os
-import json
-import requests
-from bs4 import BeautifulSoup
+import time
+import queue
+import threading
+import contextlib
+import httpx
 from habanero import Crossref
 
+# Internal libraries
+from article_index import ARTICLE_INDEX_PATH, ArticleIndex
+from doi_cache import DOI_CACHE_PATH, DoiCache, resolve_doi
+import metrics
+from http_client import shared_clients
+from proxy import ProxyPool, limiter_key, proxy_url
+from ratelimit import THROTTLE_STATUS_CODES, HostRateLimiter, host_of, parse_retry_after
+from scholar_parser import parse_records
+from storage import JsonlWriter, iter_jsonl, read_json, write_json_atomic
 
-def scrape(query: str, 
-           nb_pages: int, 
+# The number of results shown on each page
+NB_RESULTS_PER_PAGE = 10
+
+# Base URL of the Google Scholar search
+SCHOLAR_URL = "https://scholar.google.com/scholar"
+
+# Custom headers to mimic browser behavior
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
+    "Referer": "https://www.google.com/",
+    "Upgrade-Insecure-Requests": "1",
+}
+
+# Number of proxies tried for a page before giving up, when scraping through a proxy pool
+PROXY_ATTEMPTS = 3
+
+# Markers sent through the pipeline queues when a stage or a page is done
+_DONE = object()
+_PAGE = object()
+
+
+def scrape(query: str,
+           nb_pages: int,
            year: int = None,
-           save_to_file: bool = False) -> list:
+           save_to_file: bool = False,
+           cache_path: str = DOI_CACHE_PATH,
+           doi_workers: int = 4,
+           page_rate: float = 0.5,
+           resume: bool = True,
+           proxy_pool: ProxyPool = None,
+           index_path: str = ARTICLE_INDEX_PATH,
+           first_page: int = 0,
+           filename: str = None,
+           cancel: threading.Event = None) -> list:
     """
-    Scrapes Google Scholar search results for a specified query and number of pages, 
-    optionally filtering by publication year. Fetches DOIs using the CrossRef API 
-    of the habanero library.
+    Scrapes Google Scholar search results for a specified query and number of pages,
+    optionally filtering by publication year. Fetches DOIs using the CrossRef API
+    of the habanero library, through a persistent cache keyed by normalized title.
+
+    Every article is recorded in the article index shared by all the queries and years
+    (see `ArticleIndex`), with the query, year and rank it was found under. The DOI of a
+    title already in the index is reused without any lookup.
+
+    Page fetching, HTML parsing and DOI resolution run as a pipeline (see `iter_scrape`).
+    Without saving to file, the articles are returned in the order in which they appear on
+    Google Scholar; when saving, they are written, and returned, in the order in which
+    their DOIs were resolved.
+
+    When saving to file, each article is appended to a JSON Lines file as soon as it is
+    resolved, and the last fully processed `start_index` is checkpointed next to it, so
+    that an interrupted run resumes where it stopped. `first_page` and `filename` let a
+    range of pages be scraped into its own file (see `sharding`), and `cancel` stops the
+    writes to that file as soon as the caller no longer owns it.
 
     Args:
         query (str): The search query string.
         nb_pages (int): The number of pages to scrape from Google Scholar.
         year (int, optional): The publication year to filter results by. Defaults to None.
-        save_to_file (bool, optional): Whether to save the scraped results to a text file. Defaults to False.
+        save_to_file (bool, optional): Whether to save the scraped results to a JSON Lines file. Defaults to False.
+        cache_path (str, optional): The path to the persistent DOI cache, or None to disable it. Defaults to DOI_CACHE_PATH.
+        doi_workers (int, optional): The number of concurrent Crossref lookups. Defaults to 4.
+        page_rate (float, optional): The maximum number of Google Scholar pages requested per second. Defaults to 0.5.
+        resume (bool, optional): Whether to resume from an existing results file and checkpoint. Defaults to True.
+        proxy_pool (ProxyPool, optional): The proxies to send the Google Scholar requests through. Defaults to None (direct).
+        index_path (str, optional): The path to the article index, or None to disable it. Defaults to ARTICLE_INDEX_PATH.
+        first_page (int, optional): The index of the first page to scrape; `nb_pages` is the index of the page
+            after the last one. Defaults to 0.
+        filename (str, optional): The JSON Lines file to save to. Defaults to None (see `results_filename`).
+        cancel (threading.Event, optional): When set, the scraping stops without writing any other article or
+            checkpoint, and the articles saved so far are returned. Defaults to None.
 
     Returns:
-        list: A list of dictionaries, each containing:
+        list: A list of dictionaries (in Google Scholar order only when not saving to file), each containing:
             - 'title': The title of the article.
             - 'link': The link to the article.
             - 'doi': The DOI of the article, if available.
     """
-    
-    # The number of results shown on each page
-    NB_RESULTS_PER_PAGE = 10
-    
-    # Custom headers to mimic browser behavior
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-        "Referer": "https://www.google.com/",
-        "Upgrade-Insecure-Requests": "1",
-    }
-    
-    # Initialize session
-    session = requests.Session()
-    session.headers.update(headers)
-    
-    # Initialize Crossref instance
+
+    # Run the pipeline in memory and restore the Google Scholar ordering
+    if not save_to_file:
+        ranked_articles = sorted(_run_pipeline(query, nb_pages, year, cache_path, doi_workers, page_rate,
+                                               first_page=first_page, proxy_pool=proxy_pool, index_path=index_path),
+                                 key=lambda item: item[0])
+        return [article for _, article in ranked_articles]
+
+    # Default filename
+    filename = filename or results_filename(query, year)
+    checkpoint_file = f"{filename}.checkpoint"
+
+    # Start from scratch if requested
+    if not resume:
+        for path in (filename, checkpoint_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    # Find the first page that was not fully processed by a previous run
+    checkpoint = read_json(checkpoint_file, default={})
+    last_start_index = checkpoint.get('last_start_index', (first_page - 1) * NB_RESULTS_PER_PAGE)
+    resume_page = max(first_page, last_start_index // NB_RESULTS_PER_PAGE + 1)
+    if resume_page > first_page:
+        print(f"Resuming '{filename}' from page {resume_page + 1}/{nb_pages}")
+
+    # Articles of a partially processed page may already be in the file
+    seen = set()
+    if os.path.exists(filename):
+        seen = {(article['title'], article['link']) for article in iter_jsonl(filename)}
+
+    def save_checkpoint(start_index):
+        if cancel is None or not cancel.is_set():
+            write_json_atomic(checkpoint_file, {'query': query, 'year': year, 'last_start_index': start_index})
+
+    # Append each article to the file as soon as it is resolved
+    pipeline = _run_pipeline(query, nb_pages, year, cache_path, doi_workers, page_rate,
+                             first_page=resume_page, on_page_done=save_checkpoint,
+                             proxy_pool=proxy_pool, index_path=index_path)
+    with JsonlWriter(filename) as writer, contextlib.closing(pipeline):
+        for _, article in pipeline:
+            if cancel is not None and cancel.is_set():
+                print(f"\033[93mScraping into '{filename}' cancelled\033[0m")
+                break
+            if (article['title'], article['link']) not in seen:
+                writer.write(article)
+
+    return list(iter_jsonl(filename))
+
+
+def results_filename(query: str, year: int = None) -> str:
+    """
+    Builds the name of the JSON Lines file where `scrape` saves its results.
+
+    Args:
+        query (str): The search query string.
+        year (int, optional): The publication year filter. Defaults to None.
+
+    Returns:
+        str: The filename (e.g. 'metaheuristics_2015_results.jsonl').
+    """
+    if year:
+        return f"{query}_{year}_results.jsonl"
+    return f"{query}_results.jsonl"
+
+
+def iter_scrape(query: str,
+                nb_pages: int,
+                year: int = None,
+                cache_path: str = DOI_CACHE_PATH,
+                doi_workers: int = 4,
+                page_rate: float = 0.5,
+                proxy_pool: ProxyPool = None,
+                index_path: str = ARTICLE_INDEX_PATH,
+                first_page: int = 0):
+    """
+    Generator form of `scrape` which yields each article as soon as its DOI is resolved.
+
+    Articles are yielded in completion order, not in Google Scholar order.
+
+    Args:
+        query (str): The search query string.
+        nb_pages (int): The number of pages to scrape from Google Scholar.
+        year (int, optional): The publication year to filter results by. Defaults to None.
+        cache_path (str, optional): The path to the persistent DOI cache, or None to disable it. Defaults to DOI_CACHE_PATH.
+        doi_workers (int, optional): The number of concurrent Crossref lookups. Defaults to 4.
+        page_rate (float, optional): The maximum number of Google Scholar pages requested per second. Defaults to 0.5.
+        proxy_pool (ProxyPool, optional): The proxies to send the Google Scholar requests through. Defaults to None (direct).
+        index_path (str, optional): The path to the article index, or None to disable it. Defaults to ARTICLE_INDEX_PATH.
+        first_page (int, optional): The index of the first page to scrape. Defaults to 0.
+
+    Yields:
+        dict: An article with its 'title', 'link' and 'doi'.
+    """
+    for _, article in _run_pipeline(query, nb_pages, year, cache_path, doi_workers, page_rate,
+                                    first_page=first_page, proxy_pool=proxy_pool, index_path=index_path):
+        yield article
+
+
+def parse_results_page(content: bytes, backend: str = None) -> list:
+    """
+    Extracts the search results from a Google Scholar page.
+
+    Args:
+        content (bytes): The HTML content of the page.
+        backend (str, optional): The HTML parser backend (see `scholar_parser.PARSER_BACKENDS`).
+            Defaults to None (the fastest available).
+
+    Returns:
+        list: A list of (title, link) tuples for the valid entries of the page.
+    """
+    candidates = []
+
+    # Parse HTTP request response as HTML
+    for title, link in parse_records(content, backend):
+
+        # Validate the title and link
+        if not title or not link or not link.startswith('http'):
+            print(f"Skipping invalid entry: Title: {title}, Link: {link}")
+            continue
+
+        candidates.append((title, link))
+
+    return candidates
+
+
+def _run_pipeline(query: str,
+                  nb_pages: int,
+                  year: int,
+                  cache_path: str,
+                  doi_workers: int,
+                  page_rate: float,
+                  first_page: int = 0,
+                  on_page_done=None,
+                  queue_size: int = 4,
+                  proxy_pool: ProxyPool = None,
+                  index_path: str = None):
+    """
+    Runs the scraping pipeline and yields the articles with their rank as they are resolved.
+
+    Three stages are connected by bounded queues so that the network wait of one stage
+    overlaps the work of the others:
+        1. A page fetcher paced by a token bucket to the Google Scholar rate limit (per exit IP
+           with a proxy pool, where a failing page is retried through another proxy).
+        2. A parser extracting the titles and links from each page.
+        3. A pool of DOI resolvers (article index and cache first, then Crossref).
+
+    An error while fetching or parsing stops the production of new pages; it is raised once
+    the articles already parsed have been resolved and yielded.
+
+    Args:
+        query (str): The search query string.
+        nb_pages (int): The number of pages to scrape from Google Scholar.
+        year (int): The publication year to filter results by, or None.
+        cache_path (str): The path to the persistent DOI cache, or None to disable it.
+        doi_workers (int): The number of concurrent Crossref lookups.
+        page_rate (float): The maximum number of Google Scholar pages requested per second.
+        first_page (int, optional): The index of the first page to fetch. Defaults to 0.
+        on_page_done (callable, optional): Called with the `start_index` of each page once all its
+            articles have been yielded, in page order. Defaults to None.
+        queue_size (int, optional): The number of pages buffered between stages. Defaults to 4.
+        proxy_pool (ProxyPool, optional): The proxies to send the Google Scholar requests through. Defaults to None (direct).
+        index_path (str, optional): The path to the article index where each article is recorded. Defaults to None (no index).
+
+    Yields:
+        tuple: ((start_index, position), article) where the rank gives the Google Scholar ordering.
+    """
+
+    # Shared keep-alive HTTP clients (one per proxy)
+    clients = shared_clients()
+
+    # Initialize Crossref instance and the persistent DOI cache
     cr = Crossref()
-    
-    # Initialize container for output articles
-    articles = []
-    
-    # Iterate through each page's articles
-    for page_index in range(nb_pages):
-        # Results iterator
-        start_index = page_index * NB_RESULTS_PER_PAGE
-        
-        # Build URL with query and year filter
-        url = f"https://scholar.google.com/scholar?q={query}&hl=en&start={start_index}"
-        if year:
-            url += f"&as_ylo={year}&as_yhi={year}"
-        
-        # Send HTTP request
-        response = session.get(url)
-        response.raise_for_status()
-        
-        # Parse HTTP request response as HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-        for result in soup.find_all('div', class_='gs_ri'):
-
-            # Get title
-            title_tag = result.find('h3', class_='gs_rt')
-            title = title_tag.get_text() if title_tag else None
-            
-            # Get the href attribute from the hyperlink
-            link_tag = result.find('a')
-            link = link_tag['href'] if link_tag else None
-            
-            # Validate the title and link
-            if not title or not link or not link.startswith('http'):
-                print(f"Skipping invalid entry: Title: {title}, Link: {link}")
+    cache = DoiCache(cache_path) if cache_path else None
+
+    # Article index shared by all the queries and years
+    index = ArticleIndex(index_path) if index_path else None
+
+    # Queues between the stages and shared state
+    pages = queue.Queue(maxsize=queue_size)
+    candidates = queue.Queue(maxsize=queue_size * NB_RESULTS_PER_PAGE)
+    resolved = queue.Queue()
+    stop = threading.Event()
+    errors = []
+
+    def put(target, item):
+        # Block on a full queue, but give up if the pipeline is stopping
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(source):
+        # Block on an empty queue, but give up if the pipeline is stopping
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
                 continue
-            
-            # Attempt to fetch DOI using habanero
-            doi = None
+        return _DONE
+
+    # One token bucket per exit IP (a single one without proxies)
+    limiter = HostRateLimiter(rate=page_rate)
+    host = host_of(SCHOLAR_URL)
+
+    def fetch_page(url):
+        attempts = PROXY_ATTEMPTS if proxy_pool else 1
+        for attempt in range(1, attempts + 1):
+            proxy = proxy_pool.choose() if proxy_pool else None
+            key = limiter_key(host, proxy)
+            limiter.acquire(key)
+
+            request_start = time.perf_counter()
             try:
-                search_results = cr.works(query=title)
-                if search_results['message']['items']:
-                    doi = search_results['message']['items'][0].get('DOI')
-            except Exception as e:
-                print(f"Error fetching DOI for title '{title}': {e}")
-            
-            # Save article as dictionary (without authors)
-            article = {
-                'title': title,
-                'link': link,
-                'doi': doi
-            }
-
-            # Store article in output list
-            articles.append(article)
-    
-       # Save results to file
-    if save_to_file:
-
-        # Default filename
-        if year:
-            filename = f"{query}_{year}_results.json"
-        else:
-            filename = f"{query}_results.json"
-
-        # Make sure the filename is unique
-        i = 1
-        while os.path.exists(filename):
-            filename = f"{query}_results_{i}.json"
-            i += 1
-    
-        # Write to a JSON file
-        with open(filename, 'w', encoding='utf-8') as file:
-            json.dump(articles, file, ensure_ascii=False, indent=4)
-
-    return articles
+                with metrics.span('scholar_request'):
+                    response = clients.get(proxy_url(proxy)).get(url, headers=HEADERS)
+            except httpx.TransportError:
+                if proxy_pool:
+                    proxy_pool.report(proxy, ok=False)
+                if attempt == attempts:
+                    raise
+                metrics.inc('retries', stage='scrape', reason='connection')
+                continue
+            metrics.inc('bytes', len(response.content), stage='scrape')
+
+            # Throttled exits are slowed down, and the page retried through another one
+            throttled = response.status_code in THROTTLE_STATUS_CODES
+            if proxy_pool:
+                proxy_pool.report(proxy, ok=not throttled, latency=time.perf_counter() - request_start)
+            if throttled and attempt < attempts:
+                metrics.inc('retries', stage='scrape', reason='throttled')
+                limiter.penalize(key, parse_retry_after(response.headers.get("Retry-After")))
+                continue
+
+            response.raise_for_status()
+            limiter.reward(key)
+            return response
+
+    def fetch_pages():
+        try:
+            # Iterate through each page's articles
+            for page_index in range(first_page, nb_pages):
+                # Results iterator
+                start_index = page_index * NB_RESULTS_PER_PAGE
+
+                # Build URL with query and year filter
+                url = f"{SCHOLAR_URL}?q={query}&hl=en&start={start_index}"
+                if year:
+                    url += f"&as_ylo={year}&as_yhi={year}"
+
+                # Send HTTP request
+                response = fetch_page(url)
+
+                if not put(pages, (start_index, response.content)):
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(pages, _DONE)
+
+    def parse_pages():
+        try:
+            while True:
+                item = get(pages)
+                if item is _DONE:
+                    break
+                start_index, content = item
+                page_candidates = parse_results_page(content)
+                for position, (title, link) in enumerate(page_candidates):
+                    if not put(candidates, ((start_index, position), title, link)):
+                        return
+
+                # Tell the consumer how many articles to expect from this page
+                resolved.put((_PAGE, start_index, len(page_candidates)))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # One marker per resolver so that they all terminate
+            for _ in range(doi_workers):
+                put(candidates, _DONE)
+
+    def resolve_candidates():
+        try:
+            while True:
+                item = get(candidates)
+                if item is _DONE:
+                    break
+                rank, title, link = item
+
+                # Reuse the DOI of an article already found by another search
+                known = index.get(title=title) if index else None
+                if index:
+                    metrics.inc('article_index', stage='scrape', result='hit' if known and known['doi'] else 'miss')
+                doi = known['doi'] if known and known['doi'] else resolve_doi(title, cr, cache)
+
+                # Save article as dictionary (without authors)
+                article = {
+                    'title': title,
+                    'link': link,
+                    'doi': doi
+                }
+                resolved.put((rank, article))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            resolved.put(_DONE)
+
+    # Start the stages
+    threads = [threading.Thread(target=fetch_pages, daemon=True),
+               threading.Thread(target=parse_pages, daemon=True)]
+    threads += [threading.Thread(target=resolve_candidates, daemon=True) for _ in range(doi_workers)]
+    for thread in threads:
+        thread.start()
+
+    # Number of articles expected and received for each unfinished page
+    expected, received = {}, {}
+    next_start_index = first_page * NB_RESULTS_PER_PAGE
+
+    try:
+        # Yield the articles until every resolver is done
+        nb_running = doi_workers
+        while nb_running:
+            item = resolved.get()
+            if item is _DONE:
+                nb_running -= 1
+                continue
+            if item[0] is _PAGE:
+                expected[item[1]] = item[2]
+            else:
+                start_index = item[0][0]
+                received[start_index] = received.get(start_index, 0) + 1
+                if index:
+                    index.record_scrape(item[1], query, year, item[0])
+                yield item
+
+            # Report the pages whose articles have all been yielded, in order
+            while expected.get(next_start_index, -1) == received.get(next_start_index, 0):
+                expected.pop(next_start_index)
+                received.pop(next_start_index, None)
+                if on_page_done:
+                    on_page_done(next_start_index)
+                next_start_index += NB_RESULTS_PER_PAGE
+
+    finally:
+        # Stop the upstream stages if the consumer gave up early
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if cache:
+            cache.close()
+        if index:
+            index.close()
+
+    if errors:
+        raise errors[0]
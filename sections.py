@@ -0,0 +1,159 @@
+
+# External libraries
+import re
+
+# Internal libraries
+from tokens import estimate_tokens
+
+# Default token budget of the document part of the payload
+SECTION_TOKEN_BUDGET = 6000
+
+# Section kinds, from the most to the least useful to answer the checklist
+SECTION_PRIORITIES = [
+    'methodology',
+    'experiments',
+    'results',
+    'statistics',
+    'abstract',
+    'discussion',
+    'conclusion',
+    'introduction',
+    'body',
+    'related_work',
+    'acknowledgments',
+    'appendix',
+    'references',
+]
+
+# Section kinds that are never sent
+EXCLUDED_SECTIONS = ('references', 'acknowledgments')
+
+# Keywords identifying the kind of a section from its heading
+SECTION_KEYWORDS = [
+    ('references', r'references|bibliography|works cited'),
+    ('acknowledgments', r'acknowledge?ments?'),
+    ('appendix', r'appendix|appendices|supplementary'),
+    ('abstract', r'abstract'),
+    ('introduction', r'introduction|background|motivation'),
+    ('related_work', r'related work|literature review|state of the art'),
+    ('statistics', r'statistical|significance|hypothesis test|statistics'),
+    ('methodology', r'method|methodology|proposed|algorithm|approach|parameter|tuning|materials'),
+    ('experiments', r'experiment|setup|set-up|benchmark|test problems|simulation|implementation'),
+    ('results', r'results?|evaluation|performance|comparison|analysis'),
+    ('discussion', r'discussion|limitations?|threats to validity'),
+    ('conclusion', r'conclusions?|concluding|future work|summary'),
+]
+
+# A heading is a short line, optionally numbered (e.g. '3.', '3.2', 'IV.'), or an all-caps line
+_HEADING_PATTERN = re.compile(
+    r'^[ \t]*(?:(?:\d+(?:\.\d+)*|[IVX]+)\.?[ \t]+)?([A-Z][A-Za-z \t,&/-]{2,60})[ \t]*$',
+    re.MULTILINE
+)
+_KEYWORD_PATTERNS = [(kind, re.compile(rf'^\W*(?:{keywords})', re.IGNORECASE))
+                     for kind, keywords in SECTION_KEYWORDS]
+
+
+def classify_heading(heading: str) -> str:
+    """
+    Finds the kind of a section from its heading.
+
+    Args:
+        heading (str): The heading text, without numbering.
+
+    Returns:
+        str: The section kind (see SECTION_PRIORITIES), or None if the line is not a known heading.
+    """
+    # Long lines are sentences wrapped by the PDF layout, not headings
+    if len(heading.split()) > 6:
+        return None
+
+    for kind, pattern in _KEYWORD_PATTERNS:
+        if pattern.search(heading.strip()):
+            return kind
+    return None
+
+
+def split_sections(text: str) -> list:
+    """
+    Splits the text of an article into sections using its headings.
+
+    Lines that look like headings but do not match any known section keyword are kept in
+    the current section. The text before the first heading is labelled 'body'.
+
+    Args:
+        text (str): The text extracted from the PDF.
+
+    Returns:
+        list: A list of (kind, text) tuples in document order.
+    """
+    sections = []
+    kind, start = 'body', 0
+    for match in _HEADING_PATTERN.finditer(text):
+        heading_kind = classify_heading(match.group(1))
+        if heading_kind is None:
+            continue
+        sections.append((kind, text[start:match.start()]))
+        kind, start = heading_kind, match.start()
+
+    sections.append((kind, text[start:]))
+    return [(kind, section) for kind, section in sections if section.strip()]
+
+
+def select_sections(text: str,
+                    budget: int = SECTION_TOKEN_BUDGET,
+                    model: str = "gpt-3.5-turbo") -> dict:
+    """
+    Builds the part of the payload sent for a document within a token budget.
+
+    The sections are ranked by their usefulness for the checklist (see SECTION_PRIORITIES),
+    references and acknowledgments are dropped, and the best sections are kept until the
+    budget is spent; a section that does not fit entirely is truncated. The kept sections
+    are returned in document order.
+
+    Args:
+        text (str): The text extracted from the PDF.
+        budget (int, optional): The maximum number of tokens of the selected text. Defaults to SECTION_TOKEN_BUDGET.
+        model (str, optional): The model whose tokenizer is used. Defaults to "gpt-3.5-turbo".
+
+    Returns:
+        dict: A dictionary containing:
+            - 'text': The selected text.
+            - 'sections': The kinds of the sections kept, in document order.
+            - 'original_tokens': The number of tokens of the full text.
+            - 'selected_tokens': The number of tokens of the selected text.
+            - 'saved_tokens': The difference between the two.
+    """
+    sections = split_sections(text)
+    counts = [estimate_tokens(section, model) for _, section in sections]
+    original_tokens = sum(counts)
+
+    # Nothing to do if the whole text fits
+    if original_tokens <= budget:
+        return {'text': text,
+                'sections': [kind for kind, _ in sections],
+                'original_tokens': original_tokens,
+                'selected_tokens': original_tokens,
+                'saved_tokens': 0}
+
+    # Keep the most useful sections first
+    order = sorted(range(len(sections)), key=lambda i: (SECTION_PRIORITIES.index(sections[i][0]), i))
+    kept, remaining = {}, budget
+    for i in order:
+        kind, section = sections[i]
+        if kind in EXCLUDED_SECTIONS or remaining <= 0:
+            continue
+        if counts[i] <= remaining:
+            kept[i] = section
+            remaining -= counts[i]
+        else:
+            # Truncate proportionally to the remaining budget
+            kept[i] = section[:len(section) * remaining // counts[i]]
+            remaining = 0
+
+    selected = "\n".join(kept[i] for i in sorted(kept))
+    selected_tokens = estimate_tokens(selected, model)
+    return {'text': selected,
+            'sections': [sections[i][0] for i in sorted(kept)],
+            'original_tokens': original_tokens,
+            'selected_tokens': selected_tokens,
+            'saved_tokens': original_tokens - selected_tokens}
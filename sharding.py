@@ -0,0 +1,347 @@
+
+# External libraries
+import os
+import time
+import socket
+import argparse
+import threading
+
+# Internal libraries
+from article_index import ARTICLE_INDEX_PATH, ArticleIndex, article_key
+from doi_cache import DOI_CACHE_PATH
+from orchestrator import RetryPolicy
+from proxy import PROXY_CONFIG, ProxyPool
+from scraper import scrape
+from storage import JsonlWriter, iter_jsonl
+from work_queue import DONE, FAILED, LEASE_DURATION, LEASED, PENDING, WORK_QUEUE_PATH, WorkQueue
+
+# Folder where each work unit saves its results
+SHARD_FOLDER = "shards"
+
+# File where the results of all the units are merged
+MERGED_RESULTS = "merged_results.jsonl"
+
+# Number of Google Scholar pages per work unit
+PAGES_PER_UNIT = 5
+
+# Retry policy of a failed unit (Google Scholar blocks take a while to clear)
+UNIT_RETRY = RetryPolicy(attempts=3, base_delay=120.0, max_delay=1800.0)
+
+# Number of seconds an idle worker waits before looking for work again
+POLL_INTERVAL = 30.0
+
+
+def make_units(queries: list, years: list, nb_pages: int, pages_per_unit: int = PAGES_PER_UNIT) -> list:
+    """
+    Splits searches into (query, year, page range) work units.
+
+    Args:
+        queries (list): The search queries.
+        years (list): The publication years, None for a search without year filter.
+        nb_pages (int): The number of Google Scholar pages of each (query, year) search.
+        pages_per_unit (int, optional): The number of pages of each unit. Defaults to PAGES_PER_UNIT.
+
+    Returns:
+        list: (unit_id, payload) tuples, where the payload holds the 'query', 'year', 'first_page'
+              and 'last_page' (excluded) of the unit.
+    """
+    units = []
+    for query in queries:
+        for year in years:
+            for first_page in range(0, nb_pages, pages_per_unit):
+                last_page = min(first_page + pages_per_unit, nb_pages)
+                unit_id = f"{query}|{year or ''}|{first_page}-{last_page}"
+                units.append((unit_id, {'query': query, 'year': year,
+                                        'first_page': first_page, 'last_page': last_page}))
+    return units
+
+
+def unit_filename(payload: dict, folder: str = SHARD_FOLDER) -> str:
+    """
+    Builds the path of the JSON Lines file where a unit saves its results.
+
+    Args:
+        payload (dict): The description of the unit (see `make_units`).
+        folder (str, optional): The folder of the unit files. Defaults to SHARD_FOLDER.
+
+    Returns:
+        str: The path (e.g. 'shards/metaheuristics_2015_p0005-0010_results.jsonl').
+    """
+    year = f"_{payload['year']}" if payload['year'] else ""
+    return os.path.join(folder, f"{payload['query']}{year}_p{payload['first_page']:04d}-"
+                                f"{payload['last_page']:04d}_results.jsonl")
+
+
+def _keep_lease(queue: WorkQueue, unit_id: str, owner: str, lease: float, stop: threading.Event,
+                lost: threading.Event):
+    """
+    Renews the lease of a unit until `stop` is set, from a background thread.
+
+    If the lease cannot be renewed, another worker may already hold the unit, so `lost` is
+    set for the worker to abandon it.
+
+    Args:
+        queue (WorkQueue): The work queue.
+        unit_id (str): The identifier of the unit.
+        owner (str): The identifier of the worker holding the unit.
+        lease (float): The duration of the lease in seconds; it is renewed every third of it.
+        stop (threading.Event): Set when the unit is finished.
+        lost (threading.Event): Set when the lease could not be renewed.
+
+    Returns:
+        None
+    """
+    while not stop.wait(lease / 3):
+        if not queue.renew(unit_id, owner, lease):
+            print(f"\033[93mLost the lease of {unit_id}, another worker took it over\033[0m")
+            lost.set()
+            return
+
+
+def run_worker(queue_path: str = WORK_QUEUE_PATH,
+               folder: str = SHARD_FOLDER,
+               owner: str = None,
+               lease: float = LEASE_DURATION,
+               retry: RetryPolicy = UNIT_RETRY,
+               page_rate: float = 0.5,
+               proxy_pool: ProxyPool = None,
+               cache_path: str = DOI_CACHE_PATH,
+               index_path: str = None,
+               poll_interval: float = POLL_INTERVAL) -> int:
+    """
+    Claims and scrapes work units until the queue is finished.
+
+    Any number of workers can run this at the same time, in several processes or on several
+    hosts sharing the queue and the unit folder; each one should have its own exit IPs (e.g.
+    its own proxy pool) since the Google Scholar rate limit applies per exit IP. The lease of
+    the current unit is renewed in the background; a unit interrupted by a crash is resumed
+    from its page checkpoint by the next worker that claims it. A worker that loses the lease
+    of its unit stops writing to the unit file and leaves the unit to its new owner.
+
+    Args:
+        queue_path (str, optional): The path to the work queue. Defaults to WORK_QUEUE_PATH.
+        folder (str, optional): The folder where the units save their results. Defaults to SHARD_FOLDER.
+        owner (str, optional): The identifier of the worker. Defaults to None ('host:pid').
+        lease (float, optional): The duration of the leases in seconds. Defaults to LEASE_DURATION.
+        retry (RetryPolicy, optional): The retry policy of a failed unit. Defaults to UNIT_RETRY.
+        page_rate (float, optional): The maximum number of Google Scholar pages requested per second. Defaults to 0.5.
+        proxy_pool (ProxyPool, optional): The proxies to send the Google Scholar requests through. Defaults to None (direct).
+        cache_path (str, optional): The path to the DOI cache, or None to disable it. Defaults to DOI_CACHE_PATH.
+        index_path (str, optional): The path to an article index of this host, or None to disable it (the articles
+            are indexed by `merge_results` anyway). Never share one index between hosts: it runs in WAL mode, which
+            needs shared memory between its users. Defaults to None.
+        poll_interval (float, optional): The number of seconds to wait when no unit is available yet. Defaults to POLL_INTERVAL.
+
+    Returns:
+        int: The number of units completed by this worker.
+    """
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+    os.makedirs(folder, exist_ok=True)
+    queue = WorkQueue(queue_path)
+    nb_done = 0
+
+    try:
+        while True:
+            unit = queue.claim(owner, lease)
+
+            # Wait for the units leased by other workers or waiting for a retry
+            if unit is None:
+                if queue.finished():
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            payload = unit['payload']
+            print(f"\033[94m{owner} scraping {unit['unit_id']}\033[0m")
+            stop, lost = threading.Event(), threading.Event()
+            keeper = threading.Thread(target=_keep_lease, args=(queue, unit['unit_id'], owner, lease, stop, lost),
+                                      daemon=True)
+            keeper.start()
+            try:
+                scrape(payload['query'], nb_pages=payload['last_page'], year=payload['year'], save_to_file=True,
+                       cache_path=cache_path, page_rate=page_rate, proxy_pool=proxy_pool, index_path=index_path,
+                       first_page=payload['first_page'], filename=unit_filename(payload, folder), cancel=lost)
+            except Exception as e:
+                if lost.is_set():
+                    continue
+                attempt = unit['attempts'] + 1
+                delay = retry.delay(attempt) if retry.should_retry(attempt, e) else None
+                queue.fail(unit['unit_id'], owner, str(e), delay)
+                if delay is None:
+                    print(f"\033[91m{unit['unit_id']} failed for good: {e}\033[0m")
+                else:
+                    print(f"\033[93m{unit['unit_id']} failed ({e}), retry in {delay:.0f} s\033[0m")
+                continue
+            finally:
+                stop.set()
+                keeper.join()
+
+            # The unit belongs to another worker now
+            if lost.is_set():
+                print(f"\033[93m{owner} abandoned {unit['unit_id']}\033[0m")
+                continue
+
+            if queue.done(unit['unit_id'], owner):
+                nb_done += 1
+    finally:
+        queue.close()
+
+    print(f"\033[92m{owner} done: {nb_done} units\033[0m")
+    return nb_done
+
+
+def merge_results(queue_path: str = WORK_QUEUE_PATH,
+                  output_file: str = MERGED_RESULTS,
+                  folder: str = SHARD_FOLDER,
+                  index_path: str = ARTICLE_INDEX_PATH) -> int:
+    """
+    Merges the results of the completed units into a single JSON Lines file.
+
+    Articles found by several units are written once (keyed by DOI, or by normalized title),
+    with the list of the searches they were found under. The articles are also recorded in
+    the article index. The file is replaced atomically, so the merge can run at any time.
+
+    Args:
+        queue_path (str, optional): The path to the work queue. Defaults to WORK_QUEUE_PATH.
+        output_file (str, optional): The merged JSON Lines file. Defaults to MERGED_RESULTS.
+        folder (str, optional): The folder where the units saved their results. Defaults to SHARD_FOLDER.
+        index_path (str, optional): The path to the article index, or None to disable it. Defaults to ARTICLE_INDEX_PATH.
+
+    Returns:
+        int: The number of distinct articles.
+    """
+    queue = WorkQueue(queue_path)
+    units = queue.units()
+    queue.close()
+
+    index = ArticleIndex(index_path) if index_path else None
+    articles = {}
+    for unit in units:
+        path = unit_filename(unit['payload'], folder)
+        if unit['state'] != DONE or not os.path.exists(path):
+            continue
+        source = {'query': unit['payload']['query'], 'year': unit['payload']['year']}
+        for article in iter_jsonl(path):
+            if not article.get('doi') and not article.get('title'):
+                continue
+            key = article_key(article.get('doi'), article.get('title'))
+            merged = articles.setdefault(key, {'title': article['title'], 'link': article['link'],
+                                               'doi': article['doi'], 'sources': []})
+            if source not in merged['sources']:
+                merged['sources'].append(source)
+                if index:
+                    index.record_scrape(article, source['query'], source['year'])
+    if index:
+        index.close()
+
+    # Write the merged results next to the output, then replace it (workers may merge concurrently)
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
+    with JsonlWriter(temp_file) as writer:
+        for article in articles.values():
+            writer.write(article)
+    os.replace(temp_file, output_file)
+
+    nb_unfinished = sum(unit['state'] != DONE for unit in units)
+    if nb_unfinished:
+        print(f"\033[93m{nb_unfinished} of {len(units)} units are not done and were left out\033[0m")
+    print(f"Merged {len(articles)} articles into '{output_file}'")
+    return len(articles)
+
+
+def format_status(queue: WorkQueue) -> str:
+    """
+    Formats the progress of the queue: units per state, and the units leased or failed.
+
+    Args:
+        queue (WorkQueue): The work queue.
+
+    Returns:
+        str: The status table.
+    """
+    counts = queue.counts()
+    lines = [" ".join(f"{state}: {counts[state]}" for state in (PENDING, LEASED, DONE, FAILED))]
+    now = time.time()
+    for unit in queue.units():
+        if unit['state'] == LEASED and unit['lease_expires'] >= now:
+            lines.append(f"\033[94m{unit['unit_id']:<40} {unit['owner']}\033[0m")
+        elif unit['state'] == FAILED or (unit['state'] == PENDING and unit['error']):
+            lines.append(f"\033[91m{unit['unit_id']:<40} {unit['state']} after {unit['attempts']} "
+                         f"attempts: {unit['error']}\033[0m")
+    return "\n".join(lines)
+
+
+def parse_years(specs: list) -> list:
+    """
+    Expands year specifications such as '2015' or '2009-2024' (inclusive).
+
+    Args:
+        specs (list): The specifications.
+
+    Returns:
+        list: The years, or [None] (no year filter) without specification.
+    """
+    years = []
+    for spec in specs or []:
+        first, _, last = spec.partition("-")
+        years.extend(range(int(first), int(last or first) + 1))
+    return years or [None]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Scrape many queries and years with several workers.")
+    parser.add_argument('--queue', default=WORK_QUEUE_PATH, help="work queue (default: %(default)s)")
+    parser.add_argument('--folder', default=SHARD_FOLDER, help="folder of the unit results (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    init_parser = commands.add_parser('init', help="add the work units of some searches to the queue")
+    init_parser.add_argument('--queries', nargs='+', required=True, help="search queries")
+    init_parser.add_argument('--years', nargs='*', help="years or ranges, e.g. 2009-2024 (default: no filter)")
+    init_parser.add_argument('--pages', type=int, required=True, help="Google Scholar pages per query and year")
+    init_parser.add_argument('--pages-per-unit', type=int, default=PAGES_PER_UNIT,
+                             help="pages per work unit (default: %(default)s)")
+
+    work_parser = commands.add_parser('work', help="claim and scrape units until the queue is finished")
+    work_parser.add_argument('--owner', help="worker identifier (default: host:pid)")
+    work_parser.add_argument('--lease', type=float, default=LEASE_DURATION, help="lease in seconds (default: %(default)s)")
+    work_parser.add_argument('--page-rate', type=float, default=0.5,
+                             help="Google Scholar pages per second per exit IP (default: %(default)s)")
+    work_parser.add_argument('--proxies', default=PROXY_CONFIG, help="proxy configuration (default: %(default)s)")
+    work_parser.add_argument('--index', help="article index of this host, never shared with other hosts "
+                                             "(default: none, the merge indexes the articles)")
+    work_parser.add_argument('--merge', action='store_true', help="merge the results once the queue is finished")
+
+    commands.add_parser('status', help="show the progress of the queue")
+
+    merge_parser = commands.add_parser('merge', help="merge the results of the completed units")
+    merge_parser.add_argument('--output', default=MERGED_RESULTS, help="merged results (default: %(default)s)")
+
+    commands.add_parser('retry', help="make the units that failed for good available again")
+
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        work_queue = WorkQueue(args.queue)
+        nb_added = work_queue.add(make_units(args.queries, parse_years(args.years), args.pages, args.pages_per_unit))
+        print(f"Added {nb_added} units to '{args.queue}'")
+        work_queue.close()
+
+    elif args.command == 'work':
+        with ProxyPool.from_config(args.proxies) as pool:
+            run_worker(args.queue, args.folder, owner=args.owner, lease=args.lease, page_rate=args.page_rate,
+                       proxy_pool=pool, index_path=args.index)
+        if args.merge:
+            merge_results(args.queue, folder=args.folder)
+
+    elif args.command == 'status':
+        work_queue = WorkQueue(args.queue)
+        print(format_status(work_queue))
+        work_queue.close()
+
+    elif args.command == 'merge':
+        merge_results(args.queue, args.output, args.folder)
+
+    elif args.command == 'retry':
+        work_queue = WorkQueue(args.queue)
+        print(f"{work_queue.reset_failed()} units made available again")
+        work_queue.close()
@@ -0,0 +1,154 @@
+
+# External libraries
+import os
+import json
+import threading
+
+
+class JsonlWriter:
+    """
+    Append-only JSON Lines writer which flushes every record as soon as it is written.
+
+    A crash can only lose the record being written; readers (see `iter_jsonl`) ignore a
+    truncated last line, and the writer drops it before appending (see `truncate_torn_tail`)
+    so that the next record does not land on the same line.
+
+    Args:
+        path (str): The path to the JSON Lines file.
+        fsync (bool, optional): Whether to force each record to disk. Defaults to False.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        truncate_torn_tail(path)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record: dict):
+        """
+        Appends a record to the file.
+
+        Args:
+            record (dict): The JSON-serializable record to append.
+
+        Returns:
+            None
+        """
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        """
+        Closes the underlying file.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def truncate_torn_tail(path: str) -> int:
+    """
+    Drops the partial last line left in a JSON Lines file by a crash, before appending to it.
+
+    Args:
+        path (str): The path to the JSON Lines file (missing files are left alone).
+
+    Returns:
+        int: The number of bytes dropped.
+    """
+    if not os.path.exists(path):
+        return 0
+
+    with open(path, 'r+b') as file:
+        size = file.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        file.seek(size - 1)
+        if file.read(1) == b"\n":
+            return 0
+
+        # Search backwards for the end of the last complete line
+        end = size
+        while end > 0:
+            start = max(end - 65536, 0)
+            file.seek(start)
+            newline = file.read(end - start).rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        file.truncate(end)
+    print(f"Dropped a truncated last line of {size - end} bytes in '{path}'")
+    return size - end
+
+
+def iter_jsonl(path: str):
+    """
+    Streams the records of a JSON Lines file without loading the whole file.
+
+    Blank lines and lines that cannot be decoded (e.g. truncated by a crash) are skipped.
+
+    Args:
+        path (str): The path to the JSON Lines file.
+
+    Yields:
+        dict: One record per line.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping malformed line in '{path}'")
+
+
+def write_json_atomic(path: str, data, indent: int = None):
+    """
+    Writes a JSON file through a temporary file and a rename, so that readers never see a partial file.
+
+    Args:
+        path (str): The path to the JSON file.
+        data: The JSON-serializable content.
+        indent (int, optional): The indentation passed to `json.dump`. Defaults to None.
+
+    Returns:
+        None
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=indent)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def read_json(path: str, default=None):
+    """
+    Reads a JSON file, returning a default value if it does not exist.
+
+    Args:
+        path (str): The path to the JSON file.
+        default (optional): The value returned when the file is missing. Defaults to None.
+
+    Returns:
+        The decoded content of the file, or `default`.
+    """
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
@@ -0,0 +1,63 @@
+# External libraries
+import os
+import pytest
+
+# Internal libraries
+import scholar_parser
+from scholar_parser import PARSER_BACKENDS, check_backends, load_pages, parse_records, parse_soup
+
+# Saved result pages covering the markup variations the backends must agree on
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'scholar_pages')
+PAGES = load_pages([FIXTURES_DIR])
+
+
+def _page(file_name: str) -> bytes:
+    return next(content for name, content in PAGES if os.path.basename(name) == file_name)
+
+
+def test_fixture_pages_are_found():
+    assert {os.path.basename(name) for name, _ in PAGES} >= {'results.html', 'undeclared_utf8.html', 'no_results.html'}
+
+
+def test_lxml_backend_is_checked():
+    # Without lxml, the check below would silently only cover the strainer backend
+    pytest.importorskip('lxml')
+    assert 'lxml' in PARSER_BACKENDS
+
+
+@pytest.mark.parametrize('name, content', PAGES, ids=[os.path.basename(name) for name, _ in PAGES])
+def test_backends_agree_with_reference(name, content):
+    assert check_backends([(name, content)]) == []
+
+
+@pytest.mark.parametrize('backend', sorted(PARSER_BACKENDS))
+def test_records_of_results_page(backend):
+    content = _page('results.html')
+    records = PARSER_BACKENDS[backend](content)
+
+    assert len(records) == 5
+    assert records[0] == ('A Comparison of Random Search Heuristics', 'https://example.org/paper1')
+    assert records[1] == ('[BOOK] Statistical Methods for Research Workers', 'https://example.org/book')
+    assert records[2] == ('[CITATION] Unlinked Citation of a Conference Paper', None)
+    assert records[3] == (None, 'https://example.org/untitled')
+    assert records[4] == ('Entities & Escaped <Characters> in Titles', '/scholar?q=related&hl=en')
+
+
+@pytest.mark.parametrize('backend', sorted(PARSER_BACKENDS))
+def test_undeclared_utf8_titles(backend):
+    content = _page('undeclared_utf8.html')
+    titles = [title for title, _ in PARSER_BACKENDS[backend](content)]
+
+    assert titles == ['Évaluation des méthodes d’optimisation à grande échelle',
+                      'Über die Größe von Stichproben — eine Übersicht',
+                      '統計的検定の再現性について']
+
+
+def test_parse_records_falls_back_to_reference(monkeypatch):
+    content = _page('results.html')
+
+    def broken(_):
+        raise ValueError("broken backend")
+
+    monkeypatch.setitem(scholar_parser.PARSER_BACKENDS, 'broken', broken)
+    assert parse_records(content, 'broken') == parse_soup(content)
@@ -0,0 +1,184 @@
+
+# External libraries
+import os
+import gzip
+import json
+import argparse
+
+# Internal libraries
+from extraction import EXTRACTOR_VERSION, iter_extractions, page_offsets
+
+# Default location of the extracted text cache
+TEXT_CACHE_DIR = ".text_cache"
+
+
+class TextCache:
+    """
+    Content-addressed cache of the text extracted from PDF files.
+
+    Entries are keyed by the SHA-256 of the PDF content and the extractor version, so a
+    renamed or copied file is still a hit while a change of the extraction logic (see
+    `extraction.EXTRACTOR_VERSION`) invalidates everything. Each entry is a gzip-compressed
+    JSON file holding the text and the offset of each page.
+
+    Args:
+        folder (str, optional): The folder where the entries are stored. Defaults to TEXT_CACHE_DIR.
+        version (int, optional): The extractor version the entries belong to. Defaults to EXTRACTOR_VERSION.
+    """
+
+    def __init__(self, folder: str = TEXT_CACHE_DIR, version: int = EXTRACTOR_VERSION):
+        self.folder = folder
+        self.version = version
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        """
+        Builds the path of the entry of a document.
+
+        Args:
+            digest (str): The SHA-256 of the PDF file.
+
+        Returns:
+            str: The path to the cache entry.
+        """
+        return os.path.join(self.folder, f"{digest}-v{self.version}.json.gz")
+
+    def get(self, digest: str) -> dict:
+        """
+        Reads the entry of a document.
+
+        Args:
+            digest (str): The SHA-256 of the PDF file.
+
+        Returns:
+            dict: The entry with its 'status', 'pages', whether it is 'complete' and the 'budget' that cut
+                  it short otherwise, or None on a miss.
+        """
+        path = self._path(digest)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, EOFError, json.JSONDecodeError):
+            return None
+
+        # Mark the entry as recently used for pruning
+        os.utime(path)
+
+        # Split the text back into pages
+        text, offsets = entry['text'], entry['offsets']
+        bounds = offsets[1:] + [len(text)]
+        return {'status': entry['status'],
+                'pages': [text[start:end] for start, end in zip(offsets, bounds)],
+                'complete': entry.get('budget') is None,
+                'budget': entry.get('budget')}
+
+    def put(self, digest: str, status: str, pages: list, budget: list = None):
+        """
+        Stores the text extracted from a document.
+
+        Args:
+            digest (str): The SHA-256 of the PDF file.
+            status (str): The extraction status ('ok' or 'empty').
+            pages (list): The text of each page.
+            budget (list, optional): The [max_chars, max_tokens] budget that cut the text short, or None if the
+                text is complete. Defaults to None.
+
+        Returns:
+            None
+        """
+        entry = {'sha256': digest,
+                 'extractor_version': self.version,
+                 'status': status,
+                 'budget': budget,
+                 'offsets': page_offsets(pages),
+                 'text': "".join(pages)}
+
+        # Write through a temporary file so that readers never see a partial entry
+        path = self._path(digest)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as file:
+            json.dump(entry, file, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def size(self) -> int:
+        """
+        Computes the total size of the cache on disk.
+
+        Returns:
+            int: The size in bytes.
+        """
+        return sum(entry.stat().st_size for entry in os.scandir(self.folder) if entry.is_file())
+
+    def prune(self, max_size: float) -> int:
+        """
+        Deletes the least recently used entries until the cache fits in the given size.
+
+        Entries written by other extractor versions are always deleted first.
+
+        Args:
+            max_size (float): The maximum size of the cache in MB.
+
+        Returns:
+            int: The number of entries deleted.
+        """
+        current_suffix = f"-v{self.version}.json.gz"
+        entries = [entry for entry in os.scandir(self.folder) if entry.is_file()]
+        entries.sort(key=lambda entry: (entry.name.endswith(current_suffix), entry.stat().st_mtime))
+
+        total = sum(entry.stat().st_size for entry in entries)
+        limit = max_size * 1_048_576
+        nb_deleted = 0
+        for entry in entries:
+            if total <= limit and entry.name.endswith(current_suffix):
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+            nb_deleted += 1
+
+        return nb_deleted
+
+
+def warm(folder: str, cache: TextCache, workers: int = None):
+    """
+    Extracts the text of every PDF file of a folder into the cache.
+
+    Args:
+        folder (str): The folder containing the PDF files.
+        cache (TextCache): The cache to fill.
+        workers (int, optional): The number of concurrent extractions. Defaults to None (number of CPUs).
+
+    Returns:
+        dict: The number of documents per extraction status, with cache hits counted as 'cached'.
+    """
+    pdf_paths = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".pdf")]
+    counts = {}
+    for extraction in iter_extractions(pdf_paths, workers=workers, cache=cache):
+        status = 'cached' if extraction['cached'] else extraction['status']
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+if __name__ == '__main__':
+
+    # Command line interface
+    parser = argparse.ArgumentParser(description="Manage the cache of text extracted from PDF files.")
+    parser.add_argument('--cache', default=TEXT_CACHE_DIR, help="cache folder (default: %(default)s)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    warm_parser = subparsers.add_parser('warm', help="extract every PDF file of a folder into the cache")
+    warm_parser.add_argument('folder', help="folder containing the PDF files")
+    warm_parser.add_argument('--workers', type=int, default=None, help="concurrent extractions (default: number of CPUs)")
+
+    prune_parser = subparsers.add_parser('prune', help="delete the least recently used entries")
+    prune_parser.add_argument('--max-size', type=float, required=True, help="maximum cache size in MB")
+
+    args = parser.parse_args()
+    text_cache = TextCache(args.cache)
+
+    if args.command == 'warm':
+        counts = warm(args.folder, text_cache, workers=args.workers)
+        print(", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+
+    elif args.command == 'prune':
+        nb_deleted = text_cache.prune(args.max_size)
+        print(f"Deleted {nb_deleted} entries, cache size is now {text_cache.size() / 1_048_576:.2f} MB")
@@ -0,0 +1,48 @@
+
+# External libraries
+from functools import lru_cache
+
+# tiktoken is optional, the token counts are estimated from the length of the text without it
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Average number of characters per token for English text
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """
+    Returns the tiktoken encoding of a model.
+
+    Args:
+        model (str): The name of the model.
+
+    Returns:
+        tiktoken.Encoding: The encoding, or None if tiktoken is not installed.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def estimate_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Counts (or estimates, without tiktoken) the number of tokens in a text.
+
+    Args:
+        text (str): The text to measure.
+        model (str, optional): The name of the model whose tokenizer is used. Defaults to "gpt-3.5-turbo".
+
+    Returns:
+        int: The number of tokens.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
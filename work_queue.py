@@ -0,0 +1,273 @@
+
+# External libraries
+import json
+import time
+import sqlite3
+import threading
+import contextlib
+
+# Default location of the shared work queue
+WORK_QUEUE_PATH = "work_queue.sqlite"
+
+# Default number of seconds a claimed unit stays reserved without being renewed
+LEASE_DURATION = 300.0
+
+# States of a work unit
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class WorkQueue:
+    """
+    Persistent queue of work units shared by several worker processes, on one or many hosts.
+
+    A worker claims a unit for a limited time (a lease) and renews the lease while it works
+    on it; a unit whose lease expires, because its worker died or lost the shared file
+    system, goes back to the other workers. Finished units are marked done, failed ones are
+    made available again after a delay until they run out of attempts.
+
+    The queue is a SQLite database whose claims run in write transactions, so two workers
+    never hold the same unit. Hosts sharing it over a network file system need one with
+    working POSIX locks (e.g. NFSv4); the database runs in rollback journal mode, WAL mode
+    requiring shared memory between the workers.
+
+    Each unit is a dictionary with:
+        - 'unit_id': The unique identifier of the unit.
+        - 'payload': The JSON-serializable description of the work.
+        - 'state': 'pending', 'leased', 'done' or 'failed'.
+        - 'owner': The worker holding (or that last held) the unit.
+        - 'lease_expires': The UNIX timestamp at which the lease expires.
+        - 'attempts': The number of failed attempts.
+        - 'error': The last error, if any.
+
+    Args:
+        path (str, optional): The path to the SQLite database. Defaults to WORK_QUEUE_PATH.
+    """
+
+    def __init__(self, path: str = WORK_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=60.0, isolation_level=None)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS units ("
+            "unit_id TEXT PRIMARY KEY, "
+            "payload TEXT NOT NULL, "
+            "state TEXT NOT NULL, "
+            "owner TEXT, "
+            "lease_expires REAL, "
+            "available_at REAL NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "error TEXT, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS units_state ON units (state, available_at)")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """
+        Runs a block in a write transaction, holding the database lock from the start.
+
+        Yields:
+            sqlite3.Connection: The connection.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def add(self, units) -> int:
+        """
+        Adds work units; the units already in the queue (same identifier) are left untouched.
+
+        Args:
+            units (iterable): (unit_id, payload) tuples.
+
+        Returns:
+            int: The number of units added.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO units (unit_id, payload, state, available_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(unit_id, json.dumps(payload, ensure_ascii=False), PENDING, now, now) for unit_id, payload in units]
+            )
+            return connection.total_changes - before
+
+    def claim(self, owner: str, lease: float = LEASE_DURATION) -> dict:
+        """
+        Reserves the next available unit: a pending one, or one whose lease has expired.
+
+        Args:
+            owner (str): The identifier of the worker (e.g. 'host:pid').
+            lease (float, optional): The duration of the lease in seconds. Defaults to LEASE_DURATION.
+
+        Returns:
+            dict: The claimed unit (see class docstring), or None if no unit is available right now.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT unit_id FROM units "
+                "WHERE (state = ? AND available_at <= ?) OR (state = ? AND lease_expires < ?) "
+                "ORDER BY rowid LIMIT 1",
+                (PENDING, now, LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE units SET state = ?, owner = ?, lease_expires = ?, updated_at = ? WHERE unit_id = ?",
+                (LEASED, owner, now + lease, now, row[0])
+            )
+        return self.get(row[0])
+
+    def renew(self, unit_id: str, owner: str, lease: float = LEASE_DURATION) -> bool:
+        """
+        Extends the lease of a unit held by a worker.
+
+        Args:
+            unit_id (str): The identifier of the unit.
+            owner (str): The identifier of the worker.
+            lease (float, optional): The new duration of the lease from now, in seconds. Defaults to LEASE_DURATION.
+
+        Returns:
+            bool: False if the worker no longer holds the unit (its lease expired and another worker claimed it).
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE units SET lease_expires = ?, updated_at = ? WHERE unit_id = ? AND state = ? AND owner = ?",
+                (now + lease, now, unit_id, LEASED, owner)
+            )
+            return cursor.rowcount == 1
+
+    def done(self, unit_id: str, owner: str) -> bool:
+        """
+        Marks a unit held by a worker as finished.
+
+        Args:
+            unit_id (str): The identifier of the unit.
+            owner (str): The identifier of the worker.
+
+        Returns:
+            bool: False if the worker no longer held the unit (it is then left to its new owner).
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE units SET state = ?, lease_expires = NULL, error = NULL, updated_at = ? "
+                "WHERE unit_id = ? AND state = ? AND owner = ?",
+                (DONE, time.time(), unit_id, LEASED, owner)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, unit_id: str, owner: str, error: str, retry_delay: float = None) -> bool:
+        """
+        Records a failed attempt at a unit held by a worker.
+
+        Args:
+            unit_id (str): The identifier of the unit.
+            owner (str): The identifier of the worker.
+            error (str): A description of the error.
+            retry_delay (float, optional): The number of seconds before the unit can be claimed again,
+                or None to give up on it. Defaults to None.
+
+        Returns:
+            bool: False if the worker no longer held the unit.
+        """
+        now = time.time()
+        state = FAILED if retry_delay is None else PENDING
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE units SET state = ?, lease_expires = NULL, available_at = ?, attempts = attempts + 1, "
+                "error = ?, updated_at = ? WHERE unit_id = ? AND state = ? AND owner = ?",
+                (state, now + (retry_delay or 0.0), error, now, unit_id, LEASED, owner)
+            )
+            return cursor.rowcount == 1
+
+    def reset_failed(self) -> int:
+        """
+        Makes the units that ran out of attempts available again, with a fresh attempt count.
+
+        Returns:
+            int: The number of units reset.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE units SET state = ?, attempts = 0, available_at = ?, updated_at = ? WHERE state = ?",
+                (PENDING, now, now, FAILED)
+            )
+            return cursor.rowcount
+
+    def get(self, unit_id: str) -> dict:
+        """
+        Reads a unit.
+
+        Args:
+            unit_id (str): The identifier of the unit.
+
+        Returns:
+            dict: The unit (see class docstring), or None if it is not in the queue.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT unit_id, payload, state, owner, lease_expires, attempts, error FROM units WHERE unit_id = ?",
+                (unit_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'unit_id': row[0], 'payload': json.loads(row[1]), 'state': row[2], 'owner': row[3],
+                'lease_expires': row[4], 'attempts': row[5], 'error': row[6]}
+
+    def units(self) -> list:
+        """
+        Lists all the units, in the order they were added.
+
+        Returns:
+            list: The units (see class docstring).
+        """
+        with self._lock:
+            unit_ids = [row[0] for row in self._connection.execute("SELECT unit_id FROM units ORDER BY rowid")]
+        return [self.get(unit_id) for unit_id in unit_ids]
+
+    def counts(self) -> dict:
+        """
+        Counts the units in each state; leased units whose lease expired are counted as pending.
+
+        Returns:
+            dict: State -> number of units, for the four states.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT CASE WHEN state = ? AND lease_expires < ? THEN ? ELSE state END AS current, COUNT(*) "
+                "FROM units GROUP BY current",
+                (LEASED, time.time(), PENDING)
+            ).fetchall()
+        return {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def finished(self) -> bool:
+        """
+        Tells whether every unit is done or failed for good.
+
+        Returns:
+            bool: True if no unit is pending or leased.
+        """
+        counts = self.counts()
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._connection.close()